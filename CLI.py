@@ -1,19 +1,77 @@
-from sqlite3 import IntegrityError
+import contextlib
+import csv
+import json
+import sys
+from enum import Enum
+from pathlib import Path
+from sqlite3 import DatabaseError, IntegrityError
 from typing import Optional
 
 import typer
-from main import HabitTracker
-from classes import Habit, Periodicity
+import profiling
+from main import DB_DEFAULT_NAME, HabitTracker
+from database import Database
+from classes import CalendarPeriod, Habit
 from rich import print
 
 app = typer.Typer()
-ht = HabitTracker()
+_tracker: Optional[HabitTracker] = None
+
+def get_tracker() -> HabitTracker:
+    """
+    Creates the habit tracker the first time a command needs it.
+    """
+    global _tracker
+    if _tracker is None:
+        _tracker = HabitTracker(storage=Database(DB_DEFAULT_NAME, pooled=True))
+    return _tracker
+
+@app.callback()
+def main(ctx: typer.Context,
+         profile: bool = typer.Option(False, "--profile", help="Print where the time of the command went (to stderr)"),
+         profile_output: Optional[Path] = typer.Option(None, help="Also save the profile: .json for the breakdown, otherwise a cProfile dump")):
+    """
+    Track and analyse your habits!
+    """
+    if not profile and profile_output is None:
+        return
+
+    import cProfile
+    global print
+    profiler = profiling.enable()
+    # Time the output as well, to see how much of the command is spent rendering
+    print = profiling.profiled(print)
+    python_profile = cProfile.Profile()
+    python_profile.enable()
+
+    def report():
+        python_profile.disable()
+        breakdown = profiler.report()
+        for title in ("spans", "sql"):
+            typer.echo(f"\n{'Calls':>7} {'Total ms':>10}  {title}", err=True)
+            for entry in breakdown[title]:
+                typer.echo(f"{entry['count']:>7} {entry['seconds'] * 1000:>10.3f}  {entry['name']}", err=True)
+        if profile_output is not None and profile_output.suffix == ".json":
+            with open(profile_output, "w") as file:
+                json.dump(breakdown, file, indent=2)
+        elif profile_output is not None:
+            python_profile.dump_stats(profile_output)
+        else:
+            import io
+            import pstats
+            stream = io.StringIO()
+            pstats.Stats(python_profile, stream=stream).sort_stats("tottime").print_stats(15)
+            typer.echo(stream.getvalue(), err=True)
+        profiling.disable()
+
+    ctx.call_on_close(report)
 
 @app.command()
 def init_habits():
     """
     Initializes all preset habits.
     """
+    ht = get_tracker()
     h_workout = Habit("Workout", "Working out", "daily")
     h_water = Habit("Water", "Drinking at least 2l of water", "daily")
     h_sleep = Habit("Sleep", "Sleep at least 7h", "daily")
@@ -27,12 +85,18 @@ def init_habits():
     print("Preset habits have been initialized.")
 
 @app.command()
-def create_habit(name: str, definition: str, periodicity: Periodicity):
+def create_habit(name: str, definition: str, periodicity: str):
     """
     Creates a new habit. Requires all 3 arguments: name, definition and periodicity.
-    For the periodicity, you can choose between "daily" or "weekly".
+    For the periodicity, you can choose between "daily", "weekly", "monthly",
+    "every-N-days" (f.e. every-3-days) or "N-per-week" (f.e. 3-per-week).
     """
-    new_habit = Habit(name = name, definition = definition, periodicity = periodicity)
+    ht = get_tracker()
+    try:
+        new_habit = Habit(name = name, definition = definition, periodicity = periodicity)
+    except ValueError:
+        print(f"Invalid periodicity: {periodicity}.")
+        return
     try:
         ht.create(new_habit)
         print(f"Habit {name}: {definition} with periodicity {periodicity} has been created.")
@@ -46,17 +110,151 @@ def complete_habit(name: str, date: Optional[str] = typer.Option(None, help="Def
     Requires name as an argument. The date is optional, the default is today.
     State both the name and the date to add completed habits later on.
     """
+    ht = get_tracker()
     try:
         name, date = ht.complete_habit(name, date)
         print(f"The habit {name} was completed on the {date}.")
     except ValueError:
         print("Invalid date format. Please enter the date in the following format: YYYY-MM-DD.")
 
+def read_completions(path: Path, rejected: list):
+    """
+    Yields (name, date) rows of a CSV or JSONL file, adding invalid JSON lines to rejected.
+    """
+    with open(path, newline="") as file:
+        if path.suffix.lower() in (".jsonl", ".json"):
+            for number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                    yield row.get("name"), row.get("date")
+                except (ValueError, AttributeError):
+                    rejected.append((None, line.strip(), f"invalid JSON on line {number}"))
+        else:
+            for row in csv.DictReader(file):
+                yield row.get("name"), row.get("date") or None
+
+@app.command()
+def import_completions(path: Path, batch_size: int = typer.Option(1000, help="Number of completions stored per transaction")):
+    """
+    Imports completions from a CSV (columns: name,date) or JSONL file.
+    Completions of unknown habits or with an invalid date are reported instead of aborting the import.
+    """
+    ht = get_tracker()
+    rejected = []
+    stored, rejected_rows = ht.complete_habits_bulk(read_completions(path, rejected), batch_size=batch_size, require_date=True)
+    rejected += rejected_rows
+    print(f"{stored} completions have been imported.")
+    if rejected:
+        print(f"{len(rejected)} rows have been rejected:")
+        for name, date, reason in rejected:
+            print(f"{name} {date}: {reason}")
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    jsonl = "jsonl"
+
+@app.command()
+def export(output: Optional[Path] = typer.Option(None, help="File to write to - default is the terminal (stdout)"),
+           format: ExportFormat = typer.Option(ExportFormat.csv, help="csv or jsonl, both can be imported with import-completions"),
+           habit: Optional[str] = typer.Option(None, help="Only export the completions of this habit"),
+           start: Optional[str] = typer.Option(None, help="Only export completions from this date on (YYYY-MM-DD)"),
+           end: Optional[str] = typer.Option(None, help="Only export completions up to this date (YYYY-MM-DD)")):
+    """
+    Exports completions ordered by date as CSV or JSONL.
+    The completions are written while they're read, so large histories don't have to fit into memory.
+    """
+    ht = get_tracker()
+    file = open(output, "w", newline="") if output else sys.stdout
+    try:
+        if format == ExportFormat.csv:
+            writer = csv.writer(file)
+            writer.writerow(["name", "date"])
+            writer.writerows(ht.storage.iter_completions(habit, start, end))
+        else:
+            for name, date in ht.storage.iter_completions(habit, start, end):
+                file.write(json.dumps({"name": name, "date": date}) + "\n")
+    finally:
+        if output:
+            file.close()
+
+@app.command()
+def export_changes(since: int = typer.Option(0, help="Sequence number of the last synced change - 0 exports everything"),
+                   output: Optional[Path] = typer.Option(None, help="File to write to - default is the terminal (stdout)")):
+    """
+    Exports the changes of habits and completions since the last sync as JSON, to apply them on another device
+    with apply-changes. Use the "until" number of the export as --since of the next one.
+    """
+    ht = get_tracker()
+    changes = json.dumps(ht.export_changes(since), separators=(",", ":"))
+    if output:
+        with open(output, "w") as file:
+            file.write(changes)
+    else:
+        sys.stdout.write(changes + "\n")
+
+@app.command()
+def apply_changes(path: Path = typer.Argument(..., help="File written by export-changes, - for stdin")):
+    """
+    Applies changes exported with export-changes on another device, all in one transaction.
+    Applying the same changes twice does nothing the second time.
+    """
+    ht = get_tracker()
+    if str(path) == "-":
+        changes = json.load(sys.stdin)
+    else:
+        with open(path) as file:
+            changes = json.load(file)
+    applied = ht.apply_changes(changes)
+    print(f"{applied['habits']} habits and {applied['completions']} completions have been changed "
+          f"(changes {changes['since'] + 1} to {changes['until']}).")
+
+@app.command()
+def archive(before: str = typer.Option(..., help="Archive all completions before this date (YYYY-MM-DD)")):
+    """
+    Moves old completions into a compact archive (one bitset per habit and year) and compacts the database file.
+    All commands still show the archived completions, but the table of recent completions stays small.
+    """
+    ht = get_tracker()
+    try:
+        archived = ht.archive(before)
+    except ValueError:
+        print("Invalid date format. Please enter the date in the following format: YYYY-MM-DD.")
+        return
+    print(f"{archived} completions before {before} have been archived.")
+
+@app.command()
+def backup(path: Path,
+           compress: bool = typer.Option(False, help="Save the snapshot gzip compressed"),
+           pages: int = typer.Option(256, help="Pages copied per step (-1 copies everything at once)"),
+           sleep_ms: float = typer.Option(5.0, help="Pause between two steps, so other writes go on")):
+    """
+    Saves a snapshot of the database while it's in use - other commands and the server can keep writing.
+    """
+    ht = get_tracker()
+    result = ht.backup(str(path), compress, pages, sleep_ms / 1000)
+    print(f"Saved {result['pages']} pages ({result['bytes']} bytes) to {path} in {result['seconds']:.2f} s.")
+
+@app.command()
+def restore(path: Path):
+    """
+    Replaces all habits and completions with a snapshot saved by backup, after checking that it's intact.
+    """
+    ht = get_tracker()
+    try:
+        ht.restore(str(path))
+    except (OSError, DatabaseError) as error:
+        print(f"Could not restore {path}: {error}")
+        raise typer.Exit(1)
+    print(f"Restored {path}.")
+
 @app.command()
 def delete_habit(name: str):
     """
     Deletes a habit. Requires name as an argument.
     """
+    ht = get_tracker()
     ht.delete(name)
     print(f"Habit {name} has been deleted.")
 
@@ -67,6 +265,7 @@ def update_habit(name: str, definition: str, periodicity: str):
     Requires all 3 arguments: name, definition and periodicity.
     State the name of the habit you want to update and both the definition and periodicity including the update.
     """
+    ht = get_tracker()
     ht.update(name, definition, periodicity)
     print(f"Habit {name} has been updated. \nUpdated definition: {definition}\nUpdated periodicity: {periodicity}")
 
@@ -75,6 +274,7 @@ def show_allhabits():
     """
     Shows all habits.
     """
+    ht = get_tracker()
     for h in ht.allHabits:
         print(h)
 
@@ -83,8 +283,8 @@ def show_alltrackedhabits():
     """
     Shows all tracked habits and their completions.
     """
-    ht.completedHabits.sort()
-    for h in ht.completedHabits:
+    ht = get_tracker()
+    for h in ht.iter_completions():
         print(h)
 
 @app.command()
@@ -92,6 +292,7 @@ def show_completions(name: str):
     """
     Shows the completions of a habit. Requires the name of the habit as an argument.
     """
+    ht = get_tracker()
     completions = ht.get_habitcompletions(name)
     print(f"The habit {name} has been completed on the following days: \n{completions}")
 
@@ -100,36 +301,34 @@ def show_allstreaks_habit(name: str):
     """
     Shows all streaks of a habit. Requires the name of the habit as an argument.
     """
-    periodicity = ht.get_streakperiod(name)
-    streaks = ht.find_allstreaks(name)
-    if periodicity == 1:
-        for start, end, length in streaks:
-            print(f"Streak of {length} days from {start.date} to {end.date}.")
-    elif periodicity == 7:
-        for start, end, length in streaks:
-            print(f"Streak of {length} weeks from {start.date} to {end.date}.")
+    ht = get_tracker()
+    habit = ht.get_habit(name)
+    if habit is None:
+        print(f"There is no habit {name}.")
+        return
+    for start, end, length in ht.find_allstreaks(name):
+        print(f"Streak of {length} {habit.periodicity.unit} from {start.date} to {end.date}.")
 
 @app.command()
 def show_habit_longeststreak(name: str):
     """
     Shows the longest streak of a habit. Requires the name of the habit as an argument.
     """
-    periodicity = ht.get_streakperiod(name)
+    ht = get_tracker()
+    habit = ht.get_habit(name)
     consec_period, start, end = ht.get_longeststreak_habit(name)
     if consec_period == None:
         print("You have no streaks for this habit yet.")
     else:
-        if periodicity == 1:
-            print(f"Your longest streak is from {start} to {end}. Your longest streak is: {consec_period} days.")
-        elif periodicity == 7:
-            print(f"Your longest streak is from {start} to {end}. Your longest streak is: {consec_period} weeks.")
+        print(f"Your longest streak is from {start} to {end}. Your longest streak is: {consec_period} {habit.periodicity.unit}.")
 
 @app.command()
-def show_habit_sameperiodicity(periodicity: Periodicity):
+def show_habit_sameperiodicity(periodicity: str):
     """
     Shows all habits with the same periodicity.
-    For the periodicity, you can choose between "daily" or "weekly".
+    For the periodicity, you can choose between "daily", "weekly", "monthly", "every-N-days" or "N-per-week".
     """
+    ht = get_tracker()
     habits = ht.get_habits_sameperiodicity(periodicity)
     print(f"The following habits have the periodicity {periodicity}: {habits}")
 
@@ -138,6 +337,7 @@ def show_longeststreak_all():
     """
     Shows the longest streak run out of all habits.
     """
+    ht = get_tracker()
     habits, streak = ht.get_longeststreak_all()
     print(f"The following habit(s) have the longest streak of {streak} times:\n{habits}")
 
@@ -147,8 +347,261 @@ def show_date(date: str):
     Shows all completions for one specific date. Requires the date as an argument.
     Enter the date as follows: "YYYY-MM-DD"
     """
+    ht = get_tracker()
     completions = ht.get_date(date)
     print(f"You have completed the following habits on the date {date}: \n{completions}")
 
+@app.command()
+def show_due(date: Optional[str] = typer.Option(None, help="Default date is today")):
+    """
+    Shows the habits that still have to be completed today / this week / this month,
+    split into habits with a streak at risk and overdue habits.
+    """
+    ht = get_tracker()
+    report = ht.due_report(date)
+    if not report["due"]:
+        print("All habits are completed for now.")
+    for title, key in (("Complete these habits to keep your streak", "at_risk"), ("Overdue habits", "overdue")):
+        if report[key]:
+            print(f"{title}:")
+        for name, streak, last_completed, days_left in report[key]:
+            print(f"{name}: streak {streak}, last completed {last_completed or 'never'}, {days_left} day(s) left in this period")
+
+@app.command()
+def show_range(start: str, end: str):
+    """
+    Shows all completions between two dates (both included). Enter the dates as follows: "YYYY-MM-DD"
+    """
+    ht = get_tracker()
+    completions = ht.get_daterange(start, end)
+    print(f"You have completed the following habits between {start} and {end}: \n{completions}")
+
+@app.command()
+def show_counts(start: str, end: str, period: CalendarPeriod = typer.Option(CalendarPeriod.Week, help="Count per day, week or month")):
+    """
+    Shows how often every habit was completed per day, week or month between two dates (both included).
+    Enter the dates as follows: "YYYY-MM-DD"
+    """
+    ht = get_tracker()
+    for name, counts in ht.get_completioncounts(start, end, period).items():
+        print(f"{name}: " + ", ".join(f"{label}: {count}" for label, count in counts.items()))
+
+@app.command()
+def show_metrics(date: Optional[str] = typer.Option(None, help="Default date is today"),
+                 checkpoint: Optional[Path] = typer.Option(None, help="File with the state of the last run - only newer completions are processed, the file is updated")):
+    """
+    Shows how consistently every habit was completed in the last 7, 30 and 90 periods.
+    """
+    ht = get_tracker()
+    state = None
+    if checkpoint is not None and checkpoint.exists():
+        with open(checkpoint) as file:
+            state = json.load(file)
+    habit_metrics, state = ht.get_metrics(date, state)
+    if checkpoint is not None:
+        with open(checkpoint, "w") as file:
+            json.dump(state, file)
+    percent = lambda rate: f"{rate:.0%}" if rate is not None else "-"
+    for name, metrics in habit_metrics.items():
+        habit = ht.get_habit(name)
+        line = f"{name}: " + ", ".join(f"last {window} {habit.periodicity.unit}: {percent(metrics[f'rate_{window}'])}" for window in (7, 30, 90))
+        if metrics["trend"] is not None:
+            line += f", trend {metrics['trend']:+.0%}"
+        if metrics["best"] is not None:
+            line += f", best 30 {habit.periodicity.unit}: {percent(metrics['best']['rate'])} ({metrics['best']['start']} to {metrics['best']['end']})"
+        print(line)
+
+@app.command()
+def query_days(expression: str,
+               start: Optional[str] = typer.Option(None, help="Default is the first completion of any habit"),
+               end: Optional[str] = typer.Option(None, help="Default is the last completion of any habit")):
+    """
+    Shows the days matching a combination of habits with AND, OR, NOT and parentheses,
+    f.e. "Workout AND (Reading OR Meditation) AND NOT Sleep". Put names with spaces in quotes.
+    """
+    ht = get_tracker()
+    try:
+        dates = ht.query_days(expression, start, end)
+    except ValueError as error:
+        print(error)
+        raise typer.Exit(1)
+    for date in dates:
+        print(date)
+    print(f"{len(dates)} days")
+
+@app.command()
+def show_cooccurrence(start: Optional[str] = typer.Option(None, help="Default is the first completion of any habit"),
+                      end: Optional[str] = typer.Option(None, help="Default is the last completion of any habit")):
+    """
+    Shows for every pair of habits on how many days both were completed and how strongly
+    their completions are correlated (from -1, never on the same day, to 1, always on the same day).
+    """
+    ht = get_tracker()
+    counts, correlations = ht.get_cooccurrence(start, end)
+    names = list(dict.fromkeys(name for (name, _) in counts))
+    width = max((len(name) for name in names), default=0)
+    for title, values, cell in (("Days completed together", counts, lambda value: f"{value}"),
+                                ("Correlation", correlations, lambda value: "-" if value is None else f"{value:+.2f}")):
+        print(f"{title}:")
+        print(" " * width + "".join(f" {name[:7]:>7}" for name in names))
+        for a in names:
+            print(f"{a:<{width}}" + "".join(f" {cell(values[(a, b)]):>7}" for b in names))
+
+@app.command()
+def show_heatmap(start: str, end: str, period: CalendarPeriod = typer.Option(CalendarPeriod.Week, help="One cell per day, week or month")):
+    """
+    Shows a heatmap of the completion rate of every habit per day, week or month between two dates (both included).
+    Enter the dates as follows: "YYYY-MM-DD"
+    """
+    ht = get_tracker()
+    labels, heatmap = ht.get_heatmap(start, end, period)
+    shades = " ░▒▓█"
+    width = max((len(name) for name in heatmap), default=0)
+    print(f"From {labels[0]} to {labels[-1]}, one cell per {period.value}:" if labels else "No periods in this range.")
+    for name, rates in heatmap.items():
+        cells = "".join(shades[round(rate * (len(shades) - 1))] for rate in rates)
+        print(f"{name:<{width}} |{cells}| {sum(rates) / len(rates):.0%}" if rates else name)
+
+@app.command()
+def fleet_stats(databases: str = typer.Argument(..., help="Directory with the tracker databases (*.db) or a glob pattern"),
+                workers: Optional[int] = typer.Option(None, help="Number of worker processes - default is the number of CPUs"),
+                start: Optional[str] = typer.Option(None, help="Count completions from this date on - default is 4 weeks before the end"),
+                end: Optional[str] = typer.Option(None, help="Count completions up to this date - default is today"),
+                period: CalendarPeriod = typer.Option(CalendarPeriod.Week, help="Count per day, week or month"),
+                output: Optional[Path] = typer.Option(None, help="Also save the full report (with all shards) as JSON")):
+    """
+    Shows the stats of many tracker databases (f.e. one per user) at once: the longest streak out of all of them
+    and the number of completions per period. The databases are read in parallel and only read, never written.
+    """
+    from fleet import find_databases, fleet_stats
+    paths = find_databases(databases)
+    if not paths:
+        print(f"No databases found in {databases}.")
+        return
+    report = fleet_stats(paths, start, end, period.value, workers)
+    for shard in report["shards"]:
+        status = shard.get("error") or f"{shard['habits']} habits, longest streak {shard['longest_streak']['length']}"
+        print(f"{shard['path']}: {status} ({shard['seconds'] * 1000:.1f} ms)")
+    longest = report["longest_streak"]
+    print(f"{report['databases']} databases ({report['failed']} failed) read by {report['workers']} workers in {report['seconds']:.2f} s.")
+    print(f"The longest streak is {longest['length']} times: " + ", ".join(f"{name} ({path})" for path, name in longest["habits"]))
+    print(f"Completions from {report['start']} to {report['end']}: " + ", ".join(f"{label}: {count}" for label, count in report["counts"].items()))
+    if output is not None:
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+
+@app.command()
+def serve(host: str = typer.Option("127.0.0.1", help="Address to listen on - the default only accepts local connections"),
+          port: int = typer.Option(8000),
+          window_ms: float = typer.Option(2.0, help="How long writes are collected before they're committed together"),
+          read_workers: int = typer.Option(8, help="Number of threads serving reads")):
+    """
+    Serves the habit tracker as a JSON API over HTTP, f.e. for mobile clients.
+    Routes: /habits, /habits/NAME, /habits/NAME/completions, /habits/NAME/streaks, /completions, /streaks/longest, /due
+    """
+    import asyncio
+    from server import TrackerServer
+    server = TrackerServer(get_tracker(), window=window_ms / 1000, read_workers=read_workers)
+    print(f"Serving on http://{host}:{port} - stop with Ctrl+C")
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+def run_line(commands: dict, line: str, transaction = contextlib.nullcontext):
+    """
+    Runs one line of a script as a CLI command. Returns the error, or None.
+    """
+    import click
+    import shlex
+    try:
+        name, *args = shlex.split(line)
+        if name not in commands or name == "shell":
+            raise click.UsageError(f"No such command: {name}")
+        with transaction():
+            commands[name].main(args, prog_name=name, standalone_mode=False)
+    except click.ClickException as error:
+        return error.format_message()
+    except click.exceptions.Exit:
+        # --help of a command exits after printing the help
+        pass
+    except Exception as error:
+        return str(error) or type(error).__name__
+
+@app.command()
+def shell(script: Optional[Path] = typer.Argument(None, help="File with one command per line - default is stdin"),
+          json_output: bool = typer.Option(False, "--json", help="Print one JSON object per command with its output and error"),
+          group: int = typer.Option(100, min=1, help="Number of commands whose writes are committed in one transaction")):
+    """
+    Runs one command per line of a script (or stdin), written without "python CLI.py".
+    A failing command is rolled back and the next commands still run.
+    """
+    import io
+    import queue
+    import threading
+    import rich
+    interactive = script is None and sys.stdin.isatty()
+    if interactive:
+        # Every command is committed right away, like when running them one by one
+        group = 1
+    if json_output:
+        # Don't wrap long lines of the captured output
+        rich.reconfigure(soft_wrap=True)
+    commands = typer.main.get_command(app).commands
+    ht = get_tracker()
+    file = open(script) if script else sys.stdin
+    # Lines are read in another thread, so a group is committed as soon as no more input is waiting
+    # instead of keeping the write lock while waiting for the next line
+    lines = queue.Queue()
+    drained = object()
+
+    def read_lines():
+        for line in iter(file.readline, ""):
+            lines.put(line)
+        lines.put(None)
+
+    def next_line(wait: bool):
+        if interactive:
+            if not wait:
+                return drained
+            typer.echo("> ", nl=False)
+            return file.readline() or None
+        try:
+            return lines.get(block=wait)
+        except queue.Empty:
+            return drained
+
+    def run(line: str):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            return
+        if not json_output:
+            error = run_line(commands, line, ht.transaction)
+            if error:
+                print(f"Error: {error}")
+            return
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            error = run_line(commands, line, ht.transaction)
+        sys.stdout.write(json.dumps({"command": line, "ok": error is None, "error": error,
+                                     "output": output.getvalue().splitlines()}) + "\n")
+
+    if not interactive:
+        threading.Thread(target=read_lines, daemon=True).start()
+    try:
+        line = next_line(wait=True)
+        while line is not None:
+            with ht.transaction():
+                for _ in range(group):
+                    run(line)
+                    line = next_line(wait=False)
+                    if line is None or line is drained:
+                        break
+            if line is drained:
+                line = next_line(wait=True)
+    finally:
+        if script:
+            file.close()
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import numpy as np
+from classes import CustomPeriodicity, Periodicity, parse_periodicity
+
+# Day ordinal of 1970-01-01, the epoch of numpy's datetime64
+EPOCH_ORDINAL = 719163
+
+def buckets_all(habit_ids, days, periodicities: dict):
+    """
+    Returns the bucket id (see Periodicity.bucket) of every completion and the number of completions
+    needed per bucket, computed for all habits together.
+    """
+    size = max(habit_ids.max(), max(periodicities, default=0)) + 1
+    # Dense habit id -> kind / days per bucket / completions per bucket arrays. Kinds: 0 = blocks of days, 1 = ISO weeks, 2 = months
+    kind_lookup = np.zeros(size, dtype=np.int64)
+    every_lookup = np.ones(size, dtype=np.int64)
+    times_lookup = np.ones(size, dtype=np.int64)
+    for habit_id, periodicity in periodicities.items():
+        periodicity = parse_periodicity(periodicity)
+        times_lookup[habit_id] = periodicity.times
+        if periodicity == Periodicity.Monthly:
+            kind_lookup[habit_id] = 2
+        elif periodicity == Periodicity.Weekly or (isinstance(periodicity, CustomPeriodicity) and periodicity.every == 7):
+            kind_lookup[habit_id] = 1
+        elif isinstance(periodicity, CustomPeriodicity):
+            every_lookup[habit_id] = periodicity.every
+
+    kinds = kind_lookup[habit_ids]
+    buckets = days // every_lookup[habit_ids]
+    weeks = kinds == 1
+    buckets[weeks] = (days[weeks] - 1) // 7
+    months = kinds == 2
+    month_ids = (days[months] - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    # datetime64 months count from January 1970, Periodicity.bucket counts from January of year 0
+    buckets[months] = month_ids + 1970 * 12
+    return buckets, times_lookup[habit_ids]
+
+def find_streakruns_all(habit_ids, days, periodicities: dict):
+    """
+    Finds the streak runs of all habits at once.
+    habit_ids and days are equally long sequences of integers (habit id and day ordinal of every completion),
+    grouped by habit and sorted by day within each habit. periodicities maps each habit id to its periodicity.
+    Uses the same rules as streaks.find_streakruns, but computes the buckets and run boundaries of all habits
+    together with array operations instead of looking at one completion at a time.
+    Returns 4 arrays: habit id, start day, end day and length of every streak run.
+    """
+    habit_ids = np.asarray(habit_ids, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    if len(days) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+
+    buckets, times = buckets_all(habit_ids, days, periodicities)
+
+    # Group the completions by habit and bucket - duplicates of a day are only counted once
+    new_day = np.ones(len(days), dtype=bool)
+    new_day[1:] = (habit_ids[1:] != habit_ids[:-1]) | (days[1:] != days[:-1])
+    new_bucket = np.ones(len(days), dtype=bool)
+    new_bucket[1:] = (habit_ids[1:] != habit_ids[:-1]) | (buckets[1:] != buckets[:-1])
+    group_starts = np.flatnonzero(new_bucket)
+    group_ends = np.append(group_starts[1:], len(days)) - 1
+    counts = np.add.reduceat(new_day.astype(np.int64), group_starts)
+
+    # Only buckets with enough completions count for a streak
+    kept = counts >= times[group_starts]
+    group_starts = group_starts[kept]
+    group_ends = group_ends[kept]
+    group_ids = habit_ids[group_starts]
+    group_buckets = buckets[group_starts]
+    if len(group_starts) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+
+    # A new run starts with the first bucket of every habit and after every missing bucket
+    new_run = np.ones(len(group_starts), dtype=bool)
+    new_run[1:] = (group_ids[1:] != group_ids[:-1]) | (group_buckets[1:] != group_buckets[:-1] + 1)
+    run_starts = np.flatnonzero(new_run)
+    run_ends = np.append(run_starts[1:], len(group_starts)) - 1
+    lengths = run_ends - run_starts + 1
+    return group_ids[run_starts], days[group_starts[run_starts]], days[group_ends[run_ends]], lengths
+
+def longest_streaks(run_habit_ids, run_lengths):
+    """
+    Returns a dict of habit id -> length of the longest streak run, given the output of find_streakruns_all.
+    """
+    if len(run_lengths) == 0:
+        return {}
+    order = np.lexsort((run_lengths, run_habit_ids))
+    sorted_ids = run_habit_ids[order]
+    # The last run of every habit group is its longest one
+    last = np.append(sorted_ids[1:] != sorted_ids[:-1], True)
+    return dict(zip(sorted_ids[last].tolist(), run_lengths[order][last].tolist()))
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the habit tracker. Run a benchmark as a module from the project root, f.e.:
+python -m benchmarks.startup
+"""
@@ -0,0 +1,81 @@
+"""
+Measures the latency of completions while an online backup of a large tracker runs, compared to no backup:
+once copying everything in one step and once page-step by page-step with pauses in between.
+Usage: python -m benchmarks.backup --habits 100 --completions 1000000 --pages 256 --sleep-ms 5
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.datagen import generate
+from benchmarks.loadtest import percentile
+from database import Database
+
+def write_until(database: Database, habits: int, stop: threading.Event, latencies: list, seed: int):
+    """
+    Completes random habits on random future dates until stop is set and records the latency of every completion.
+    """
+    rng = random.Random(seed)
+    start_day = datetime.date(2030, 1, 1).toordinal()
+    while not stop.is_set():
+        date = datetime.date.fromordinal(start_day + rng.randrange(36500)).isoformat()
+        started = time.perf_counter()
+        database.complete_habit(f"habit{rng.randrange(habits)}", date)
+        latencies.append(time.perf_counter() - started)
+
+def measure(database: Database, habits: int, run, seed: int = 0) -> dict:
+    """
+    Runs run() while another thread keeps writing and returns the duration and the write latencies.
+    Every run needs its own seed, otherwise it repeats the completions of the runs before (which are no-ops).
+    """
+    latencies = []
+    stop = threading.Event()
+    writer = threading.Thread(target=write_until, args=(database, habits, stop, latencies, seed))
+    writer.start()
+    started = time.perf_counter()
+    try:
+        run()
+    finally:
+        seconds = time.perf_counter() - started
+        stop.set()
+        writer.join()
+    return {"seconds": seconds, "writes": len(latencies),
+            **{f"p{int(share * 100)}_ms": percentile(latencies, share) * 1000 for share in (0.5, 0.99)},
+            "max_ms": max(latencies, default=0) * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--habits", type=int, default=100)
+    parser.add_argument("--completions", type=int, default=1000000)
+    parser.add_argument("--pages", type=int, default=256, help="Pages copied per step of the stepped backup")
+    parser.add_argument("--sleep-ms", type=float, default=5.0, help="Pause between two steps of the stepped backup")
+    parser.add_argument("--idle-seconds", type=float, default=2.0, help="Duration of the run without backup")
+    parser.add_argument("--compress", action="store_true", help="Also gzip the snapshots")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "database.db")
+        generate(path, args.habits, args.completions).close()
+        database = Database(path, pooled=True)
+        target = os.path.join(workdir, "snapshot.db")
+        runs = {
+            "no backup": lambda: time.sleep(args.idle_seconds),
+            "one step": lambda: database.backup(target, pages=-1, sleep=0, compress=args.compress),
+            f"{args.pages} pages/step": lambda: database.backup(target, pages=args.pages, sleep=args.sleep_ms / 1000,
+                                                                compress=args.compress),
+        }
+        print(f"{os.path.getsize(path) / 1e6:.1f} MB database")
+        print(f"{'':>16} {'seconds':>8} {'writes':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        # A first run warms up the page cache
+        measure(database, args.habits, lambda: time.sleep(args.idle_seconds), seed=len(runs))
+        for seed, (name, run) in enumerate(runs.items()):
+            r = measure(database, args.habits, run, seed)
+            print(f"{name:>16} {r['seconds']:>8.2f} {r['writes']:>8} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}")
+        database.close()
+
+if __name__ == "__main__":
+    main()
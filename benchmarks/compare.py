@@ -0,0 +1,41 @@
+"""
+Compares two result files of benchmarks.run and reports the benchmarks that got slower.
+Usage: python -m benchmarks.compare baseline.json new.json --threshold 1.2
+Exits with status 1 if any benchmark is slower than threshold times its baseline.
+"""
+import argparse
+import json
+import sys
+
+def compare(baseline: dict, new: dict):
+    """
+    Returns (name, baseline seconds, new seconds, ratio) of all benchmarks in both results, using the median.
+    """
+    rows = []
+    for name, result in new["results"].items():
+        if name in baseline["results"]:
+            old_time = baseline["results"][name]["median"]
+            new_time = result["median"]
+            rows.append((name, old_time, new_time, new_time / old_time if old_time else float("inf")))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args()
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+
+    regressions = 0
+    for name, old_time, new_time, ratio in compare(baseline, new):
+        flag = "REGRESSION" if ratio > args.threshold else ""
+        regressions += ratio > args.threshold
+        print(f"{name:<45} {old_time * 1000:>10.3f} ms {new_time * 1000:>10.3f} ms {ratio:>6.2f}x {flag}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures read throughput of a pooled Database shared by a growing number of threads,
+while one writer thread keeps completing habits.
+"""
+import datetime
+import os
+import tempfile
+import threading
+import time
+
+from classes import Habit
+from database import Database
+from main import HabitTracker
+
+def create_tracker(path: str, habits: int = 100, days: int = 365) -> HabitTracker:
+    tracker = HabitTracker(storage=Database(path, pooled=True))
+    today = datetime.date.today()
+    for i in range(habits):
+        tracker.create(Habit(f"habit{i}", "benchmark habit", "daily"))
+    tracker.complete_habits_bulk(((f"habit{i}", (today - datetime.timedelta(days=day)).isoformat())
+                                  for i in range(habits) for day in range(1, days + 1)), batch_size=10000)
+    return tracker
+
+def run(tracker: HabitTracker, threads: int, duration: float = 2.0, habits: int = 100):
+    """
+    Returns the number of reads and writes per second with the given number of reader threads.
+    """
+    stop = threading.Event()
+    reads = [0] * threads
+    writes = [0]
+
+    def read(index):
+        storage = tracker.storage
+        while not stop.is_set():
+            # Read straight from the storage, so the analytics cache doesn't answer the queries
+            storage.get_completiondays(f"habit{reads[index] % habits}")
+            reads[index] += 1
+
+    def write():
+        day = datetime.date.today() + datetime.timedelta(days=1)
+        while not stop.is_set():
+            tracker.complete_habit(f"habit{writes[0] % habits}", (day + datetime.timedelta(days=writes[0] // habits)).isoformat())
+            writes[0] += 1
+
+    workers = [threading.Thread(target=read, args=(i, )) for i in range(threads)] + [threading.Thread(target=write)]
+    for worker in workers:
+        worker.start()
+    time.sleep(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return sum(reads) / duration, writes[0] / duration
+
+def main(thread_counts=(1, 2, 4, 8)):
+    with tempfile.TemporaryDirectory() as workdir:
+        tracker = create_tracker(os.path.join(workdir, "database.db"))
+        print(f"{'threads':>8} {'reads/s':>10} {'writes/s':>10}")
+        for threads in thread_counts:
+            reads, writes = run(tracker, threads)
+            print(f"{threads:>8} {reads:>10.0f} {writes:>10.0f}")
+        tracker.storage.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Generates reproducible synthetic tracker databases for the benchmarks.
+Usage: python -m benchmarks.datagen bench.db --habits 1000 --completions 1000000
+"""
+import argparse
+import datetime
+import random
+
+from database import Database
+
+def generate(path: str, habits: int = 10, completions: int = 1000, gap_probability: float = 0.1,
+             duplicate_probability: float = 0.01, weekly_share: float = 0.2, seed: int = 0,
+             end: datetime.date = datetime.date(2022, 12, 31), batch_size: int = 50000) -> Database:
+    """
+    Creates a database with the given number of habits and (about) the given number of completions,
+    spread evenly over the habits. Every habit is completed on consecutive days/weeks going back from the end date,
+    where a day/week is skipped with gap_probability (breaking the streak) and a completion is stored twice
+    with duplicate_probability (duplicates are skipped by the database, like repeated completions in the app).
+    The same arguments always generate the same database.
+    """
+    rng = random.Random(seed)
+    database = Database(path)
+    database.database.executemany("INSERT INTO habit (name, definition, periodicity) VALUES (?, ?, ?)",
+                                  [(f"habit{i}", f"Synthetic habit {i}", "weekly" if rng.random() < weekly_share else "daily")
+                                   for i in range(habits)])
+    database.database.commit()
+
+    batch = []
+    for (_, name, periodicity) in database.get_habitids():
+        step = 7 if periodicity == "weekly" else 1
+        day = end.toordinal()
+        for _ in range(completions // habits):
+            if rng.random() < gap_probability:
+                day -= step
+            date = datetime.date.fromordinal(day).isoformat()
+            batch.append((name, date))
+            if rng.random() < duplicate_probability:
+                batch.append((name, date))
+            day -= step
+        if len(batch) >= batch_size:
+            database.complete_habits_bulk(batch)
+            batch = []
+    database.complete_habits_bulk(batch)
+    return database
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path")
+    parser.add_argument("--habits", type=int, default=10)
+    parser.add_argument("--completions", type=int, default=1000)
+    parser.add_argument("--gap-probability", type=float, default=0.1)
+    parser.add_argument("--duplicate-probability", type=float, default=0.01)
+    parser.add_argument("--weekly-share", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.path, args.habits, args.completions, args.gap_probability, args.duplicate_probability,
+             args.weekly_share, args.seed).close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Measures how the fleet stats scale with the number of worker processes on a fleet of synthetic tracker databases.
+Usage: python -m benchmarks.fleet --databases 32 --completions 20000
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.datagen import generate
+from fleet import find_databases, fleet_stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--databases", type=int, default=16)
+    parser.add_argument("--habits", type=int, default=10)
+    parser.add_argument("--completions", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for i in range(args.databases):
+            generate(os.path.join(workdir, f"user{i}.db"), args.habits, args.completions, seed=i).close()
+        paths = find_databases(workdir)
+        print(f"{'workers':>8} {'seconds':>10} {'speedup':>10} {'shard ms':>10}")
+        baseline = None
+        for workers in args.workers:
+            report = fleet_stats(paths, "2022-01-01", "2022-12-31", "month", workers)
+            baseline = baseline or report["seconds"]
+            shard_ms = sum(shard["seconds"] for shard in report["shards"]) / len(paths) * 1000
+            print(f"{workers:>8} {report['seconds']:>10.3f} {baseline / report['seconds']:>10.2f} {shard_ms:>10.1f}")
+
+if __name__ == "__main__":
+    main()
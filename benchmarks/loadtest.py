@@ -0,0 +1,126 @@
+"""
+Load test of the HTTP service (CLI.py serve): concurrent clients send a mix of completions and reads
+over keep-alive connections, and the requests per second and latency percentiles are reported.
+Without --port, a server is started on a fresh synthetic database.
+Usage: python -m benchmarks.loadtest --clients 64 --duration 10 --write-share 0.5
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.startup import CLI_PATH, PROJECT_DIR, create_database
+
+async def request(reader, writer, method: str, path: str, body: dict = None) -> int:
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    await reader.readexactly(length)
+    return status
+
+async def client(host: str, port: int, habits: int, write_share: float, stop: float, seed: int, latencies: dict, errors: list):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    start_day = datetime.date(2030, 1, 1).toordinal()
+    try:
+        while time.perf_counter() < stop:
+            habit = f"habit{rng.randrange(habits)}"
+            if rng.random() < write_share:
+                kind, method, path = "write", "POST", f"/habits/{habit}/completions"
+                body = {"date": datetime.date.fromordinal(start_day + rng.randrange(3650)).isoformat()}
+            else:
+                kind, method, path, body = "read", "GET", rng.choice([f"/habits/{habit}", f"/habits/{habit}/streaks", "/due"]), None
+            started = time.perf_counter()
+            status = await request(reader, writer, method, path, body)
+            latencies[kind].append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+def percentile(values: list, share: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+async def run(host: str, port: int, clients: int, duration: float, habits: int, write_share: float) -> dict:
+    latencies = {"read": [], "write": []}
+    errors = []
+    stop = time.perf_counter() + duration
+    await asyncio.gather(*(client(host, port, habits, write_share, stop, seed, latencies, errors) for seed in range(clients)))
+    results = {"errors": len(errors)}
+    for kind, values in latencies.items():
+        results[kind] = {"requests": len(values), "per_second": len(values) / duration,
+                         **{f"p{int(share * 100)}_ms": percentile(values, share) * 1000 for share in (0.5, 0.9, 0.99)},
+                         "max_ms": max(values, default=0) * 1000}
+    return results
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for(host: str, port: int, timeout: float = 10.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.05)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Port of a running server - default is to start one")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--habits", type=int, default=100)
+    parser.add_argument("--write-share", type=float, default=0.5, help="Share of the requests that complete a habit")
+    parser.add_argument("--window-ms", type=float, default=2.0, help="Group commit window of the started server")
+    parser.add_argument("--output", help="Also save the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        port = args.port
+        if port is None:
+            create_database(os.path.join(workdir, "database.db"), args.habits, 365)
+            port = free_port()
+            server = subprocess.Popen([sys.executable, CLI_PATH, "serve", "--port", str(port), "--window-ms", str(args.window_ms)],
+                                      cwd=workdir, env=dict(os.environ, PYTHONPATH=PROJECT_DIR), stdout=subprocess.DEVNULL)
+        try:
+            wait_for(args.host, port)
+            results = asyncio.run(run(args.host, port, args.clients, args.duration, args.habits, args.write_share))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    print(f"{'':>6} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind in ("read", "write"):
+        r = results[kind]
+        print(f"{kind:>6} {r['requests']:>9} {r['per_second']:>9.0f} {r['p50_ms']:>8.2f} {r['p90_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}")
+    print(f"{results['errors']} error responses")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"clients": args.clients, "duration": args.duration, "write_share": args.write_share, **results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Times the public HabitTracker and Database methods and the main CLI commands on a synthetic dataset
+and writes the results as JSON, so runs can be compared with benchmarks.compare.
+Usage: python -m benchmarks.run --habits 100 --completions 100000 --output bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.datagen import generate
+from benchmarks.startup import time_command
+from classes import Habit
+from database import Database
+from main import HabitTracker
+
+def measure(function, setup=None, teardown=None, repeat: int = 5) -> dict:
+    """
+    Runs function repeat times and returns the fastest and the median time in seconds.
+    setup is called before every run (not timed) and its result is passed to function and afterwards to teardown.
+    """
+    timings = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument) if setup else function()
+        timings.append(time.perf_counter() - start)
+        if teardown:
+            teardown(argument)
+    return {"min": min(timings), "median": statistics.median(timings), "repeat": repeat}
+
+def benchmark_cases(path: str):
+    """
+    Returns (name, function, setup, teardown) of all benchmarks on the database at path.
+    Trackers are created in the setup, so their lazy loading and caches are measured cold, and closed in the teardown.
+    Left out are the methods that change the dataset for all later cases (archive, apply_changes, restore)
+    and the ones with their own benchmarks: backup under load (benchmarks.backup), the server (benchmarks.loadtest,
+    benchmarks.concurrency) and fleet statistics (benchmarks.fleet).
+    """
+    def tracker():
+        return HabitTracker(storage=Database(path))
+
+    def close(ht):
+        ht.storage.close()
+
+    habit = "habit0"
+    date = datetime.date(2022, 12, 1).isoformat()
+    start = datetime.date(2022, 11, 1).isoformat()
+    snapshot = f"{path}.bak"
+    counter = iter(range(10 ** 9))
+
+    def new_habit(ht):
+        name = f"benchmark{next(counter)}"
+        ht.create(Habit(name, "benchmark habit", "daily"))
+        return name
+
+    def complete_bulk(ht, name):
+        # One new habit per run, as every habit makes the pairwise analytics (get_cooccurrence) of later cases slower
+        first = datetime.date(2031, 1, 1)
+        return ht.complete_habits_bulk((name, (first + datetime.timedelta(days=i)).isoformat()) for i in range(1000))
+
+    cases = [
+        ("HabitTracker.allHabits", lambda ht: ht.allHabits, tracker),
+        ("HabitTracker.completedHabits", lambda ht: ht.completedHabits, tracker),
+        ("HabitTracker.get_habit", lambda ht: ht.get_habit(habit), tracker),
+        ("HabitTracker.get_streakperiod", lambda ht: ht.get_streakperiod(habit), tracker),
+        ("HabitTracker.create", lambda ht: new_habit(ht), tracker),
+        ("HabitTracker.update", lambda ht: ht.update(new_habit(ht), "updated", "weekly"), tracker),
+        ("HabitTracker.delete", lambda ht: ht.delete(new_habit(ht)), tracker),
+        ("HabitTracker.complete_habit", lambda ht: ht.complete_habit(habit, datetime.date(2030, 1, 1 + next(counter) % 28).isoformat()), tracker),
+        ("HabitTracker.complete_habits_bulk", lambda ht: complete_bulk(ht, new_habit(ht)), tracker),
+        ("HabitTracker.get_habitcompletions", lambda ht: ht.get_habitcompletions(habit), tracker),
+        ("HabitTracker.iter_completions", lambda ht: sum(1 for _ in ht.iter_completions(habit)), tracker),
+        ("HabitTracker.find_allstreaks", lambda ht: ht.find_allstreaks(habit), tracker),
+        ("HabitTracker.find_allstreaks (cached)", lambda ht: ht.find_allstreaks(habit), lambda: warm(tracker(), habit)),
+        ("HabitTracker.get_longeststreak_habit", lambda ht: ht.get_longeststreak_habit(habit), tracker),
+        ("HabitTracker.get_longeststreak_all", lambda ht: ht.get_longeststreak_all(), tracker),
+        ("HabitTracker.find_allstreaks_all", lambda ht: ht.find_allstreaks_all(), tracker),
+        ("HabitTracker.get_habits_sameperiodicity", lambda ht: ht.get_habits_sameperiodicity("daily"), tracker),
+        ("HabitTracker.get_date", lambda ht: ht.get_date(date), tracker),
+        ("HabitTracker.get_daterange", lambda ht: ht.get_daterange(start, date), tracker),
+        ("HabitTracker.get_completioncounts", lambda ht: ht.get_completioncounts(start, date, "week"), tracker),
+        ("HabitTracker.get_heatmap", lambda ht: ht.get_heatmap(start, date), tracker),
+        ("HabitTracker.due_report", lambda ht: ht.due_report(date), tracker),
+        ("HabitTracker.get_metrics", lambda ht: ht.get_metrics(date), tracker),
+        ("HabitTracker.get_bitsetindex", lambda ht: ht.get_bitsetindex(), tracker),
+        ("HabitTracker.query_days", lambda ht: ht.query_days(f"{habit} AND NOT habit1"), tracker),
+        ("HabitTracker.get_cooccurrence", lambda ht: ht.get_cooccurrence(), tracker),
+        ("HabitTracker.export_changes", lambda ht: ht.export_changes(), tracker),
+        ("HabitTracker.backup", lambda ht: ht.backup(snapshot, pages=-1, sleep=0), tracker),
+        ("Database.get_allhabits", lambda ht: ht.storage.get_allhabits(), tracker),
+        ("Database.get_alltrackedhabits", lambda ht: ht.storage.get_alltrackedhabits(), tracker),
+        ("Database.get_completionstore", lambda ht: ht.storage.get_completionstore(), tracker),
+        ("Database.get_completedhabits", lambda ht: ht.storage.get_completedhabits(habit), tracker),
+        ("Database.get_completiondays", lambda ht: ht.storage.get_completiondays(habit), tracker),
+        ("Database.get_allcompletiondays", lambda ht: ht.storage.get_allcompletiondays(), tracker),
+        ("Database.get_streaks", lambda ht: ht.storage.get_streaks(habit), tracker),
+        ("Database.get_lateststatus", lambda ht: ht.storage.get_lateststatus(date), tracker),
+        ("Database.get_bitsets", lambda ht: ht.storage.get_bitsets(), tracker),
+        ("Database.list_completionsondate", lambda ht: ht.storage.list_completionsondate(date), tracker),
+        ("Database.count_completions", lambda ht: ht.storage.count_completions(start, date, "week"), tracker),
+    ]
+    return [(name, function, setup, close) for name, function, setup in cases]
+
+# Habits created by init-habits
+PRESET_HABITS = ("Workout", "Water", "Sleep", "Steps", "Stretch")
+
+def change_database(path: str, change):
+    """
+    Returns a setup that changes the database at path with change(tracker), f.e. to undo the last run of a command.
+    """
+    def setup():
+        ht = HabitTracker(storage=Database(path))
+        try:
+            change(ht)
+        finally:
+            ht.storage.close()
+    return setup
+
+def cli_commands(workdir: str, path: str) -> list:
+    """
+    Returns (arguments, setup) of the timed CLI commands, run in workdir on the database at path.
+    The files they read are created in workdir first. Commands that can't run twice on the same data get a setup
+    that undoes the last run. serve isn't timed, as it runs until it's stopped (see benchmarks.loadtest).
+    """
+    with open(os.path.join(workdir, "completions.csv"), "w") as file:
+        file.write("name,date\n")
+        for i in range(1000):
+            file.write(f"habit0,{(datetime.date(2032, 1, 1) + datetime.timedelta(days=i)).isoformat()}\n")
+    with open(os.path.join(workdir, "script.txt"), "w") as file:
+        file.write("\n".join(["complete-habit habit0", "show-habit-longeststreak habit0", "show-due"]) + "\n")
+    storage = Database(path)
+    with open(os.path.join(workdir, "changes.json"), "w") as file:
+        json.dump(storage.export_changes(), file)
+    snapshot = os.path.join(workdir, "snapshot.db")
+    storage.backup(snapshot, pages=-1, sleep=0)
+    storage.close()
+
+    def delete_habits(*names):
+        return change_database(path, lambda ht: [ht.delete(name) for name in names if ht.get_habit(name)])
+
+    def create_habit(name):
+        return change_database(path, lambda ht: ht.get_habit(name) or ht.create(Habit(name, "benchmark habit", "daily")))
+
+    start, end = "2022-11-01", "2022-12-31"
+    return [
+        (["--help"], None),
+        (["init-habits"], delete_habits(*PRESET_HABITS)),
+        (["create-habit", "cli habit", "benchmark habit", "daily"], delete_habits("cli habit")),
+        (["update-habit", "habit1", "benchmark habit", "daily"], None),
+        (["delete-habit", "cli deleted"], create_habit("cli deleted")),
+        (["complete-habit", "habit0"], None),
+        (["import-completions", "completions.csv"], None),
+        (["export", "--output", "export.csv"], None),
+        (["export-changes", "--output", "export.json"], None),
+        (["apply-changes", "changes.json"], None),
+        (["backup", "backup.db", "--pages", "-1", "--sleep-ms", "0"], None),
+        (["restore", "snapshot.db"], None),
+        (["show-allhabits"], None),
+        (["show-alltrackedhabits"], None),
+        (["show-completions", "habit0"], None),
+        (["show-allstreaks-habit", "habit0"], None),
+        (["show-habit-longeststreak", "habit0"], None),
+        (["show-habit-sameperiodicity", "daily"], None),
+        (["show-longeststreak-all"], None),
+        (["show-date", end], None),
+        (["show-due"], None),
+        (["show-range", start, end], None),
+        (["show-counts", start, end], None),
+        (["show-metrics"], None),
+        (["query-days", "habit0 AND NOT habit1"], None),
+        (["show-cooccurrence"], None),
+        (["show-heatmap", start, end], None),
+        (["fleet-stats", "database.db", "--workers", "1"], None),
+        (["shell", "script.txt"], None),
+        # Every run archives the same completions again
+        (["archive", "--before", "2022-07-01"], change_database(path, lambda ht: ht.restore(snapshot))),
+    ]
+
+def warm(ht: HabitTracker, habit: str) -> HabitTracker:
+    ht.find_allstreaks(habit)
+    return ht
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--habits", type=int, default=10)
+    parser.add_argument("--completions", type=int, default=10000)
+    parser.add_argument("--gap-probability", type=float, default=0.1)
+    parser.add_argument("--duplicate-probability", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-cli", action="store_true", help="Don't time the CLI commands")
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+
+    dataset = {"habits": args.habits, "completions": args.completions, "gap_probability": args.gap_probability,
+               "duplicate_probability": args.duplicate_probability, "seed": args.seed}
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "database.db")
+        generate(path, args.habits, args.completions, args.gap_probability, args.duplicate_probability,
+                 seed=args.seed).close()
+
+        for name, function, setup, teardown in benchmark_cases(path):
+            results[name] = measure(function, setup, teardown, args.repeat)
+            print(f"{name:<45} {results[name]['median'] * 1000:>10.3f} ms")
+
+        if not args.skip_cli:
+            for command, setup in cli_commands(workdir, path):
+                name = "CLI " + " ".join(command)
+                seconds = time_command(workdir, *command, repeat=args.repeat, setup=setup)
+                results[name] = {"min": seconds, "median": seconds, "repeat": args.repeat}
+                print(f"{name:<45} {seconds * 1000:>10.3f} ms")
+
+    with open(args.output, "w") as file:
+        json.dump({"dataset": dataset, "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                   "created": datetime.datetime.now().isoformat(timespec="seconds"), "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
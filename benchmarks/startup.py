@@ -0,0 +1,57 @@
+"""
+Measures the cold start of `python CLI.py complete-habit` for databases of growing size.
+The time should stay about the same no matter how many completions are stored.
+"""
+import datetime
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from classes import Habit
+from database import Database
+from main import HabitTracker
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI_PATH = os.path.join(PROJECT_DIR, "CLI.py")
+
+def create_database(path: str, habits: int, completions_per_habit: int):
+    """
+    Creates a database with daily habits that were completed every day up until today.
+    """
+    tracker = HabitTracker(storage=Database(path))
+    today = datetime.date.today()
+    for i in range(habits):
+        tracker.create(Habit(f"habit{i}", "benchmark habit", "daily"))
+    completions = ((f"habit{i}", (today - datetime.timedelta(days=day)).isoformat())
+                   for i in range(habits) for day in range(1, completions_per_habit + 1))
+    tracker.complete_habits_bulk(completions, batch_size=10000)
+    tracker.storage.database.close()
+
+def time_command(workdir: str, *args, repeat: int = 5, setup=None) -> float:
+    """
+    Returns the fastest wall time (in seconds) of running the CLI with the given arguments in workdir.
+    setup is called before every run (not timed).
+    """
+    timings = []
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        subprocess.run([sys.executable, CLI_PATH, *args], cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main(sizes=((10, 10), (100, 365), (1000, 365))):
+    print(f"{'habits':>8} {'completions':>12} {'--help':>10} {'complete-habit':>15}")
+    for habits, completions_per_habit in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            create_database(os.path.join(workdir, "database.db"), habits, completions_per_habit)
+            help_time = time_command(workdir, "--help")
+            complete_time = time_command(workdir, "complete-habit", "habit0")
+            print(f"{habits:>8} {habits * completions_per_habit:>12} {help_time:>9.3f}s {complete_time:>14.3f}s")
+
+if __name__ == "__main__":
+    main()
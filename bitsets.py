@@ -0,0 +1,146 @@
+import math
+import re
+from typing import Dict, List, Tuple
+
+def days_bitset(days) -> Tuple[int, int]:
+    """
+    Returns the completions (sorted day ordinals) as (first day, bitset): bit n is set if day first + n is a completion.
+    """
+    if not len(days):
+        return 0, 0
+    first = days[0]
+    bits = bytearray((days[-1] - first) // 8 + 1)
+    for day in days:
+        offset = day - first
+        bits[offset >> 3] |= 1 << (offset & 7)
+    return first, int.from_bytes(bits, "little")
+
+def popcount(bits: int) -> int:
+    return bin(bits).count("1")
+
+# Tokens of a set expression: parentheses, operators (also as words) and habit names (quoted if they contain spaces)
+TOKEN = re.compile(r"""\s*(?:(?P<operator>[()&|~])|"(?P<quoted>[^"]*)"|'(?P<single>[^']*)'|(?P<word>[^\s()&|~"']+))""")
+
+class BitsetIndex:
+    """
+    The completions of all habits as one bitset per habit, aligned to the same first day (start),
+    so set queries over habits are bit operations on whole integers (many days per machine word)
+    instead of comparisons of single completions: AND is &, OR is |, NOT is ~ within the days from start to end.
+    """
+    def __init__(self, bitsets: Dict[str, Tuple[int, int]], start: int = None, end: int = None):
+        used = {name: (first, bits) for name, (first, bits) in bitsets.items() if bits}
+        self.start = start if start is not None else min((first for first, _ in used.values()), default=0)
+        self.end = end if end is not None else max((first + bits.bit_length() - 1 for first, bits in used.values()),
+                                                   default=self.start)
+        # All days from start to end
+        self.universe = (1 << max(self.end - self.start + 1, 0)) - 1
+        self.bitsets = {}
+        for name, (first, bits) in bitsets.items():
+            shift = first - self.start
+            self.bitsets[name] = (bits << shift if shift >= 0 else bits >> -shift) & self.universe
+
+    def days_of(self, bits: int) -> List[int]:
+        """
+        Returns the day ordinals of the set bits
+        """
+        return [self.start + offset for offset, bit in enumerate(reversed(bin(bits)[2:])) if bit == "1"]
+
+    def evaluate(self, expression: str) -> int:
+        """
+        Returns the bitset of the days matching an expression of habit names with AND/OR/NOT (or &, |, ~)
+        and parentheses, f.e. "Workout AND Sleep AND NOT Water". NOT binds strongest, then AND, then OR.
+        Raises a ValueError for unknown habits or invalid expressions.
+        """
+        tokens = []
+        position = 0
+        expression = expression.strip()
+        while position < len(expression):
+            match = TOKEN.match(expression, position)
+            if match is None:
+                raise ValueError(f"Invalid expression at: {expression[position:]}")
+            position = match.end()
+            word = match.group("word")
+            operator = match.group("operator") or {"AND": "&", "OR": "|", "NOT": "~"}.get(word.upper() if word else None)
+            if operator is not None:
+                tokens.append(("operator", operator))
+            else:
+                tokens.append(("name", next(group for group in match.group("quoted", "single", "word") if group is not None)))
+        tokens.append(("end", None))
+        position = 0
+
+        def peek(operator):
+            return tokens[position] == ("operator", operator)
+
+        def parse_or():
+            nonlocal position
+            bits = parse_and()
+            while peek("|"):
+                position += 1
+                bits |= parse_and()
+            return bits
+
+        def parse_and():
+            nonlocal position
+            bits = parse_not()
+            while peek("&"):
+                position += 1
+                bits &= parse_not()
+            return bits
+
+        def parse_not():
+            nonlocal position
+            if peek("~"):
+                position += 1
+                return self.universe & ~parse_not()
+            if peek("("):
+                position += 1
+                bits = parse_or()
+                if not peek(")"):
+                    raise ValueError("Missing )")
+                position += 1
+                return bits
+            kind, name = tokens[position]
+            if kind != "name":
+                raise ValueError(f"Expected a habit name in: {expression}")
+            if name not in self.bitsets:
+                raise ValueError(f"There is no habit {name}")
+            position += 1
+            return self.bitsets[name]
+
+        bits = parse_or()
+        if tokens[position][0] != "end":
+            raise ValueError(f"Unexpected {tokens[position][1]} in: {expression}")
+        return bits
+
+    def days(self, expression: str) -> List[int]:
+        return self.days_of(self.evaluate(expression))
+
+    def count(self, expression: str) -> int:
+        return popcount(self.evaluate(expression))
+
+    def cooccurrence(self) -> Dict[Tuple[str, str], int]:
+        """
+        Returns the number of days on which both habits were completed, for every pair of habits
+        (the count of a habit with itself is its number of completions).
+        """
+        names = list(self.bitsets)
+        counts = {}
+        for i, a in enumerate(names):
+            for b in names[i:]:
+                counts[(a, b)] = counts[(b, a)] = popcount(self.bitsets[a] & self.bitsets[b])
+        return counts
+
+    def correlation(self) -> Dict[Tuple[str, str], float]:
+        """
+        Returns the correlation (phi coefficient, from -1 to 1) of the completions of every pair of habits
+        over the days from start to end: 1 if they were always completed on the same days, -1 if never,
+        0 if they're independent. None if a habit was completed on all or none of the days.
+        """
+        days = self.end - self.start + 1
+        counts = self.cooccurrence()
+        correlations = {}
+        for (a, b), both in counts.items():
+            count_a, count_b = counts[(a, a)], counts[(b, b)]
+            denominator = count_a * (days - count_a) * count_b * (days - count_b)
+            correlations[(a, b)] = (days * both - count_a * count_b) / math.sqrt(denominator) if denominator else None
+        return correlations
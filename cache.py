@@ -0,0 +1,36 @@
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """
+    Small least-recently-used cache for analytics results.
+    When more than maxsize results are stored, the result that wasn't used for the longest time is evicted.
+    Can be shared between threads - a result might be computed twice, but the cache stays consistent.
+    """
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        """
+        Returns the cached result for key or computes it with compute() and caches it.
+        """
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                return self.results[key]
+
+        result = compute()
+        with self.lock:
+            self.results[key] = result
+            if len(self.results) > self.maxsize:
+                self.results.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def __len__(self):
+        return len(self.results)
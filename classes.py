@@ -1,4 +1,7 @@
-from datetime import datetime
+import heapq
+import re
+from array import array
+from datetime import date as Date, datetime
 from enum import Enum
 
 class Habit:
@@ -8,7 +11,18 @@ class Habit:
     def __init__(self, name, definition, periodicity):
         self.name = name
         self.definition = definition
-        self.periodicity = Periodicity(periodicity)
+        self.periodicity = parse_periodicity(periodicity)
+
+    def __eq__(self, other):
+        """
+        Habits are equal if all attributes are equal, f.e. when a habit is loaded again from the database
+        """
+        if not isinstance(other, Habit):
+            return NotImplemented
+        return (self.name, self.definition, self.periodicity) == (other.name, other.definition, other.periodicity)
+
+    def __hash__(self):
+        return hash(self.name)
 
 class HabitCompleted:
     """
@@ -18,6 +32,8 @@ class HabitCompleted:
     def __str__(self):
         return f"{self.__class__.__name__}({self.name} completed at: {self.date})"
 
+    __slots__ = ("name", "date")
+
     def __init__(self, name, date: str = None):
         self.name = name
         if date is None:
@@ -25,6 +41,16 @@ class HabitCompleted:
         else:
             self.date = datetime.fromisoformat(date).date()
 
+    @classmethod
+    def from_day(cls, name, day: int):
+        """
+        Creates a completion from a day ordinal (see datetime.date.toordinal) without parsing a date string
+        """
+        completed = cls.__new__(cls)
+        completed.name = name
+        completed.date = Date.fromordinal(day)
+        return completed
+
     def __lt__(self, other):
         """
         __lt__ to sort the dates list in other functions
@@ -34,22 +60,199 @@ class HabitCompleted:
         else:
             return False
 
+class CompletionStore:
+    """
+    Stores completions compactly as one array of day ordinals (4 bytes each) per habit,
+    in the order in which they were added: the database loads them ordered by day, later completions are appended.
+    iter_bydate relies on that order (sorting days that are already sorted takes linear time)
+    and still sorts, as a back-dated completion is appended after later days.
+    HabitCompleted objects are only created as views when the store is indexed or iterated.
+    """
+    def __init__(self):
+        self.days = {}
+
+    def add(self, name, day: int):
+        self.days.setdefault(name, array("i")).append(day)
+
+    def remove(self, name):
+        self.days.pop(name, None)
+
+    def get_days(self, name) -> array:
+        """
+        Returns the day ordinals of one habit (empty if it wasn't completed yet)
+        """
+        return self.days.get(name, array("i"))
+
+    def __len__(self):
+        return sum(len(days) for days in self.days.values())
+
+    def __iter__(self):
+        for name, days in self.days.items():
+            for day in days:
+                yield HabitCompleted.from_day(name, day)
+
+    def __getitem__(self, index: int) -> HabitCompleted:
+        if index < 0:
+            index += len(self)
+        for name, days in self.days.items():
+            if index < len(days):
+                return HabitCompleted.from_day(name, days[index])
+            index -= len(days)
+        raise IndexError("completion index out of range")
+
+    def iter_bydate(self):
+        """
+        Yields all completions ordered by date, merging the sorted days of every habit
+        """
+        per_habit = [zip(sorted(days), [name] * len(days)) for name, days in self.days.items()]
+        for day, name in heapq.merge(*per_habit):
+            yield HabitCompleted.from_day(name, day)
+
 class Periodicity(str, Enum):
+    """
+    The standard periodicities. A streak counts the consecutive periods (days, ISO weeks or calendar months)
+    in which a habit was completed. Every period gets a bucket id, so consecutive periods have consecutive ids.
+    """
     Daily = "daily"
     Weekly = "weekly"
+    Monthly = "monthly"
 
-period_map = {
-    Periodicity.Daily: 1,
-    Periodicity.Weekly: 7
-}
+    @property
+    def times(self) -> int:
+        """
+        Number of completions needed per period
+        """
+        return 1
 
+    @property
+    def unit(self) -> str:
+        return {"daily": "days", "weekly": "weeks", "monthly": "months"}[self.value]
 
+    def bucket(self, day: int) -> int:
+        """
+        Returns the bucket id of the period the day ordinal belongs to
+        """
+        if self == Periodicity.Weekly:
+            # Day ordinal 1 is a Monday, so every bucket is an ISO week
+            return (day - 1) // 7
+        if self == Periodicity.Monthly:
+            date = Date.fromordinal(day)
+            return date.year * 12 + date.month - 1
+        return day
+
+    def bucket_start(self, bucket: int) -> int:
+        """
+        Returns the first day ordinal of a bucket
+        """
+        if self == Periodicity.Weekly:
+            return bucket * 7 + 1
+        if self == Periodicity.Monthly:
+            return Date(bucket // 12, bucket % 12 + 1, 1).toordinal()
+        return bucket
 
+class CustomPeriodicity:
+    """
+    Periodicities with a number: "every-N-days" (one completion in every block of N days)
+    or "N-per-week" (at least N completions in every ISO week).
+    Has the same interface as Periodicity, so streaks are computed the same way.
+    """
+    pattern = re.compile(r"every-(\d+)-days|(\d+)-per-week")
 
+    def __init__(self, value: str):
+        match = self.pattern.fullmatch(str(value))
+        if match is None or int(match.group(1) or match.group(2)) < 1:
+            raise ValueError(f"{value!r} is not a valid periodicity")
+        self.value = str(value)
+        self.every = int(match.group(1) or 7)
+        self.times = int(match.group(2) or 1)
+        self.unit = "weeks" if match.group(2) else f"periods of {self.every} days"
 
+    def __str__(self):
+        return self.value
 
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.value!r})"
 
+    def __eq__(self, other):
+        return str(self) == str(other.value if isinstance(other, (Periodicity, CustomPeriodicity)) else other)
 
+    def __hash__(self):
+        return hash(self.value)
 
+    def bucket(self, day: int) -> int:
+        if self.every == 7:
+            return (day - 1) // 7
+        return day // self.every
 
+    def bucket_start(self, bucket: int) -> int:
+        if self.every == 7:
+            return bucket * 7 + 1
+        return bucket * self.every
 
+def parse_periodicity(periodicity):
+    """
+    Returns the Periodicity or CustomPeriodicity for a value like "daily", "monthly", "every-3-days" or "3-per-week".
+    Raises a ValueError for unknown periodicities.
+    """
+    if isinstance(periodicity, (Periodicity, CustomPeriodicity)):
+        return periodicity
+    try:
+        return Periodicity(periodicity)
+    except ValueError:
+        return CustomPeriodicity(periodicity)
+
+def period_days(periodicity) -> int:
+    """
+    Returns the (average) number of days of one period of a periodicity
+    """
+    periodicity = parse_periodicity(periodicity)
+    if isinstance(periodicity, CustomPeriodicity):
+        return periodicity.every
+    return period_map[periodicity]
+
+class CalendarPeriod(str, Enum):
+    """
+    Calendar periods completions can be counted by
+    """
+    Day = "day"
+    Week = "week"
+    Month = "month"
+
+def period_start(day: int, period: CalendarPeriod) -> int:
+    """
+    Returns the first day (as day ordinal) of the day/week/month the day ordinal belongs to
+    """
+    if period == CalendarPeriod.Week:
+        return day - (day - 1) % 7
+    if period == CalendarPeriod.Month:
+        return Date.fromordinal(day).replace(day=1).toordinal()
+    return day
+
+def next_period(day: int, period: CalendarPeriod) -> int:
+    """
+    Returns the first day of the day/week/month after the one starting at the day ordinal
+    """
+    if period == CalendarPeriod.Week:
+        return day + 7
+    if period == CalendarPeriod.Month:
+        date = Date.fromordinal(day)
+        return date.replace(year=date.year + date.month // 12, month=date.month % 12 + 1, day=1).toordinal()
+    return day + 1
+
+def period_label(day: int, period: CalendarPeriod) -> str:
+    """
+    Returns the label of the day/week/month starting at the day ordinal, f.e. 2022-08-01, 2022-W31 or 2022-08
+    """
+    date = Date.fromordinal(day)
+    if period == CalendarPeriod.Week:
+        year, week, _ = date.isocalendar()
+        return f"{year}-W{week:02}"
+    if period == CalendarPeriod.Month:
+        return date.strftime("%Y-%m")
+    return date.isoformat()
+
+period_map = {
+    Periodicity.Daily: 1,
+    Periodicity.Weekly: 7,
+    Periodicity.Monthly: 30
+}
@@ -0,0 +1,337 @@
+import datetime
+import json
+import mmap
+import os
+import sqlite3
+import threading
+from array import array
+from contextlib import contextmanager
+from typing import Optional
+
+import numpy as np
+
+from analytics import EPOCH_ORDINAL
+from classes import CompletionStore, Habit
+from database import iso_date
+from streaks import find_streakruns
+
+# One completion record in the log: habit id and day ordinal as little-endian 32 bit integers
+RECORD = np.dtype([("habit", "<i4"), ("day", "<i4")])
+
+def to_day(date) -> int:
+    return datetime.date.fromisoformat(str(date)).toordinal()
+
+class ColumnarStorage:
+    """
+    Append-only storage for analytics-heavy use: completions are records of (habit id, day ordinal) in a binary log
+    (completions.bin) that is memory-mapped and read as zero-copy NumPy arrays - nothing has to be parsed.
+    The habits and an index of where the records of every habit start are kept in a small sidecar file (habits.json).
+
+    The log starts with a compacted segment sorted by habit and day, so the days of one habit are a slice of it.
+    New completions are appended after it and merged into the segment by compact(), which runs automatically
+    once the unsorted tail gets too long. Deleted habits leave their records until the next compaction.
+    Streaks aren't stored, they're computed from the days when needed.
+    """
+    def __init__(self, directory: str, compact_after: int = 65536):
+        self.directory = directory
+        self.compact_after = compact_after
+        self.log_path = os.path.join(directory, "completions.bin")
+        self.index_path = os.path.join(directory, "habits.json")
+        self.lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.log_path):
+            open(self.log_path, "wb").close()
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as file:
+                index = json.load(file)
+        else:
+            index = {"next_id": 1, "habits": [], "segment": {"records": 0, "offsets": {}}}
+        self.next_id = index["next_id"]
+        self.habits = {habit["name"]: habit for habit in index["habits"]}
+        self.segment_records = index["segment"]["records"]
+        self.offsets = {int(habit_id): tuple(offset) for habit_id, offset in index["segment"]["offsets"].items()}
+        self.map = None
+        self.mapped_size = 0
+        # Number of nested transaction() blocks - the log is only synced to disk when the outermost one ends
+        self.transaction_depth = 0
+
+    def save_index(self):
+        """
+        Writes the sidecar file atomically, so a crash never leaves a half-written index.
+        """
+        index = {"next_id": self.next_id, "habits": list(self.habits.values()),
+                 "segment": {"records": self.segment_records,
+                             "offsets": {str(habit_id): list(offset) for habit_id, offset in self.offsets.items()}}}
+        with open(self.index_path + ".tmp", "w") as file:
+            json.dump(index, file)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def records(self) -> np.ndarray:
+        """
+        Returns all records of the log as a structured array backed by the memory map (no copy).
+        The file is mapped again when it has grown since the last call.
+        """
+        size = os.path.getsize(self.log_path)
+        if size == 0:
+            return np.empty(0, dtype=RECORD)
+        if size != self.mapped_size:
+            with open(self.log_path, "rb") as file:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mapped_size = size
+        return np.frombuffer(self.map, dtype=RECORD, count=size // RECORD.itemsize)
+
+    def tail(self) -> np.ndarray:
+        """
+        Returns the records appended after the compacted segment
+        """
+        return self.records()[self.segment_records:]
+
+    def habit_id(self, name: str) -> Optional[int]:
+        habit = self.habits.get(name)
+        return habit["id"] if habit else None
+
+    def days_of(self, habit_id: int) -> np.ndarray:
+        """
+        Returns the sorted days of a habit - a view of the memory map if no completions were appended since compacting.
+        """
+        records = self.records()
+        offset, count = self.offsets.get(habit_id, (0, 0))
+        days = records[offset:offset + count]["day"]
+        tail = records[self.segment_records:]
+        tail_days = tail["day"][tail["habit"] == habit_id]
+        if len(tail_days):
+            days = np.union1d(days, tail_days)
+        return days
+
+    def live_records(self) -> np.ndarray:
+        """
+        Returns the records of all existing habits, sorted by habit and day and without duplicates.
+        """
+        records = self.records()
+        live_ids = np.array([habit["id"] for habit in self.habits.values()], dtype=np.int32)
+        if len(records) == self.segment_records and set(self.offsets) <= set(live_ids.tolist()):
+            # Already compacted and all habits with records still exist
+            return records
+        records = records[np.isin(records["habit"], live_ids)]
+        return np.unique(records)
+
+    def append(self, records: np.ndarray):
+        with open(self.log_path, "ab") as file:
+            file.write(records.tobytes())
+            if self.transaction_depth == 0:
+                file.flush()
+                os.fsync(file.fileno())
+        if len(self.tail()) >= self.compact_after:
+            self.compact()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups all writes in the block, so the log is synced to disk once at the end instead of after every write.
+        Unlike with SQLite, the writes of a block that raises are kept - the log is append-only.
+        """
+        with self.lock:
+            self.transaction_depth += 1
+            try:
+                yield
+            finally:
+                self.transaction_depth -= 1
+                if self.transaction_depth == 0:
+                    with open(self.log_path, "ab") as file:
+                        os.fsync(file.fileno())
+
+    def data_version(self) -> int:
+        """
+        Always 0 - the directory belongs to one ColumnarStorage, other processes don't write to it.
+        """
+        return 0
+
+    def compact(self):
+        """
+        Rewrites the log as one sorted segment without duplicates and records of deleted habits,
+        and updates the per-habit offsets in the sidecar file.
+        """
+        with self.lock:
+            records = np.array(self.live_records())
+            with open(self.log_path + ".tmp", "wb") as file:
+                file.write(records.tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+            self.map = None
+            self.mapped_size = 0
+            os.replace(self.log_path + ".tmp", self.log_path)
+
+            habit_ids, starts, counts = np.unique(records["habit"], return_index=True, return_counts=True)
+            self.offsets = {int(habit_id): (int(start), int(count)) for habit_id, start, count in zip(habit_ids, starts, counts)}
+            self.segment_records = len(records)
+            self.save_index()
+
+    def store_habit(self, name, definition, periodicity):
+        with self.lock:
+            if name in self.habits:
+                raise sqlite3.IntegrityError("UNIQUE constraint failed: habit.name")
+            self.habits[name] = {"id": self.next_id, "name": name, "definition": definition, "periodicity": periodicity}
+            self.next_id += 1
+            self.save_index()
+
+    def get_allhabits(self):
+        return [Habit(habit["name"], habit["definition"], habit["periodicity"]) for habit in self.habits.values()]
+
+    def get_habit(self, name: str):
+        habit = self.habits.get(name)
+        if habit is None:
+            return None
+        return Habit(habit["name"], habit["definition"], habit["periodicity"])
+
+    def get_habitids(self):
+        return [(habit["id"], habit["name"], habit["periodicity"]) for habit in self.habits.values()]
+
+    def update_habit(self, name: str, definition: str, periodicity: str):
+        with self.lock:
+            if name not in self.habits:
+                raise Exception(f"Could not find name: {name}")
+            self.habits[name].update(definition=definition, periodicity=periodicity)
+            self.save_index()
+
+    def delete_habit(self, name: str):
+        with self.lock:
+            if self.habits.pop(name, None) is not None:
+                # The records of the habit are dropped by the next compaction
+                self.save_index()
+
+    def complete_habit(self, habitName, date = None):
+        day = to_day(date) if date is not None else datetime.date.today().toordinal()
+        with self.lock:
+            habit_id = self.habit_id(habitName)
+            if habit_id is None:
+                raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+            if np.any(self.days_of(habit_id) == day):
+                return False
+            self.append(np.array([(habit_id, day)], dtype=RECORD))
+            return True
+
+    def complete_habits_bulk(self, completions) -> tuple:
+        with self.lock:
+            new_records = []
+            rejected = []
+            for (habitName, date) in completions:
+                habit_id = self.habit_id(habitName)
+                if habit_id is None:
+                    rejected.append((habitName, date, "unknown habit"))
+                else:
+                    new_records.append((habit_id, to_day(date)))
+            records = np.unique(np.array(new_records, dtype=RECORD))
+            # Skip completions that are already stored
+            new = np.ones(len(records), dtype=bool)
+            for habit_id in np.unique(records["habit"]):
+                of_habit = records["habit"] == habit_id
+                new[of_habit] = ~np.isin(records["day"][of_habit], self.days_of(habit_id))
+            if new.any():
+                self.append(records[new])
+            return int(new.sum()), rejected
+
+    def get_completiondays(self, habitName, first: int = None, last: int = None):
+        habit_id = self.habit_id(habitName)
+        if habit_id is None:
+            return np.empty(0, dtype=np.int32)
+        days = self.days_of(habit_id)
+        return days[np.searchsorted(days, first) if first is not None else 0:
+                    np.searchsorted(days, last, "right") if last is not None else len(days)]
+
+    def summarize_completions(self, habitName, last: int):
+        days = self.get_completiondays(habitName, last=last)
+        return len(days), int(days.sum(dtype=np.int64))
+
+    def get_completedhabit(self, habitName):
+        return [(iso_date(day), habitName) for day in self.get_completiondays(habitName).tolist()]
+
+    def get_allcompletiondays(self):
+        records = self.live_records()
+        return records["habit"], records["day"]
+
+    def get_completionstore(self) -> CompletionStore:
+        store = CompletionStore()
+        for name, habit in self.habits.items():
+            days = self.days_of(habit["id"])
+            if len(days):
+                store.days[name] = array("i", days.astype(np.int32).tobytes())
+        return store
+
+    def get_streaks(self, habitName):
+        habit = self.habits.get(habitName)
+        if habit is None:
+            return []
+        runs = find_streakruns(self.days_of(habit["id"]).tolist(), habit["periodicity"])
+        return [(iso_date(start), iso_date(end), length) for (start, end, length) in runs]
+
+    def get_longeststreak(self, habitName):
+        streaks = self.get_streaks(habitName)
+        if not streaks:
+            return None
+        # max returns the first (earliest) of equally long streaks
+        start, end, length = max(streaks, key=lambda streak: streak[2])
+        return length, start, end
+
+    def get_lateststatus(self, as_of):
+        as_of_day = to_day(as_of)
+        status = []
+        for name, habit in self.habits.items():
+            days = self.days_of(habit["id"])
+            days = days[days <= as_of_day].tolist()
+            runs = find_streakruns(days, habit["periodicity"])
+            _, streak_end, streak_length = runs[-1] if runs else (None, None, None)
+            status.append((name, habit["periodicity"], days[-1] if days else None, streak_end, streak_length))
+        return status
+
+    def select_habitsbyperiodicity(self, periodicity):
+        return [(habit["name"], habit["definition"], habit["periodicity"])
+                for habit in self.habits.values() if habit["periodicity"] == periodicity]
+
+    def completions_between(self, start_day: int, end_day: int) -> np.ndarray:
+        """
+        Returns the live records between two days (both included), ordered by day
+        """
+        records = self.live_records()
+        records = records[(records["day"] >= start_day) & (records["day"] <= end_day)]
+        return records[np.argsort(records["day"], kind="stable")]
+
+    def rows(self, records: np.ndarray) -> list:
+        """
+        Returns (date, habitName) of the records
+        """
+        names = {habit["id"]: name for name, habit in self.habits.items()}
+        return [(iso_date(day), names[habit_id]) for habit_id, day in zip(records["habit"].tolist(), records["day"].tolist())]
+
+    def list_completionsondate(self, date):
+        day = to_day(date)
+        return self.rows(self.completions_between(day, day))
+
+    def list_completionsbetween(self, start, end):
+        return self.rows(self.completions_between(to_day(start), to_day(end)))
+
+    def count_completions(self, start, end, period: str = "day"):
+        records = self.completions_between(to_day(start), to_day(end))
+        days = records["day"].astype(np.int64)
+        if period == "week":
+            days = days - (days - 1) % 7
+        elif period == "month":
+            months = (days - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]")
+            days = months.astype("datetime64[D]").astype(np.int64) + EPOCH_ORDINAL
+        names = {habit["id"]: name for name, habit in self.habits.items()}
+        pairs, counts = np.unique(np.stack([records["habit"].astype(np.int64), days], axis=1), axis=0, return_counts=True)
+        counted = [(names[habit_id], day, count) for (habit_id, day), count in zip(pairs.tolist(), counts.tolist())]
+        return sorted(counted)
+
+    def iter_completions(self, habitName = None, start = None, end = None, page_size: int = 1000):
+        start_day = to_day(start) if start is not None else 0
+        end_day = to_day(end) if end is not None else datetime.date.max.toordinal()
+        records = self.completions_between(start_day, end_day)
+        if habitName is not None:
+            records = records[records["habit"] == (self.habit_id(habitName) or -1)]
+        for page in range(0, len(records), page_size):
+            yield from ((name, date) for (date, name) in self.rows(records[page:page + page_size]))
+
+    def close(self):
+        self.map = None
+        self.mapped_size = 0
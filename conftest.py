@@ -0,0 +1,57 @@
+"""
+Shared pytest fixtures. Every test runs in its own temporary directory and gets its own in-memory tracker,
+cloned from a template database that is created (and filled) only once per test process,
+so no state is shared between tests and the suite can run in parallel (pytest -n auto).
+"""
+import pytest
+from benchmarks.datagen import generate
+from database import Database
+from main import HabitTracker
+
+# Size of the generated dataset of large_tracker
+LARGE_HABITS = 20
+LARGE_COMPLETIONS = 40000
+
+@pytest.fixture(autouse=True)
+def isolated_directory(tmp_path, monkeypatch):
+    """
+    Runs every test in its own directory, so files like test.db aren't shared between tests or test processes.
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture(scope="session")
+def empty_template():
+    """
+    An empty in-memory database with the current schema, migrated once per test process.
+    """
+    database = Database(":memory:")
+    yield database
+    database.close()
+
+@pytest.fixture(scope="session")
+def large_template():
+    """
+    An in-memory database with a generated dataset (see benchmarks.datagen), generated once per test process.
+    """
+    database = generate(":memory:", LARGE_HABITS, LARGE_COMPLETIONS)
+    yield database
+    database.close()
+
+@pytest.fixture
+def tracker(empty_template):
+    """
+    A tracker on its own copy of the empty template.
+    """
+    database = empty_template.clone()
+    yield HabitTracker(storage=database)
+    database.close()
+
+@pytest.fixture
+def large_tracker(large_template):
+    """
+    A tracker on its own copy of the generated dataset, so tests can change it.
+    """
+    database = large_template.clone()
+    yield HabitTracker(storage=database)
+    database.close()
@@ -1,13 +1,492 @@
 import datetime
+import functools
+import gzip
+import heapq
+import os
+import shutil
 import sqlite3
-from typing import List
-from classes import Habit, HabitCompleted
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Tuple
+import profiling
+from bitsets import days_bitset
+from classes import CompletionStore, Habit, HabitCompleted, parse_periodicity
+from streaks import find_streakruns
+
+def iso_date(day: int) -> str:
+    """
+    Returns the ISO date of a day ordinal (see datetime.date.toordinal), also of NumPy integers
+    """
+    return datetime.date.fromordinal(int(day)).isoformat()
+
+def year_start(year: int) -> int:
+    """
+    Returns the day ordinal of the first day of a year
+    """
+    return datetime.date(year, 1, 1).toordinal()
+
+def bitset_days(year: int, bits: bytes) -> List[int]:
+    """
+    Returns the sorted day ordinals of an archived year: bit n (from the lowest bit) is set if day n of the year
+    (counting from 0) is a completion.
+    """
+    first = year_start(year)
+    value = int.from_bytes(bits, "little")
+    days = []
+    while value:
+        lowest = value & -value
+        days.append(first + lowest.bit_length() - 1)
+        value ^= lowest
+    return days
+
+def migration_completion_indexes(cursor):
+    """
+    Removes duplicate completions (same habit on the same date) and adds the indexes
+    for per-habit and per-date lookups. The unique index also keeps duplicates from piling up again.
+    """
+    cursor.execute("""DELETE FROM habitCompleted WHERE rowid NOT IN (
+        SELECT MIN(rowid) FROM habitCompleted GROUP BY habitName, date)""")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS habitCompleted_habitName_date ON habitCompleted(habitName, date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS habitCompleted_date ON habitCompleted(date)")
+
+def migration_streak_table(cursor):
+    """
+    Adds the habitStreak table that stores the streak runs of every habit and fills it from the existing completions.
+    """
+    cursor.execute("""CREATE TABLE IF NOT EXISTS habitStreak(
+        habitName TEXT,
+        start TEXT,
+        end TEXT,
+        length INTEGER,
+        PRIMARY KEY (habitName, start),
+        FOREIGN KEY (habitName) REFERENCES habit(name)
+        )""")
+    cursor.execute("SELECT name, periodicity FROM habit")
+    for (name, periodicity) in cursor.fetchall():
+        cursor.execute("SELECT date FROM habitCompleted WHERE habitName = ? ORDER BY date", (name, ))
+        days = [datetime.date.fromisoformat(date).toordinal() for (date,) in cursor.fetchall()]
+        runs = find_streakruns(days, periodicity)
+        cursor.executemany("INSERT INTO habitStreak VALUES (?, ?, ?, ?)",
+                           [(name, iso_date(start), iso_date(end), length)
+                            for (start, end, length) in runs])
+
+def migration_completion_day(cursor):
+    """
+    Adds the day column with the day ordinal (see datetime.date.toordinal) of every completion,
+    so completions can be loaded and compared as integers instead of parsing date strings.
+    """
+    cursor.execute("ALTER TABLE habitCompleted ADD COLUMN day INTEGER")
+    cursor.execute("UPDATE habitCompleted SET day = CAST(julianday(date) - 1721424.5 AS INTEGER)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS habitCompleted_habitName_day ON habitCompleted(habitName, day)")
+
+def migration_covering_date_index(cursor):
+    """
+    Replaces the date index with one that also covers habitName and day,
+    so date range queries and aggregations only read the index.
+    """
+    cursor.execute("DROP INDEX IF EXISTS habitCompleted_date")
+    cursor.execute("CREATE INDEX IF NOT EXISTS habitCompleted_date_habitName_day ON habitCompleted(date, habitName, day)")
+
+def migration_bucket_streaks(cursor):
+    """
+    Recomputes all stored streaks, which are counted in consecutive periods (f.e. ISO weeks)
+    instead of gaps of at most 1 or 7 days since this migration.
+    """
+    cursor.execute("DELETE FROM habitStreak")
+    cursor.execute("SELECT name, periodicity FROM habit")
+    for (name, periodicity) in cursor.fetchall():
+        cursor.execute("SELECT day FROM habitCompleted WHERE habitName = ? ORDER BY day", (name, ))
+        runs = find_streakruns([day for (day,) in cursor.fetchall()], periodicity)
+        cursor.executemany("INSERT INTO habitStreak VALUES (?, ?, ?, ?)",
+                           [(name, iso_date(start), iso_date(end), length)
+                            for (start, end, length) in runs])
+
+def migration_changelog(cursor):
+    """
+    Adds the changeLog table, filled by triggers on every change of a habit or completion.
+    The existing habits and completions are logged as inserts.
+    """
+    cursor.execute("""CREATE TABLE IF NOT EXISTS changeLog(
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,
+        op TEXT,
+        habitName TEXT,
+        day INTEGER
+        )""")
+    cursor.execute("""INSERT INTO changeLog (kind, op, habitName) SELECT 'habit', 'insert', name FROM habit ORDER BY rowid""")
+    cursor.execute("""INSERT INTO changeLog (kind, op, habitName, day)
+        SELECT 'completion', 'insert', habitName, day FROM habitCompleted ORDER BY rowid""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS habit_insert_log AFTER INSERT ON habit BEGIN
+        INSERT INTO changeLog (kind, op, habitName) VALUES ('habit', 'insert', NEW.name);
+        END""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS habit_update_log AFTER UPDATE ON habit BEGIN
+        INSERT INTO changeLog (kind, op, habitName) SELECT 'habit', 'delete', OLD.name WHERE OLD.name != NEW.name;
+        INSERT INTO changeLog (kind, op, habitName) VALUES ('habit', 'update', NEW.name);
+        END""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS habit_delete_log AFTER DELETE ON habit BEGIN
+        INSERT INTO changeLog (kind, op, habitName) VALUES ('habit', 'delete', OLD.name);
+        END""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS habitCompleted_insert_log AFTER INSERT ON habitCompleted BEGIN
+        INSERT INTO changeLog (kind, op, habitName, day) VALUES ('completion', 'insert', NEW.habitName, NEW.day);
+        END""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS habitCompleted_update_log AFTER UPDATE ON habitCompleted BEGIN
+        INSERT INTO changeLog (kind, op, habitName, day) VALUES ('completion', 'delete', OLD.habitName, OLD.day);
+        INSERT INTO changeLog (kind, op, habitName, day) VALUES ('completion', 'insert', NEW.habitName, NEW.day);
+        END""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS habitCompleted_delete_log AFTER DELETE ON habitCompleted BEGIN
+        INSERT INTO changeLog (kind, op, habitName, day) VALUES ('completion', 'delete', OLD.habitName, OLD.day);
+        END""")
+
+def migration_archive_table(cursor):
+    """
+    Adds the habitArchive table for old completions: one bitset of all days of a year (366 bits) per habit and year,
+    instead of one row per completion. Completions are moved there by Database.archive_completions.
+    """
+    cursor.execute("""CREATE TABLE IF NOT EXISTS habitArchive(
+        habitName TEXT,
+        year INTEGER,
+        days BLOB,
+        count INTEGER,
+        PRIMARY KEY (habitName, year),
+        FOREIGN KEY (habitName) REFERENCES habit(name)
+        ) WITHOUT ROWID""")
+
+def migration_bitset_table(cursor):
+    """
+    Adds the habitBitset table with all completions of a habit as one bitset, dropped by triggers when they change.
+    """
+    cursor.execute("""CREATE TABLE IF NOT EXISTS habitBitset(
+        habitName TEXT PRIMARY KEY,
+        first INTEGER,
+        bits BLOB
+        ) WITHOUT ROWID""")
+    for table, event, row in (("habitCompleted", "INSERT", "NEW"), ("habitCompleted", "UPDATE", "OLD"),
+                              ("habitCompleted", "DELETE", "OLD"), ("habitArchive", "INSERT", "NEW"),
+                              ("habitArchive", "UPDATE", "OLD"), ("habitArchive", "DELETE", "OLD")):
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bitset AFTER {event} ON {table} BEGIN
+            DELETE FROM habitBitset WHERE habitName = {row}.habitName{" OR habitName = NEW.habitName" if event == "UPDATE" else ""};
+            END""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS habit_delete_bitset AFTER DELETE ON habit BEGIN
+        DELETE FROM habitBitset WHERE habitName = OLD.name;
+        END""")
+
+def migration_integer_keys(cursor):
+    """
+    Gives every habit an integer id and keys habitCompleted by (habitId, day) WITHOUT ROWID.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'habit'")
+    habit_triggers = [sql for (sql,) in cursor.fetchall()]
+    cursor.execute("""CREATE TABLE habitNew(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        definition TEXT,
+        periodicity TEXT)""")
+    cursor.execute("INSERT INTO habitNew (id, name, definition, periodicity) SELECT rowid, name, definition, periodicity FROM habit")
+    cursor.execute("""CREATE TABLE habitCompletedNew(
+        habitId INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        PRIMARY KEY (habitId, day),
+        FOREIGN KEY (habitId) REFERENCES habit(id)
+        ) WITHOUT ROWID""")
+    cursor.execute("""INSERT OR IGNORE INTO habitCompletedNew SELECT habit.rowid, habitCompleted.day
+        FROM habitCompleted JOIN habit ON habit.name = habitCompleted.habitName""")
+    cursor.execute("DROP TABLE habitCompleted")
+    cursor.execute("DROP TABLE habit")
+    cursor.execute("ALTER TABLE habitNew RENAME TO habit")
+    cursor.execute("ALTER TABLE habitCompletedNew RENAME TO habitCompleted")
+    # The primary key already covers per-habit scans, the day index (which includes habitId) covers date ranges
+    cursor.execute("CREATE INDEX IF NOT EXISTS habitCompleted_day ON habitCompleted(day)")
+
+    for sql in habit_triggers:
+        cursor.execute(sql)
+    # The triggers of the change log and the bitsets, now looking up the habit name by id
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS habitCompleted_insert_log AFTER INSERT ON habitCompleted BEGIN
+        INSERT INTO changeLog (kind, op, habitName, day) SELECT 'completion', 'insert', name, NEW.day FROM habit WHERE id = NEW.habitId;
+        END""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS habitCompleted_update_log AFTER UPDATE ON habitCompleted BEGIN
+        INSERT INTO changeLog (kind, op, habitName, day) SELECT 'completion', 'delete', name, OLD.day FROM habit WHERE id = OLD.habitId;
+        INSERT INTO changeLog (kind, op, habitName, day) SELECT 'completion', 'insert', name, NEW.day FROM habit WHERE id = NEW.habitId;
+        END""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS habitCompleted_delete_log AFTER DELETE ON habitCompleted BEGIN
+        INSERT INTO changeLog (kind, op, habitName, day) SELECT 'completion', 'delete', name, OLD.day FROM habit WHERE id = OLD.habitId;
+        END""")
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "OLD"), ("DELETE", "OLD")):
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS habitCompleted_{event.lower()}_bitset AFTER {event} ON habitCompleted BEGIN
+            DELETE FROM habitBitset WHERE habitName IN (SELECT name FROM habit WHERE id = {row}.habitId{" OR id = NEW.habitId" if event == "UPDATE" else ""});
+            END""")
+
+# Schema migrations in the order they have to be applied.
+# The schema version of a database file is stored in PRAGMA user_version (= number of applied migrations).
+MIGRATIONS = [
+    migration_completion_indexes,
+    migration_streak_table,
+    migration_completion_day,
+    migration_covering_date_index,
+    migration_bucket_streaks,
+    migration_changelog,
+    migration_archive_table,
+    migration_bitset_table,
+    migration_integer_keys,
+]
+
+# julianday() of day ordinal 0, to convert day ordinals to dates in SQL: date(day + JULIAN_DAY_OFFSET)
+JULIAN_DAY_OFFSET = 1721424.5
+# Day ordinals of the first and last possible date, the default bounds of day ranges
+FIRST_DAY = datetime.date.min.toordinal()
+LAST_DAY = datetime.date.max.toordinal()
+
+# Bytes of the bitset of an archived year (one bit per day, 366 days in leap years)
+ARCHIVE_BITSET_SIZE = 46
+
+# PRAGMAs of the connections in pooled mode: write-ahead log, so readers don't block the writer (and the other way round),
+# fewer fsyncs (a commit is durable after the next checkpoint) and more page cache/memory-mapped I/O
+POOLED_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,
+    "mmap_size": 268435456,
+}
+
+def writes(method):
+    """
+    Serializes a Database method that writes, so only one thread at a time uses the writer connection.
+    """
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.write_lock:
+            return method(self, *args, **kwargs)
+    return locked
 
 class Database:
-    def __init__(self, name="database.db"):
-        self.database = sqlite3.connect(name)
+    def __init__(self, name="database.db", pooled: bool = False, busy_timeout: float = 5.0, readonly: bool = False,
+                 template: "Database" = None):
+        """
+        pooled shares the database between threads (one writer and one reader connection per thread, in WAL mode).
+        A readonly database is neither created nor migrated; with a template, a new database starts as a copy of it.
+        """
+        self.name = name
+        self.pooled = pooled
+        self.busy_timeout = busy_timeout
+        self.readonly = readonly
+        self.write_lock = threading.RLock()
+        self.local = threading.local()
+        # The reader connections of all threads, to close them - with their own lock, as a thread that opens its reader
+        # must not wait for a write (which might itself wait for that thread)
+        self.readers = []
+        self.readers_lock = threading.Lock()
+        # Number of nested transaction() blocks - the writes are only committed when the outermost one ends
+        self.transaction_depth = 0
+        self.transaction_thread = None
+        # Cached name -> id map of the habits (see habit_id), None until it's needed
+        self.habit_ids = None
+        # Last PRAGMA data_version of the writer connection (see data_version)
+        self.last_data_version = 0
+        self.database = self.connect()
+        if template is not None:
+            with template.write_lock:
+                template.database.backup(self.database)
+            self.database.execute("PRAGMA foreign_keys = ON")
+        elif not readonly:
+            self.create_tables()
+        elif self.database.execute("PRAGMA user_version").fetchone()[0] != len(MIGRATIONS):
+            self.database.close()
+            raise sqlite3.OperationalError(f"{name} has an outdated schema, open it once without readonly to migrate it")
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Opens a new connection, tuned for pooled mode and read-only for a readonly database.
+        """
+        factory = profiling.ProfiledConnection if profiling.profiler is not None else sqlite3.Connection
+        if self.readonly:
+            connection = sqlite3.connect(f"file:{self.name}?mode=ro", uri=True, timeout=self.busy_timeout,
+                                         check_same_thread=not self.pooled, factory=factory)
+            connection.execute("PRAGMA query_only = ON")
+            return connection
+        connection = sqlite3.connect(self.name, timeout=self.busy_timeout, check_same_thread=not self.pooled,
+                                     factory=factory)
+        if self.pooled:
+            for pragma, value in POOLED_PRAGMAS.items():
+                connection.execute(f"PRAGMA {pragma} = {value}")
+        return connection
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        Returns the connection for reads - in pooled mode the connection of the current thread.
+        """
+        if not self.pooled or self.name == ":memory:":
+            # An in-memory database only exists in its own connection
+            return self.database
+        if self.transaction_thread == threading.get_ident():
+            # Reads inside a transaction() block have to see its uncommitted writes
+            return self.database
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.connect()
+            connection.execute("PRAGMA query_only = ON")
+            self.local.connection = connection
+            with self.readers_lock:
+                self.readers.append(connection)
+        return connection
+
+    def close(self):
+        """
+        Closes the writer connection and all reader connections.
+        """
+        with self.write_lock:
+            with self.readers_lock:
+                for connection in self.readers:
+                    connection.close()
+                self.readers.clear()
+            self.database.close()
+
+    def clone(self, name: str = ":memory:") -> "Database":
+        """
+        Returns a copy of the database, in memory by default - f.e. to give every test its own copy
+        of a template that was migrated and filled only once. Copying a small database takes microseconds.
+        """
+        return Database(name, template=self)
+
+    def backup(self, target: str, pages: int = 256, sleep: float = 0.005, compress: bool = False, progress = None) -> dict:
+        """
+        Saves a snapshot of the database to target while it's in use, pages pages per step and sleep seconds in between.
+        Returns the number of pages, the size in bytes and the duration in seconds.
+        """
+        started = time.perf_counter()
+        temporary = f"{target}.part"
+        for path in (temporary, f"{temporary}.gz"):
+            if os.path.exists(path):
+                os.remove(path)
+        # A copy of an in-memory database has to be read through the writer connection
+        source = self.database if self.name == ":memory:" else self.connect()
+
+        def step(status, remaining, total):
+            if progress is not None:
+                progress(remaining, total)
+            if remaining and sleep:
+                time.sleep(sleep)
+
+        destination = sqlite3.connect(temporary)
+        try:
+            if source is not self.database and source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+                # Keeps one read transaction open for the whole copy
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            with self.write_lock if source is self.database else nullcontext():
+                source.backup(destination, pages=pages, progress=step)
+            # The snapshot is a single file, even if the database is in WAL mode
+            destination.execute("PRAGMA journal_mode = DELETE")
+            page_count = destination.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            destination.close()
+            if source is not self.database:
+                source.close()
+        if compress:
+            with open(temporary, "rb") as file, gzip.open(f"{temporary}.gz", "wb") as compressed:
+                shutil.copyfileobj(file, compressed, 1 << 20)
+            os.remove(temporary)
+            temporary += ".gz"
+        os.replace(temporary, target)
+        return {"pages": page_count, "bytes": os.path.getsize(target), "seconds": time.perf_counter() - started}
+
+    @writes
+    def restore(self, snapshot: str):
+        """
+        Replaces the content of the database with a snapshot saved by backup, migrating older snapshots.
+        Raises a sqlite3.DatabaseError if the snapshot can't be restored.
+        """
+        if self.readonly:
+            raise sqlite3.OperationalError("attempt to write a readonly database")
+        last_change = self.database.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changeLog'").fetchone()
+        with tempfile.TemporaryDirectory() as directory:
+            path = snapshot
+            with open(snapshot, "rb") as file:
+                compressed = file.read(2) == b"\x1f\x8b"
+            if compressed:
+                path = os.path.join(directory, "snapshot.db")
+                try:
+                    with gzip.open(snapshot, "rb") as file, open(path, "wb") as output:
+                        shutil.copyfileobj(file, output, 1 << 20)
+                except (OSError, EOFError) as error:
+                    raise sqlite3.DatabaseError(f"{snapshot} is corrupt: {error}")
+            source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                check = source.execute("PRAGMA integrity_check").fetchall()
+                if check != [("ok", )]:
+                    raise sqlite3.DatabaseError(f"{snapshot} is corrupt: {check[0][0]}")
+                tables = {name for (name, ) in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                if not {"habit", "habitCompleted"} <= tables:
+                    raise sqlite3.DatabaseError(f"{snapshot} isn't a habit tracker database")
+                if source.execute("PRAGMA user_version").fetchone()[0] > len(MIGRATIONS):
+                    raise sqlite3.DatabaseError(f"{snapshot} has a newer schema than this version can read")
+                source.backup(self.database)
+            finally:
+                source.close()
+        self.habit_ids = None
         self.create_tables()
+        if last_change is not None:
+            cursor = self.database.cursor()
+            cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'changeLog'", last_change)
+            if cursor.rowcount == 0:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('changeLog', ?)", last_change)
+            self.commit()
     
+    def commit(self):
+        """
+        Commits the writes of a method, unless they're part of a transaction() block.
+        """
+        if self.transaction_depth == 0:
+            self.database.commit()
+
+    def data_version(self) -> int:
+        """
+        Returns PRAGMA data_version of the writer connection, which changes when another connection commits.
+        """
+        if not self.write_lock.acquire(blocking=False):
+            return self.last_data_version
+        try:
+            self.last_data_version = self.database.execute("PRAGMA data_version").fetchone()[0]
+            return self.last_data_version
+        finally:
+            self.write_lock.release()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups all writes in the block into one transaction, rolled back if the block raises.
+        Nested blocks are savepoints.
+        """
+        with self.write_lock:
+            self.transaction_depth += 1
+            self.transaction_thread = threading.get_ident()
+            savepoint = f"nested{self.transaction_depth}" if self.transaction_depth > 1 else None
+            if savepoint is not None:
+                if not self.database.in_transaction:
+                    # Otherwise releasing the savepoint would commit
+                    self.database.execute("BEGIN")
+                self.database.execute(f"SAVEPOINT {savepoint}")
+            try:
+                yield
+            except BaseException:
+                if savepoint is None:
+                    self.database.rollback()
+                elif self.database.in_transaction:
+                    self.database.execute(f"ROLLBACK TO {savepoint}")
+                    self.database.execute(f"RELEASE {savepoint}")
+                raise
+            else:
+                if savepoint is not None:
+                    self.database.execute(f"RELEASE {savepoint}")
+            finally:
+                self.transaction_depth -= 1
+                if self.transaction_depth == 0:
+                    self.transaction_thread = None
+            self.commit()
+
+    @writes
     def create_tables(self):
         cursor = self.database.cursor()
         cursor.execute("PRAGMA foreign_keys = ON")
@@ -24,14 +503,72 @@ class Database:
             )""")
     
         self.database.commit()
+        self.migrate()
+
+    @writes
+    def migrate(self):
+        """
+        Applies all migrations that haven't been applied yet, each in its own transaction.
+        """
+        cursor = self.database.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(MIGRATIONS):
+            return
+        isolation_level = self.database.isolation_level
+        self.database.isolation_level = None
+        cursor.execute("PRAGMA foreign_keys = OFF")
+        try:
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                cursor.execute("BEGIN")
+                try:
+                    migration(cursor)
+                    cursor.execute(f"PRAGMA user_version = {number}")
+                except BaseException:
+                    cursor.execute("ROLLBACK")
+                    raise
+                cursor.execute("COMMIT")
+        finally:
+            cursor.execute("PRAGMA foreign_keys = ON")
+            self.database.isolation_level = isolation_level
     
+    @writes
+    def load_habitids(self) -> Dict[str, int]:
+        """
+        Loads the cached name -> id map of the habits again.
+        """
+        cursor = self.database.cursor()
+        cursor.execute("SELECT name, id FROM habit")
+        self.habit_ids = dict(cursor.fetchall())
+        return self.habit_ids
+
+    @writes
+    def habit_id(self, name: str, reload: bool = False) -> int:
+        """
+        Returns the id of a habit, raises an IntegrityError if there is no such habit.
+        """
+        if self.habit_ids is None or reload or name not in self.habit_ids:
+            self.load_habitids()
+        if name not in self.habit_ids:
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        return self.habit_ids[name]
+
+    def with_habit_id(self, name: str, write):
+        """
+        Runs write(habit id) - again with a freshly loaded id if the cached one is outdated.
+        """
+        try:
+            return write(self.habit_id(name))
+        except sqlite3.IntegrityError:
+            return write(self.habit_id(name, reload=True))
+
+    @writes
     def store_habit(self, name, definition, periodicity):
         cursor = self.database.cursor()
-        cursor.execute("INSERT INTO habit VALUES (?, ?, ?)", (name, definition, periodicity))
-        self.database.commit()
+        cursor.execute("INSERT INTO habit (name, definition, periodicity) VALUES (?, ?, ?)", (name, definition, periodicity))
+        self.commit()
     
     def get_allhabits(self) -> List[Habit]:
-        cursor = self.database.cursor()
+        cursor = self.reader().cursor()
         cursor.execute("SELECT name, definition, periodicity FROM habit")
         list_of_tuples = cursor.fetchall()
         list_of_habits = []
@@ -41,10 +578,22 @@ class Database:
             list_of_habits.append(habit)
         return list_of_habits
 
+    def get_habit(self, name: str):
+        """
+        Returns the habit with the given name or None if it doesn't exist.
+        """
+        cursor = self.reader().cursor()
+        cursor.execute("SELECT name, definition, periodicity FROM habit WHERE name = ?", (name, ))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return Habit(*row)
+
     def get_alltrackedhabits(self):
-        cursor = self.database.cursor()
-        cursor.execute("SELECT habitName, date FROM habitCompleted")
-        list_of_tuples = cursor.fetchall()
+        cursor = self.reader().cursor()
+        cursor.execute("SELECT habit.name, habitCompleted.day FROM habitCompleted JOIN habit ON habit.id = habitCompleted.habitId")
+        list_of_tuples = [(name, iso_date(day)) for name, days in self.archived_days().items() for day in days]
+        list_of_tuples += [(name, iso_date(day)) for (name, day) in cursor.fetchall()]
         list_of_habits = []
         for (name, date) in list_of_tuples:
         # Converting the output to a list (instead of a tuple)
@@ -52,50 +601,570 @@ class Database:
             list_of_habits.append(hc)
         return list_of_habits
 
+    @writes
     def delete_habit(self, name: str):
         cursor = self.database.cursor()
-        cursor.execute("DELETE FROM habitCompleted where habitName = ?", (name,))
+        cursor.execute("DELETE FROM habitStreak WHERE habitName = ?", (name,))
+        cursor.execute("DELETE FROM habitArchive WHERE habitName = ?", (name,))
+        cursor.execute("DELETE FROM habitCompleted WHERE habitId = (SELECT id FROM habit WHERE name = ?)", (name,))
         cursor.execute("DELETE FROM habit WHERE name = ?", (name, ))
-        self.database.commit()
+        self.habit_ids = None
+        self.commit()
 
+    @writes
     def complete_habit(self, habitName, date = None):
         cursor = self.database.cursor()
         if date is None:
             date = datetime.date.today().isoformat()
-        cursor.execute("INSERT INTO habitCompleted VALUES (?, ?)", (date, habitName))
-        self.database.commit()
+        date = datetime.date.fromisoformat(str(date))
+        if self.is_archived(habitName, date.toordinal()):
+            return False
+        # Completing a habit twice on the same date is a no-op
+        self.with_habit_id(habitName, lambda habit_id: cursor.execute(
+            "INSERT OR IGNORE INTO habitCompleted (habitId, day) VALUES (?, ?)", (habit_id, date.toordinal())))
+        stored = cursor.rowcount == 1
+        if stored:
+            self.update_streaks(habitName, date, date)
+        self.commit()
+        return stored
+
+    @writes
+    def complete_habits_bulk(self, completions) -> list:
+        """
+        Stores a batch of (habitName, date) completions in one transaction, skipping duplicates.
+        Returns the number of stored completions and the rows of unknown habits.
+        """
+        completions = list(completions)
+        cursor = self.database.cursor()
+        # One fresh load of the id map validates all names of the batch
+        known_habits = self.load_habitids()
+
+        accepted = []
+        rejected = []
+        for (habitName, date) in completions:
+            if habitName in known_habits:
+                accepted.append((date, habitName, datetime.date.fromisoformat(date).toordinal()))
+            else:
+                rejected.append((habitName, date, "unknown habit"))
+        if accepted:
+            # Completions that were already archived aren't stored again
+            archived = self.archived_days(first=min(day for (*_, day) in accepted), last=max(day for (*_, day) in accepted),
+                                          connection=self.database)
+            archived = {name: set(days) for name, days in archived.items()}
+            accepted = [row for row in accepted if row[2] not in archived.get(row[1], ())]
 
+        with self.transaction():
+            cursor.executemany("INSERT OR IGNORE INTO habitCompleted (habitId, day) VALUES (?, ?)",
+                               [(known_habits[habitName], day) for (_, habitName, day) in accepted])
+            stored = cursor.rowcount
+            # Recompute the streaks of every habit in the batch once, over the range of the new dates
+            date_ranges = {}
+            for (date, habitName, _) in accepted:
+                first, last = date_ranges.get(habitName, (date, date))
+                date_ranges[habitName] = (min(first, date), max(last, date))
+            for habitName, (first, last) in date_ranges.items():
+                self.update_streaks(habitName, first, last)
+        return stored, rejected
+
+    @writes
     def update_habit(self, name: str, definition: str, periodicity: str):
         cursor = self.database.cursor()
         cursor.execute("UPDATE habit SET definition = :definition, periodicity = :periodicity WHERE name = :name",
                         dict(name=name, definition=definition, periodicity=periodicity))
-        self.database.commit()
         modified_rows = cursor.rowcount
         # Raise exception if there were no modifications
         if modified_rows == 0:
+            self.commit()
             raise Exception(f"Could not find name: {name}")
+        # The streak period might have changed, so all streaks of the habit are recomputed
+        self.update_streaks(name)
+        self.commit()
 
-    def get_completedhabit(self, habitName):
+    def export_changes(self, since: int = 0) -> dict:
+        """
+        Returns the net changes of habits and completions after the sequence number since (0 for everything).
+        """
+        cursor = self.reader().cursor()
+        # SQLite takes the other columns from the row with the MAX(seq) of every group, so op is the last change
+        cursor.execute("""SELECT kind, op, habitName, day, MAX(seq) FROM changeLog WHERE seq > ?
+            GROUP BY kind, habitName, day ORDER BY MAX(seq)""", (since, ))
+        rows = cursor.fetchall()
+        cursor.execute("SELECT MAX(seq) FROM changeLog")
+        until = max(since, cursor.fetchone()[0] or 0)
+
+        changes = {"since": since, "until": until, "habits": {"upsert": [], "delete": []},
+                   "completions": {"insert": {}, "delete": {}}}
+        upserted = []
+        for (kind, op, habitName, day, _) in rows:
+            if kind == "habit" and op == "delete":
+                changes["habits"]["delete"].append(habitName)
+            elif kind == "habit":
+                upserted.append(habitName)
+            else:
+                changes["completions"][op].setdefault(habitName, []).append(day)
+        for habitName in upserted:
+            cursor.execute("SELECT name, definition, periodicity FROM habit WHERE name = ?", (habitName, ))
+            row = cursor.fetchone()
+            if row is not None:
+                changes["habits"]["upsert"].append(list(row))
+        return changes
+
+    @writes
+    def apply_changes(self, changes: dict) -> dict:
+        """
+        Applies changes of export_changes in one transaction. Returns the number of changed habits and completions.
+        """
         cursor = self.database.cursor()
-        cursor.execute("SELECT * FROM habitCompleted WHERE habitName=?", (habitName, ))
+        applied = {"habits": 0, "completions": 0}
+        changed_days = {}
+        recompute = set()
+        with self.transaction():
+            for (name, definition, periodicity) in changes["habits"]["upsert"]:
+                cursor.execute("SELECT definition, periodicity FROM habit WHERE name = ?", (name, ))
+                row = cursor.fetchone()
+                if row == (definition, periodicity):
+                    continue
+                if row is None:
+                    cursor.execute("INSERT INTO habit (name, definition, periodicity) VALUES (?, ?, ?)", (name, definition, periodicity))
+                else:
+                    cursor.execute("UPDATE habit SET definition = ?, periodicity = ? WHERE name = ?", (definition, periodicity, name))
+                    if row[1] != periodicity:
+                        recompute.add(name)
+                applied["habits"] += 1
+
+            habit_ids = dict(self.load_habitids())
+            for op, statement in (("delete", "DELETE FROM habitCompleted WHERE habitId = ? AND day = ?"),
+                                  ("insert", "INSERT OR IGNORE INTO habitCompleted (habitId, day) VALUES (?, ?)")):
+                for habitName, days in changes["completions"][op].items():
+                    if habitName not in habit_ids:
+                        if op == "insert":
+                            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+                        # Completions of unknown habits are already deleted, but may still be archived
+                        habit_ids[habitName] = None
+                    for day in days:
+                        if op == "insert" and self.is_archived(habitName, day):
+                            continue
+                        cursor.execute(statement, (habit_ids[habitName], day))
+                        if cursor.rowcount == 1 or (op == "delete" and self.unarchive(habitName, day)):
+                            first, last = changed_days.get(habitName, (day, day))
+                            changed_days[habitName] = (min(first, day), max(last, day))
+                            applied["completions"] += 1
+
+            for name in changes["habits"]["delete"]:
+                cursor.execute("DELETE FROM habitStreak WHERE habitName = ?", (name, ))
+                cursor.execute("DELETE FROM habitArchive WHERE habitName = ?", (name, ))
+                cursor.execute("DELETE FROM habitCompleted WHERE habitId = (SELECT id FROM habit WHERE name = ?)", (name, ))
+                cursor.execute("DELETE FROM habit WHERE name = ?", (name, ))
+                applied["habits"] += cursor.rowcount
+                changed_days.pop(name, None)
+                recompute.discard(name)
+                self.habit_ids = None
+
+            for name in recompute:
+                self.update_streaks(name)
+            for name, (first, last) in changed_days.items():
+                if name not in recompute:
+                    self.update_streaks(name, iso_date(first), iso_date(last))
+        return applied
+
+    def archived_days(self, habitName = None, first: int = None, last: int = None, connection = None) -> Dict[str, List[int]]:
+        """
+        Returns the sorted archived days (ordinals) of every habit by name, optionally of one habit and between first and last.
+        """
+        conditions = []
+        parameters = []
+        if habitName is not None:
+            conditions.append("habitName = ?")
+            parameters.append(habitName)
+        if first is not None:
+            conditions.append("year >= ?")
+            parameters.append(datetime.date.fromordinal(first).year)
+        if last is not None:
+            conditions.append("year <= ?")
+            parameters.append(datetime.date.fromordinal(last).year)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        cursor = (connection or self.reader()).cursor()
+        cursor.execute(f"SELECT habitName, year, days FROM habitArchive {where} ORDER BY habitName, year", parameters)
+        archived = {}
+        for (name, year, bits) in cursor.fetchall():
+            days = [day for day in bitset_days(year, bits)
+                    if (first is None or day >= first) and (last is None or day <= last)]
+            if days:
+                archived.setdefault(name, []).extend(days)
+        return archived
+
+    def last_archived_days(self, as_of_day: int) -> Dict[str, int]:
+        """
+        Returns the last archived day up to as_of_day of every habit with archived completions.
+        Only the bitset of the latest year of every habit is read (unless all its days are after as_of_day).
+        """
+        cursor = self.reader().cursor()
+        # SQLite takes days from the row with the MAX(year) of every habit
+        cursor.execute("""SELECT habitName, MAX(year), days FROM habitArchive WHERE year <= ? AND count > 0
+            GROUP BY habitName""", (datetime.date.fromordinal(as_of_day).year, ))
+        last_days = {}
+        for (name, year, bits) in cursor.fetchall():
+            days = [day for day in bitset_days(year, bits) if day <= as_of_day] or self.archived_days(name, last=as_of_day).get(name)
+            if days:
+                last_days[name] = days[-1]
+        return last_days
+
+    def is_archived(self, habitName, day: int) -> bool:
+        """
+        Returns whether a completion of the habit on the day (ordinal) is archived
+        """
+        year = datetime.date.fromordinal(day).year
+        cursor = self.database.cursor()
+        cursor.execute("SELECT days FROM habitArchive WHERE habitName = ? AND year = ?", (habitName, year))
+        row = cursor.fetchone()
+        return row is not None and bool(int.from_bytes(row[0], "little") >> (day - year_start(year)) & 1)
+
+    @writes
+    def unarchive(self, habitName, day: int) -> bool:
+        """
+        Removes an archived completion. Returns False if there was none. Doesn't commit.
+        """
+        if not self.is_archived(habitName, day):
+            return False
+        year = datetime.date.fromordinal(day).year
+        cursor = self.database.cursor()
+        cursor.execute("SELECT days FROM habitArchive WHERE habitName = ? AND year = ?", (habitName, year))
+        bits = int.from_bytes(cursor.fetchone()[0], "little") & ~(1 << (day - year_start(year)))
+        cursor.execute("UPDATE habitArchive SET days = ?, count = count - 1 WHERE habitName = ? AND year = ?",
+                       (bits.to_bytes(ARCHIVE_BITSET_SIZE, "little"), habitName, year))
+        return True
+
+    @writes
+    def archive_completions(self, before) -> int:
+        """
+        Moves all completions before a date (ISO format) into per-year bitsets of habitArchive.
+        Returns the number of archived completions.
+        """
+        before_day = datetime.date.fromisoformat(str(before)).toordinal()
+        cursor = self.database.cursor()
+        with self.transaction():
+            if not self.database.in_transaction:
+                # Takes the write lock of the file before anything is read
+                cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT MAX(seq) FROM changeLog")
+            last_change = cursor.fetchone()[0] or 0
+            cursor.execute("""SELECT habit.name, habitCompleted.habitId, habitCompleted.day FROM habitCompleted
+                JOIN habit ON habit.id = habitCompleted.habitId WHERE habitCompleted.day < ?""", (before_day, ))
+            completions = cursor.fetchall()
+            bitsets = {}
+            for (name, _, day) in completions:
+                year = datetime.date.fromordinal(day).year
+                bitsets[(name, year)] = bitsets.get((name, year), 0) | 1 << (day - year_start(year))
+            for (name, year), bits in bitsets.items():
+                cursor.execute("SELECT days FROM habitArchive WHERE habitName = ? AND year = ?", (name, year))
+                row = cursor.fetchone()
+                if row is not None:
+                    bits |= int.from_bytes(row[0], "little")
+                cursor.execute("INSERT OR REPLACE INTO habitArchive VALUES (?, ?, ?, ?)",
+                               (name, year, bits.to_bytes(ARCHIVE_BITSET_SIZE, "little"), bin(bits).count("1")))
+            cursor.executemany("DELETE FROM habitCompleted WHERE habitId = ? AND day = ?",
+                               [(habit_id, day) for (_, habit_id, day) in completions])
+            archived = cursor.rowcount
+            # The completions still exist, so the deletes logged by the triggers are dropped again
+            cursor.execute("""DELETE FROM changeLog WHERE seq > ? AND kind = 'completion' AND op = 'delete' AND day < ?""",
+                           (last_change, before_day))
+        if not self.database.in_transaction:
+            self.database.execute("VACUUM")
+            self.database.execute("ANALYZE")
+        return archived
+
+    @writes
+    def update_streaks(self, habitName, first = None, last = None):
+        """
+        Recomputes the stored streaks of a habit around the dates first to last (all without a range).
+        """
+        cursor = self.database.cursor()
+        cursor.execute("SELECT periodicity FROM habit WHERE name = ?", (habitName, ))
+        row = cursor.fetchone()
+        if row is None:
+            return
+        periodicity = parse_periodicity(row[0])
+
+        if first is None or last is None:
+            cursor.execute("DELETE FROM habitStreak WHERE habitName = ?", (habitName, ))
+            cursor.execute("SELECT day FROM habitCompleted WHERE habitId = (SELECT id FROM habit WHERE name = ?) ORDER BY day",
+                           (habitName, ))
+            archived = self.archived_days(habitName, connection=self.database)
+        else:
+            first_bucket = periodicity.bucket(datetime.date.fromisoformat(str(first)).toordinal())
+            last_bucket = periodicity.bucket(datetime.date.fromisoformat(str(last)).toordinal())
+            # Streaks that end in the period before or start in the period after the changed range are affected
+            cursor.execute("SELECT MIN(start), MAX(end) FROM habitStreak WHERE habitName = ? AND end >= ? AND start < ?",
+                           (habitName, iso_date(periodicity.bucket_start(first_bucket - 1)),
+                            iso_date(periodicity.bucket_start(last_bucket + 2))))
+            start, end = cursor.fetchone()
+            if start is not None:
+                first_bucket = min(first_bucket, periodicity.bucket(datetime.date.fromisoformat(start).toordinal()))
+                last_bucket = max(last_bucket, periodicity.bucket(datetime.date.fromisoformat(end).toordinal()))
+            # Recompute whole periods, as all completions of a period count (f.e. for "3-per-week")
+            first = iso_date(periodicity.bucket_start(first_bucket))
+            last = iso_date(periodicity.bucket_start(last_bucket + 1) - 1)
+            cursor.execute("DELETE FROM habitStreak WHERE habitName = ? AND start >= ? AND start <= ?", (habitName, first, last))
+            cursor.execute("""SELECT day FROM habitCompleted WHERE habitId = (SELECT id FROM habit WHERE name = ?)
+                AND day BETWEEN ? AND ? ORDER BY day""", (habitName, datetime.date.fromisoformat(first).toordinal(),
+                                                          datetime.date.fromisoformat(last).toordinal()))
+            archived = self.archived_days(habitName, datetime.date.fromisoformat(first).toordinal(),
+                                          datetime.date.fromisoformat(last).toordinal(), connection=self.database)
+
+        days = list(heapq.merge(archived.get(habitName, []), (day for (day,) in cursor.fetchall())))
+        runs = find_streakruns(days, periodicity)
+        cursor.executemany("INSERT INTO habitStreak VALUES (?, ?, ?, ?)",
+                           [(habitName, iso_date(start), iso_date(end), length)
+                            for (start, end, length) in runs])
+
+    def get_streaks(self, habitName):
+        """
+        Returns all stored streak runs of a habit as (start, end, length) tuples, ordered by start date.
+        """
+        cursor = self.reader().cursor()
+        cursor.execute("SELECT start, end, length FROM habitStreak WHERE habitName = ? ORDER BY start", (habitName, ))
         return cursor.fetchall()
 
+    def get_longeststreak(self, habitName):
+        """
+        Returns the longest stored streak run of a habit as (length, start, end) or None if there are no streaks.
+        """
+        cursor = self.reader().cursor()
+        cursor.execute("""SELECT length, start, end FROM habitStreak WHERE habitName = ?
+            ORDER BY length DESC, start LIMIT 1""", (habitName, ))
+        return cursor.fetchone()
+
+    def get_completedhabit(self, habitName):
+        return [(iso_date(day), habitName) for day in self.get_completiondays(habitName)]
+
     def get_completedhabits(self, habitName):
-        cursor = self.database.cursor()
-        cursor.execute("SELECT habitName, date FROM habitCompleted WHERE habitName=?", (habitName, ))
-        list_of_tuples = cursor.fetchall()
+        list_of_tuples = [(habitName, iso_date(day)) for day in self.get_completiondays(habitName)]
         list_of_habits = []
         for (name, date) in list_of_tuples:
             h = HabitCompleted(name, date)
             list_of_habits.append(h)
         return list_of_habits
 
+    def get_habitids(self):
+        """
+        Returns (id, name, periodicity) of all habits.
+        """
+        cursor = self.reader().cursor()
+        cursor.execute("SELECT id, name, periodicity FROM habit")
+        return cursor.fetchall()
+
+    def get_allcompletiondays(self):
+        """
+        Returns the habit ids and day ordinals of all completions, loaded in one query,
+        grouped by habit and ordered by date. The day ordinal is the same as datetime.date.toordinal().
+        """
+        cursor = self.reader().cursor()
+        cursor.execute("""SELECT habitCompleted.habitId, habitCompleted.day
+            FROM habitCompleted JOIN habit ON habit.id = habitCompleted.habitId
+            ORDER BY habit.name, habitCompleted.day""")
+        rows = cursor.fetchall()
+        archived = self.archived_days()
+        if archived:
+            # Merge the archived days into the days of every habit, still grouped by habit name
+            recent = {}
+            for (habit_id, day) in rows:
+                recent.setdefault(habit_id, []).append(day)
+            rows = [(habit_id, day) for (habit_id, name, _) in sorted(self.get_habitids(), key=lambda habit: habit[1])
+                    for day in heapq.merge(archived.get(name, []), recent.get(habit_id, []))]
+        return array("i", (habit_id for (habit_id, _) in rows)), array("i", (day for (_, day) in rows))
+
+    def get_completiondays(self, habitName, first: int = None, last: int = None) -> array:
+        """
+        Returns the day ordinals of all completions of a habit, sorted by date,
+        optionally only between the day ordinals first and last (both included), read as a range of the primary key.
+        """
+        cursor = self.reader().cursor()
+        cursor.execute("""SELECT day FROM habitCompleted WHERE habitId = (SELECT id FROM habit WHERE name = ?)
+            AND day BETWEEN ? AND ? ORDER BY day""", (habitName, first if first is not None else FIRST_DAY,
+                                                      last if last is not None else LAST_DAY))
+        archived = self.archived_days(habitName, first, last).get(habitName, [])
+        return array("i", heapq.merge(archived, (day for (day,) in cursor.fetchall())))
+
+    def summarize_completions(self, habitName, last: int) -> Tuple[int, int]:
+        """
+        Returns the number and the sum of the day ordinals of the completions of a habit up to the day last,
+        counted by SQLite instead of reading the days.
+        """
+        cursor = self.reader().cursor()
+        cursor.execute("""SELECT COUNT(*), COALESCE(SUM(day), 0) FROM habitCompleted
+            WHERE habitId = (SELECT id FROM habit WHERE name = ?) AND day <= ?""", (habitName, last))
+        count, total = cursor.fetchone()
+        archived = self.archived_days(habitName, last=last).get(habitName, [])
+        return count + len(archived), total + sum(archived)
+
+    def get_bitsets(self) -> Dict[str, tuple]:
+        """
+        Returns the completions of every habit as (first day, bitset), see bitsets.days_bitset.
+        Bitsets dropped since their habit changed are built again from the completions and stored.
+        """
+        cursor = self.reader().cursor()
+        cursor.execute("""SELECT habit.name, habitBitset.first, habitBitset.bits
+            FROM habit LEFT JOIN habitBitset ON habitBitset.habitName = habit.name""")
+        bitsets = {}
+        missing = []
+        for (name, first, bits) in cursor.fetchall():
+            if bits is None:
+                missing.append(name)
+            else:
+                bitsets[name] = (first, int.from_bytes(bits, "little"))
+        if missing and self.readonly:
+            bitsets.update((name, days_bitset(self.get_completiondays(name))) for name in missing)
+        elif missing:
+            bitsets.update(self.build_bitsets(missing))
+        return bitsets
+
+    @writes
+    def build_bitsets(self, names) -> Dict[str, tuple]:
+        """
+        Builds and stores the bitsets of habits. The completions are read in the same write transaction,
+        so no other write can change them before the bitset is stored.
+        """
+        built = {}
+        with self.transaction():
+            cursor = self.database.cursor()
+            for name in names:
+                # The first delete takes the write lock of the file before any completions are read
+                cursor.execute("DELETE FROM habitBitset WHERE habitName = ?", (name, ))
+                first, bits = built[name] = days_bitset(self.get_completiondays(name))
+                cursor.execute("INSERT INTO habitBitset VALUES (?, ?, ?)",
+                               (name, first, bits.to_bytes((bits.bit_length() + 7) // 8, "little")))
+        return built
+
+    def get_completionstore(self) -> CompletionStore:
+        """
+        Loads all completions into a compact CompletionStore, ordered by date per habit.
+        """
+        store = CompletionStore()
+        for name, days in self.archived_days().items():
+            store.days[name] = array("i", days)
+        cursor = self.reader().cursor()
+        cursor.execute("""SELECT habit.name, habitCompleted.day FROM habitCompleted JOIN habit ON habit.id = habitCompleted.habitId
+            ORDER BY habitCompleted.habitId, habitCompleted.day""")
+        for (name, day) in cursor:
+            store.add(name, day)
+        return store
+
+    def get_lateststatus(self, as_of):
+        """
+        Returns the periodicity, last completion and latest streak of every habit as of a date (ISO format).
+        """
+        as_of_day = datetime.date.fromisoformat(str(as_of)).toordinal()
+        cursor = self.reader().cursor()
+        cursor.execute("""SELECT habit.name, habit.periodicity,
+                (SELECT MAX(day) FROM habitCompleted WHERE habitId = habit.id AND day <= :day),
+                streak.end, streak.length
+            FROM habit LEFT JOIN habitStreak AS streak ON streak.habitName = habit.name
+                AND streak.start = (SELECT MAX(start) FROM habitStreak WHERE habitName = habit.name AND start <= :date)""",
+                       dict(day=as_of_day, date=str(as_of)))
+        rows = cursor.fetchall()
+        archived = self.last_archived_days(as_of_day)
+        status = []
+        for name, periodicity, last_day, end, length in rows:
+            end = datetime.date.fromisoformat(end).toordinal() if end else None
+            if end is not None and end > as_of_day:
+                days = self.get_completiondays(name)
+                runs = find_streakruns(days[:bisect_right(days, as_of_day)], periodicity)
+                _, end, length = runs[-1] if runs else (None, None, None)
+            status.append((name, periodicity, max(last_day or 0, archived.get(name, 0)) or None, end, length))
+        return status
+
+    def iter_completions(self, habitName = None, start = None, end = None, page_size: int = 1000):
+        """
+        Yields (habitName, date) ordered by date, optionally of one habit and between two dates (both included).
+        """
+        conditions = []
+        parameters = []
+        if habitName is not None:
+            conditions.append("habit.name = ?")
+            parameters.append(habitName)
+        if start is not None:
+            conditions.append("habitCompleted.day >= ?")
+            parameters.append(datetime.date.fromisoformat(str(start)).toordinal())
+        if end is not None:
+            conditions.append("habitCompleted.day <= ?")
+            parameters.append(datetime.date.fromisoformat(str(end)).toordinal())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        cursor = self.reader().cursor()
+        cursor.execute(f"""SELECT habit.name, date(habitCompleted.day + {JULIAN_DAY_OFFSET})
+            FROM habitCompleted JOIN habit ON habit.id = habitCompleted.habitId {where} ORDER BY habitCompleted.day""", parameters)
+
+        def pages():
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    break
+                yield from rows
+
+        archived = self.archived_days(habitName, datetime.date.fromisoformat(str(start)).toordinal() if start else None,
+                                      datetime.date.fromisoformat(str(end)).toordinal() if end else None)
+        if not archived:
+            yield from pages()
+            return
+        # Only the archived completions are held in memory, merged with the pages of the others by date
+        archived = sorted((iso_date(day), name) for name, days in archived.items() for day in days)
+        yield from heapq.merge(((name, date) for (date, name) in archived), pages(), key=lambda row: row[1])
+
     def select_habitsbyperiodicity(self, periodicity):
-        cursor = self.database.cursor()
-        cursor.execute("SELECT * FROM habit WHERE periodicity=?", (periodicity, ))
+        cursor = self.reader().cursor()
+        cursor.execute("SELECT name, definition, periodicity FROM habit WHERE periodicity=?", (periodicity, ))
         return cursor.fetchall()
 
     def list_completionsondate(self, date):
-        cursor = self.database.cursor()
-        cursor.execute("SELECT date, habitName FROM habitCompleted WHERE date=?", (date, ))
-        return cursor.fetchall()
+        day = datetime.date.fromisoformat(str(date)).toordinal()
+        cursor = self.reader().cursor()
+        cursor.execute("""SELECT habit.name FROM habitCompleted JOIN habit ON habit.id = habitCompleted.habitId
+            WHERE habitCompleted.day = ?""", (day, ))
+        names = list(self.archived_days(first=day, last=day)) + [name for (name,) in cursor.fetchall()]
+        return [(str(date), name) for name in names]
+
+    def list_completionsbetween(self, start, end):
+        """
+        Returns (date, habitName) of all completions between the start and end date (both included), ordered by date.
+        """
+        first = datetime.date.fromisoformat(str(start)).toordinal()
+        last = datetime.date.fromisoformat(str(end)).toordinal()
+        cursor = self.reader().cursor()
+        cursor.execute(f"""SELECT date(habitCompleted.day + {JULIAN_DAY_OFFSET}), habit.name
+            FROM habitCompleted JOIN habit ON habit.id = habitCompleted.habitId
+            WHERE habitCompleted.day BETWEEN ? AND ? ORDER BY habitCompleted.day""", (first, last))
+        archived = self.archived_days(first=first, last=last)
+        archived = sorted((iso_date(day), name) for name, days in archived.items() for day in days)
+        return list(heapq.merge(archived, cursor.fetchall(), key=lambda row: row[0]))
+
+    def count_completions(self, start, end, period: str = "day"):
+        """
+        Returns (habitName, period, count) of the completions between two dates per day, week or month.
+        """
+        period_start = {
+            "day": "day",
+            # Day ordinal 1 is a Monday, so this is the Monday of the ISO week
+            "week": "day - (day - 1) % 7",
+            "month": f"day - CAST(strftime('%d', day + {JULIAN_DAY_OFFSET}) AS INTEGER) + 1",
+        }[period]
+        first = datetime.date.fromisoformat(str(start)).toordinal()
+        last = datetime.date.fromisoformat(str(end)).toordinal()
+        cursor = self.reader().cursor()
+        cursor.execute(f"""SELECT habit.name, counts.period, counts.count
+            FROM (SELECT habitId, {period_start} AS period, COUNT(*) AS count FROM habitCompleted
+                  WHERE day BETWEEN ? AND ? GROUP BY habitId, period) AS counts
+            JOIN habit ON habit.id = counts.habitId ORDER BY habit.name, counts.period""", (first, last))
+        archived = self.archived_days(first=first, last=last)
+        if not archived:
+            return cursor.fetchall()
+        # Count the archived completions in Python and add them to the counts of the others
+        counts = {(name, period): count for (name, period, count) in cursor.fetchall()}
+        for name, days in archived.items():
+            for day in days:
+                if period == "week":
+                    day -= (day - 1) % 7
+                elif period == "month":
+                    day = datetime.date.fromordinal(day).replace(day=1).toordinal()
+                counts[(name, day)] = counts.get((name, day), 0) + 1
+        return [(name, day, count) for (name, day), count in sorted(counts.items())]
@@ -0,0 +1,95 @@
+import datetime
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from analytics import longest_streaks
+from classes import CalendarPeriod, period_label
+from database import Database
+from main import HabitTracker
+
+def find_databases(pattern: str) -> List[str]:
+    """
+    Returns the tracker databases of a fleet, sorted by path:
+    all *.db files of a directory or the files matching a glob pattern.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.db")
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+def shard_stats(path: str, start: str, end: str, period: str) -> dict:
+    """
+    Computes the stats of one tracker database (a shard of the fleet) through a read-only connection.
+    Runs in a worker process, so only the path goes in and a plain dict comes out.
+    Errors are returned instead of raised, so one broken file doesn't stop the whole run.
+    """
+    started = time.perf_counter()
+    try:
+        storage = Database(path, readonly=True)
+        try:
+            tracker = HabitTracker(storage=storage)
+            # The streak runs are found once, for the streaks of every habit and the longest streak of the shard
+            names, (run_ids, _, _, lengths) = tracker.find_streakruns_all()
+            longest_by_id = longest_streaks(run_ids, lengths)
+            longest = max(longest_by_id.values(), default=0)
+            longest_habits = [names[habit_id] for habit_id in sorted(longest_by_id) if longest_by_id[habit_id] == longest]
+            streaks = {name: {"runs": 0, "longest": longest_by_id.get(habit_id, 0)} for habit_id, name in names.items()}
+            for habit_id in run_ids.tolist():
+                streaks[names[habit_id]]["runs"] += 1
+            counts = {}
+            for name, day, count in storage.count_completions(start, end, period):
+                label = period_label(day, CalendarPeriod(period))
+                counts[label] = counts.get(label, 0) + count
+        finally:
+            storage.close()
+    except Exception as error:
+        return {"path": path, "error": f"{type(error).__name__}: {error}", "seconds": time.perf_counter() - started}
+    return {"path": path, "habits": len(names), "longest_streak": {"habits": longest_habits, "length": longest},
+            "streaks": streaks, "counts": counts, "seconds": time.perf_counter() - started}
+
+def merge(shards: List[dict]) -> dict:
+    """
+    Merges the stats of the shards into one report: the longest streak(s) out of all shards,
+    the total completions per period and the shards themselves (including the failed ones).
+    """
+    longest = {"length": 0, "habits": []}
+    counts = {}
+    for shard in shards:
+        if "error" in shard:
+            continue
+        length = shard["longest_streak"]["length"]
+        habits = [[shard["path"], name] for name in shard["longest_streak"]["habits"]]
+        if length > longest["length"]:
+            longest = {"length": length, "habits": habits}
+        elif length == longest["length"] and length > 0:
+            longest["habits"].extend(habits)
+        for label, count in shard["counts"].items():
+            counts[label] = counts.get(label, 0) + count
+    return {"databases": len(shards), "failed": sum("error" in shard for shard in shards),
+            "habits": sum(shard.get("habits", 0) for shard in shards),
+            "longest_streak": longest, "counts": dict(sorted(counts.items())), "shards": shards}
+
+def fleet_stats(paths: List[str], start: Optional[str] = None, end: Optional[str] = None, period: str = "week",
+                workers: Optional[int] = None) -> dict:
+    """
+    Computes the stats of many tracker databases in parallel, one database per task on a pool of worker processes
+    (as many as there are CPUs by default), and merges them into one report.
+    The completions are counted per day/week/month between start and end (both included, the last 4 weeks by default).
+    The report contains the time every shard took and the wall time of the whole run.
+    """
+    end = end or datetime.date.today().isoformat()
+    start = start or (datetime.date.fromisoformat(end) - datetime.timedelta(days=27)).isoformat()
+    started = time.perf_counter()
+    if workers == 1:
+        # No processes to start and no results to pickle for a single worker
+        shards = [shard_stats(path, start, end, period) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shards = list(executor.map(shard_stats, paths, [start] * len(paths), [end] * len(paths),
+                                       [period] * len(paths)))
+    report = merge(shards)
+    report.update(start=start, end=end, period=period, workers=workers or os.cpu_count(),
+                  seconds=time.perf_counter() - started)
+    return report
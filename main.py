@@ -1,56 +1,233 @@
-import math
+import datetime
+import threading
+from contextlib import contextmanager
+from itertools import islice
 from sqlite3 import IntegrityError
-from typing import List
+from typing import Dict, List, Optional
+from cache import LRUCache
 from database import Database
-from classes import Habit, HabitCompleted, period_map
+from storage import Storage
+from profiling import profiled
+from classes import (CalendarPeriod, CompletionStore, Habit, HabitCompleted, next_period, parse_periodicity, period_days,
+                     period_label, period_start)
 
 DB_DEFAULT_NAME = "database.db"
 
 class HabitTracker:
-    def __init__(self, storage = None):
+    def __init__(self, storage: Optional[Storage] = None, cache_size: int = 1024):
         self.storage = storage or Database(DB_DEFAULT_NAME)
-        #
-        self.allHabits: List[Habit] = self.storage.get_allhabits()
-        self.completedHabits = self.storage.get_alltrackedhabits()
+        # Habits and completions are only loaded from the storage when they're accessed the first time.
+        # _habits is a name-keyed index of the habits loaded so far, with all habits once allHabits was accessed.
+        self._habits: Dict[str, Habit] = {}
+        self._allHabitsLoaded = False
+        # The index is shared between threads (f.e. the readers and the writer of the server): every change increases
+        # its generation, so habits that were read from the storage before the change aren't put into it anymore
+        self._habitsLock = threading.Lock()
+        self._habitsGeneration = 0
+        # The thread running a transaction() block and the habits it changed, which are loaded again after the commit
+        self._transactionThread = None
+        self._touchedHabits = set()
+        self._completedHabits: Optional[CompletionStore] = None
+        # Every change of a habit or its completions increases the version of the habit (and the total version),
+        # so cached analytics results of older versions are never used again
+        self._versions: Dict[str, int] = {}
+        self._version = 0
+        self._versionLock = threading.Lock()
+        self._analytics = LRUCache(cache_size)
+        # Storage.data_version when the data was loaded, to notice changes made by other processes
+        self._dataVersion = self.storage.data_version()
 
+    def _refresh(self):
+        """
+        Drops the loaded habits and completions and all cached analytics results if another process changed
+        the storage since they were loaded (see Storage.data_version), so they're loaded again.
+        """
+        version = self.storage.data_version()
+        if version == self._dataVersion:
+            return
+        self._dataVersion = version
+        self._resethabits()
+        self._completedHabits = None
+        with self._versionLock:
+            # Results that other threads are still computing from the old data are cached under outdated versions
+            self._versions = {name: habit_version + 1 for name, habit_version in self._versions.items()}
+            self._version += 1
+        self._analytics.clear()
+
+    def _resethabits(self):
+        """
+        Empties the habit index, so all habits are loaded again.
+        """
+        with self._habitsLock:
+            self._habitsGeneration += 1
+            self._habits = {}
+            self._allHabitsLoaded = False
+
+    def _sethabit(self, name: str, habit: Optional[Habit]):
+        """
+        Puts a habit into the index, or removes it if habit is None.
+        """
+        with self._habitsLock:
+            self._habitsGeneration += 1
+            if self._transactionThread == threading.get_ident():
+                self._touchedHabits.add(name)
+                self._habits.pop(name, None)
+                self._allHabitsLoaded = False
+            elif habit is None:
+                self._habits.pop(name, None)
+            else:
+                self._habits[name] = habit
+
+    def _uncommitted(self, name: str = None) -> bool:
+        """
+        Whether the current thread changed the habit (or any habit) in a transaction that isn't committed yet.
+        """
+        return self._transactionThread == threading.get_ident() and (
+            name in self._touchedHabits if name is not None else bool(self._touchedHabits))
+
+    def _indexable(self, generation: int) -> bool:
+        """
+        Whether habits that were read at generation can be put into the index.
+        """
+        return generation == self._habitsGeneration and self._transactionThread != threading.get_ident()
+
+    @property
+    @profiled
+    def allHabits(self) -> List[Habit]:
+        self._refresh()
+        with self._habitsLock:
+            if self._allHabitsLoaded and not self._uncommitted():
+                return list(self._habits.values())
+            generation = self._habitsGeneration
+        habits = {h.name: h for h in self.storage.get_allhabits()}
+        with self._habitsLock:
+            if self._indexable(generation):
+                self._habits = habits
+                self._allHabitsLoaded = True
+        return list(habits.values())
+
+    @allHabits.setter
+    def allHabits(self, habits: List[Habit]):
+        with self._habitsLock:
+            self._habitsGeneration += 1
+            self._habits = {h.name: h for h in habits}
+            self._allHabitsLoaded = True
+
+    @property
+    @profiled
+    def completedHabits(self) -> CompletionStore:
+        self._refresh()
+        if self._completedHabits is None:
+            self._completedHabits = self.storage.get_completionstore()
+        return self._completedHabits
+
+    @completedHabits.setter
+    def completedHabits(self, completions: CompletionStore):
+        self._completedHabits = completions
+
+    def _changed(self, name: str):
+        """
+        Marks a habit as changed, so cached analytics results of the habit (and of all habits) are recomputed.
+        """
+        with self._versionLock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self._version += 1
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups all changes in the block into one transaction of the storage, rolled back if the block raises.
+        """
+        with self._versionLock:
+            before = dict(self._versions)
+        outermost = False
+        try:
+            with self.storage.transaction():
+                outermost = self._transactionThread != threading.get_ident()
+                self._transactionThread = threading.get_ident()
+                try:
+                    yield
+                except BaseException:
+                    # The loaded completions might include rolled back ones
+                    self._completedHabits = None
+                    raise
+                finally:
+                    if outermost:
+                        self._transactionThread = None
+        finally:
+            if outermost:
+                with self._habitsLock:
+                    self._habitsGeneration += 1
+                    for name in self._touchedHabits:
+                        self._habits.pop(name, None)
+                    if self._touchedHabits:
+                        self._allHabitsLoaded = False
+                    self._touchedHabits = set()
+        with self._versionLock:
+            changed = [name for name, version in self._versions.items() if before.get(name) != version]
+        for name in changed:
+            self._changed(name)
+
+    @profiled
     def create(self, new_habit: Habit):
         """
         Creates a new habit.
         new_habit object: name, definition, periodicity
         """
         self.storage.store_habit(new_habit.name, new_habit.definition, new_habit.periodicity.value)
-        self.allHabits.append(new_habit)
+        self._sethabit(new_habit.name, new_habit)
+        self._changed(new_habit.name)
 
+    @profiled
     def delete(self, name: str):
         """
         Deletes a habit and all connected completions.
         """
         self.storage.delete_habit(name)
-        self.allHabits: List[Habit] = self.storage.get_allhabits()
-        self.completedHabits = self.storage.get_alltrackedhabits()
+        self._sethabit(name, None)
+        if self._completedHabits is not None:
+            self._completedHabits.remove(name)
+        self._changed(name)
 
+    @profiled
     def update(self, name: str, definition: str, periodicity: str) -> Habit:
         """
         Updates the definition and periodicity of a given habit.
         """
-        self.storage.update_habit(name, definition, periodicity)
-        self.allHabits: List[Habit] = self.storage.get_allhabits()
-        for h in self.allHabits:
-            if h.name == name:
-                return h
+        updated_habit = Habit(name, definition, periodicity)
+        self.storage.update_habit(name, definition, updated_habit.periodicity.value)
+        self._sethabit(name, updated_habit)
+        self._changed(name)
+        return updated_habit
+
+    @profiled
+    def get_habit(self, name: str) -> Optional[Habit]:
+        """
+        Returns the habit with the given name or None if it wasn't created.
+        """
+        self._refresh()
+        with self._habitsLock:
+            if (name in self._habits or self._allHabitsLoaded) and not self._uncommitted(name):
+                return self._habits.get(name)
+            generation = self._habitsGeneration
+        habit = self.storage.get_habit(name)
+        with self._habitsLock:
+            if habit is not None and self._indexable(generation):
+                self._habits[name] = habit
+        return habit
 
+    @profiled
     def get_streakperiod(self, name)->int:
         """
-        Gets the streak period (daily or weekly) of a created habit.
+        Gets the streak period of a created habit: the (average) number of days of one period, f.e. 1 for daily habits.
         Can be used in multiple functions, f.e. to return streak lengths.
         """
-        streak_period = None
-        for i in self.allHabits:
-            if i.name == name:
-                streak_period = period_map[i.periodicity]
-                break
-        return streak_period
+        habit = self.get_habit(name)
+        if habit is None:
+            return None
+        return period_days(habit.periodicity)
 
+    @profiled
     def complete_habit(self, name: str, date: str = None):
         """
         Completes a habit that was created. Giving a date is optional - default is today.
@@ -58,8 +235,10 @@ class HabitTracker:
         completed_habit = HabitCompleted(name, date=date)
 
         try:
-            self.storage.complete_habit(completed_habit.name, completed_habit.date)
-            self.completedHabits.append(completed_habit)
+            if self.storage.complete_habit(completed_habit.name, completed_habit.date):
+                self._changed(completed_habit.name)
+                if self._completedHabits is not None:
+                    self._completedHabits.add(completed_habit.name, completed_habit.date.toordinal())
 
         except IntegrityError:
         # Raises a value error if a habit that wasn't created was completed
@@ -68,6 +247,108 @@ class HabitTracker:
 
         return completed_habit.name, completed_habit.date
 
+    @profiled
+    def complete_habits_bulk(self, completions, batch_size: int = 1000, require_date: bool = False):
+        """
+        Completes many (name, date) pairs in batches of one transaction each.
+        Returns the number of stored completions and the rejected rows as (name, date, reason).
+        """
+        completions = iter(completions)
+        stored = 0
+        rejected = []
+        while True:
+            batch = list(islice(completions, batch_size))
+            if not batch:
+                break
+
+            valid = []
+            for name, date in batch:
+                if not name:
+                    rejected.append((name, date, "missing name"))
+                    continue
+                if date is None and require_date:
+                    rejected.append((name, date, "missing date"))
+                    continue
+                try:
+                    valid.append(HabitCompleted(name, date=date))
+                except (TypeError, ValueError):
+                    rejected.append((name, date, "invalid date"))
+
+            stored_batch, rejected_batch = self.storage.complete_habits_bulk(
+                (hc.name, hc.date.isoformat()) for hc in valid)
+            stored += stored_batch
+            rejected.extend(rejected_batch)
+            rejected_names = {name for (name, *_) in rejected_batch}
+            new_completions = [hc for hc in valid if hc.name not in rejected_names]
+            for name in {hc.name for hc in new_completions}:
+                self._changed(name)
+            if self._completedHabits is None:
+                continue
+            if stored_batch == len(new_completions):
+                for hc in new_completions:
+                    self._completedHabits.add(hc.name, hc.date.toordinal())
+            else:
+                # Some completions were already stored, load them again on the next access instead of adding duplicates
+                self._completedHabits = None
+
+        return stored, rejected
+
+    def export_changes(self, since: int = 0) -> dict:
+        """
+        Returns the changes of habits and completions since a sequence number (see Database.export_changes).
+        """
+        return self.storage.export_changes(since)
+
+    @profiled
+    def apply_changes(self, changes: dict) -> dict:
+        """
+        Applies changes exported on another device (see Database.apply_changes).
+        The loaded habits and completions are dropped and loaded again on the next access.
+        """
+        applied = self.storage.apply_changes(changes)
+        changed = {name for (name, *_) in changes["habits"]["upsert"]} | set(changes["habits"]["delete"])
+        changed |= set(changes["completions"]["insert"]) | set(changes["completions"]["delete"])
+        self._resethabits()
+        self._completedHabits = None
+        for name in changed:
+            self._changed(name)
+        return applied
+
+    def archive(self, before: str) -> int:
+        """
+        Archives all completions before a date (see Database.archive_completions).
+        """
+        return self.storage.archive_completions(before)
+
+    def backup(self, path: str, compress: bool = False, pages: int = 256, sleep: float = 0.005) -> dict:
+        """
+        Saves a snapshot of the tracker while it's in use (see Database.backup).
+        """
+        return self.storage.backup(path, pages, sleep, compress)
+
+    @profiled
+    def restore(self, path: str):
+        """
+        Replaces all habits and completions with a snapshot saved by backup (see Database.restore).
+        The loaded habits and completions are dropped and loaded again on the next access.
+        """
+        changed = {habit.name for habit in self.storage.get_allhabits()}
+        self.storage.restore(path)
+        changed |= {habit.name for habit in self.storage.get_allhabits()}
+        self._resethabits()
+        self._completedHabits = None
+        for name in changed:
+            self._changed(name)
+
+    def iter_completions(self, habit: str = None, start: str = None, end: str = None):
+        """
+        Yields the completions (of one habit or all habits) between the optional start and end date, ordered by date.
+        The completions are streamed from the storage instead of being loaded at once.
+        """
+        for name, date in self.storage.iter_completions(habit, start, end):
+            yield HabitCompleted(name, date)
+
+    @profiled
     def get_habitcompletions(self, name: str)->list:
         """
         Returns a list of all completion entries of a habit.
@@ -76,97 +357,222 @@ class HabitTracker:
         habits_completed.sort()
         return habits_completed
 
+    @profiled
     def find_allstreaks(self, name: str)->list:
         """
         Finds all streaks of one habit and can be used in other functions (f.e. to find longest streaks)
         Returns a list of all streaks of one habit.
         """
-        dates = self.storage.get_completedhabits(name)
-        dates.sort()
-        streak_period = self.get_streakperiod(name)
-
-        start_streak = None
-        end_streak = None
-        streak_list = []
-        for i in range(1, len(dates)):
-            first_entry = dates[i-1]
-            second_entry = dates[i]
-            start_streak = start_streak or first_entry
-
-            if abs((first_entry.date - second_entry.date).days) <= streak_period:
-                end_streak = second_entry
-            else:
+        def load_streaks():
+            streak_list = []
+            for start, end, streak_length in self.storage.get_streaks(name):
                 # Append start, end and length as a tuple to the list
-                streak_length = math.ceil((end_streak.date - start_streak.date).days/streak_period)+1
-                streak_list.append((start_streak, end_streak, streak_length))
-                # Reset the next streak
-                start_streak = second_entry
-                end_streak = start_streak
-
-        # Assign end of streak in case of still running streaks up until today
-        if start_streak and end_streak and len(streak_list)==0:
-            streak_length = math.ceil((end_streak.date - start_streak.date).days / streak_period) + 1
-            streak_list.append((start_streak, end_streak, streak_length))
+                streak_list.append((HabitCompleted(name, start), HabitCompleted(name, end), streak_length))
+            return streak_list
 
-        return streak_list
+        self._refresh()
+        return list(self._analytics.get(("find_allstreaks", name, self._versions.get(name, 0)), load_streaks))
 
+    @profiled
     def get_longeststreak_habit(self, name: str):
         """
         Returns the longest streak of a habit.
         Returns the length of the streak as well as the start and end date of the longest streak.
         """
-        dates = self.storage.get_completedhabits(name)
-        if len(dates) < 1:
-        # Return None if there are no completions yet
-            return None, None, None
-
-        all_streaks = self.find_allstreaks(name)
+        self._refresh()
+        longest_streak = self._analytics.get(("get_longeststreak_habit", name, self._versions.get(name, 0)),
+                                             lambda: self.storage.get_longeststreak(name))
         # Return None if there are no established streaks yet
-        if len(all_streaks) < 1:
+        if longest_streak is None:
             return None, None, None
 
-        def get_streak_length(streak):
-        # Position of streak[2] is the length of the streak
-            return streak[2]
+        streak_length, start, end = longest_streak
+        return streak_length, HabitCompleted(name, start).date, HabitCompleted(name, end).date
 
+    @profiled
+    def find_streakruns_all(self):
+        """
+        Finds the streak runs of all habits at once, loading all completions in one query.
+        Returns the habit names by id and the arrays of analytics.find_streakruns_all.
+        """
+        from analytics import find_streakruns_all
 
-        longest_streak = max(all_streaks, key=get_streak_length)
-        # Returns the longest streak by getting the max of all streaks from the all_streaks list
-        start, end, streak_length = longest_streak
+        habit_ids = self.storage.get_habitids()
+        names = {habit_id: name for (habit_id, name, _) in habit_ids}
+        periodicities = {habit_id: periodicity for (habit_id, _, periodicity) in habit_ids}
+        ids, days = self.storage.get_allcompletiondays()
+        return names, find_streakruns_all(ids, days, periodicities)
 
-        return streak_length, start.date, end.date
+    @profiled
+    def find_allstreaks_all(self) -> dict:
+        """
+        Finds all streaks of all habits.
+        Returns a dict with the same list as find_allstreaks for every habit name.
+        """
+        names, (run_ids, starts, ends, lengths) = self.find_streakruns_all()
+        all_streaks = {name: [] for name in names.values()}
+        for habit_id, start, end, streak_length in zip(run_ids.tolist(), starts.tolist(), ends.tolist(), lengths.tolist()):
+            name = names[habit_id]
+            all_streaks[name].append((HabitCompleted(name, datetime.date.fromordinal(start).isoformat()),
+                                      HabitCompleted(name, datetime.date.fromordinal(end).isoformat()), streak_length))
+        return all_streaks
 
+    @profiled
     def get_longeststreak_all(self):
         """
         Returns the longest streak out of all habits.
         Returns the name(s) of the habits as well as the number of consecutive days/weeks.
         """
-        max_streak = 0
-        longest_streak_habits = []
-        for h in self.allHabits:
-            streak, *_ = self.get_longeststreak_habit(h.name)
-            if streak == None:
-                continue
-
-            if streak > max_streak:
-                # [h.name] clears the list and adds the name of the habit if there have been other entries
-                max_streak = streak
-                longest_streak_habits = [h.name]
+        from analytics import longest_streaks
 
-            elif streak == max_streak:
-            # .append(h.name) appends the name, so that other names will remain in the list
-                longest_streak_habits.append(h.name)
+        def find_longeststreak():
+            names, (run_ids, _, _, lengths) = self.find_streakruns_all()
+            longest = longest_streaks(run_ids, lengths)
+            max_streak = max(longest.values(), default=0)
+            # Keep the order in which the habits were created
+            return [names[habit_id] for habit_id in sorted(longest) if longest[habit_id] == max_streak], max_streak
 
-        return longest_streak_habits, max_streak
+        self._refresh()
+        longest_streak_habits, max_streak = self._analytics.get(("get_longeststreak_all", self._version), find_longeststreak)
+        return list(longest_streak_habits), max_streak
 
+    @profiled
     def get_habits_sameperiodicity(self, periodicity: str)->list:
         """
         Returns habits with the same periodicity (daily/weekly).
         """
         return self.storage.select_habitsbyperiodicity(periodicity)
 
+    @profiled
     def get_date(self, date: str)->list:
         """
         Returns all completions for one specific date.
         """
         return self.storage.list_completionsondate(date)
+
+    @profiled
+    def due_report(self, as_of: str = None) -> dict:
+        """
+        Returns the habits that are due, at risk or overdue as of a date (default today).
+        """
+        as_of = as_of or datetime.date.today().isoformat()
+        as_of_day = datetime.date.fromisoformat(as_of).toordinal()
+        report = {"due": [], "at_risk": [], "overdue": []}
+        for name, periodicity, last_day, streak_end, streak_length in self.storage.get_lateststatus(as_of):
+            periodicity = parse_periodicity(periodicity)
+            bucket = periodicity.bucket(as_of_day)
+            streak_bucket = periodicity.bucket(streak_end) if streak_end is not None else None
+            if streak_bucket == bucket:
+                # Completed (enough times) in the current period
+                continue
+
+            running = streak_bucket == bucket - 1
+            entry = (name, streak_length if running else 0,
+                     datetime.date.fromordinal(last_day) if last_day is not None else None,
+                     periodicity.bucket_start(bucket + 1) - as_of_day)
+            report["due"].append(entry)
+            report["at_risk" if running else "overdue"].append(entry)
+        return report
+
+    @profiled
+    def get_daterange(self, start: str, end: str)->list:
+        """
+        Returns all completions between two dates (both included), ordered by date.
+        """
+        return self.storage.list_completionsbetween(start, end)
+
+    @profiled
+    def get_completioncounts(self, start: str, end: str, period: str = "day")->dict:
+        """
+        Counts the completions of every habit per day, ISO week or month between two dates (both included).
+        Returns a dict of habit name -> {period label (f.e. 2022-W31): number of completions}.
+        """
+        period = CalendarPeriod(period)
+        counts = {}
+        for name, day, count in self.storage.count_completions(start, end, period.value):
+            counts.setdefault(name, {})[period_label(day, period)] = count
+        return counts
+
+    @profiled
+    def get_metrics(self, as_of: str = None, checkpoint: dict = None):
+        """
+        Returns the consistency metrics of every habit as of a date (default today) and a checkpoint for the next call.
+        """
+        from metrics import WindowState, resumable
+        as_of = as_of or datetime.date.today().isoformat()
+        as_of_day = datetime.date.fromisoformat(as_of).toordinal()
+        checkpoint = checkpoint or {}
+        habit_metrics = {}
+        states = {}
+        for habit in self.allHabits:
+            # The checkpoint is checked by counting and summing the days it processed in SQL,
+            # then only the completions after its last day are read
+            saved = checkpoint.get(habit.name)
+            last_day = saved["last_day"] if saved is not None else None
+            if (last_day is not None and last_day <= as_of_day and
+                    resumable(saved, habit.periodicity.value, *self.storage.summarize_completions(habit.name, last_day))):
+                state = WindowState.from_dict(saved)
+                state.add(self.storage.get_completiondays(habit.name, last_day + 1, as_of_day))
+            else:
+                state = WindowState(habit.periodicity.value)
+                state.add(self.storage.get_completiondays(habit.name, last=as_of_day))
+            states[habit.name] = state.to_dict()
+            report = state.report(as_of_day)
+            if report["best"] is not None:
+                report["best"]["start"] = datetime.date.fromordinal(report["best"]["start"])
+                report["best"]["end"] = datetime.date.fromordinal(report["best"]["end"])
+            habit_metrics[habit.name] = report
+        return habit_metrics, states
+
+    def get_bitsetindex(self, start: str = None, end: str = None):
+        """
+        Returns the completions of all habits as a bitsets.BitsetIndex between two optional dates.
+        """
+        from bitsets import BitsetIndex
+        self._refresh()
+        bitsets = self._analytics.get(("get_bitsets", self._version), self.storage.get_bitsets)
+        return BitsetIndex(bitsets, datetime.date.fromisoformat(start).toordinal() if start else None,
+                           datetime.date.fromisoformat(end).toordinal() if end else None)
+
+    @profiled
+    def query_days(self, expression: str, start: str = None, end: str = None) -> List[str]:
+        """
+        Returns the dates matching a combination of habits, f.e. "Workout AND NOT Sleep" are the days on which
+        Workout but not Sleep was completed (see bitsets.BitsetIndex.evaluate).
+        """
+        index = self.get_bitsetindex(start, end)
+        return [datetime.date.fromordinal(day).isoformat() for day in index.days(expression)]
+
+    @profiled
+    def get_cooccurrence(self, start: str = None, end: str = None):
+        """
+        Returns the number of days on which both habits were completed and the correlation of their completions
+        for every pair of habits, as two dicts keyed by (habit, habit).
+        """
+        index = self.get_bitsetindex(start, end)
+        return index.cooccurrence(), index.correlation()
+
+    @profiled
+    def get_heatmap(self, start: str, end: str, period: str = "week"):
+        """
+        Returns the period labels and the completion rate of every habit per day, week or month between two dates.
+        """
+        period = CalendarPeriod(period)
+        first = datetime.date.fromisoformat(start).toordinal()
+        last = datetime.date.fromisoformat(end).toordinal()
+        starts = []
+        day = period_start(first, period)
+        while day <= last:
+            starts.append(day)
+            day = next_period(day, period)
+        # Number of days of every period within the range
+        days_in_range = [min(next_period(day, period), last + 1) - max(day, first) for day in starts]
+        index = {day: i for i, day in enumerate(starts)}
+
+        heatmap = {h.name: [0.0] * len(starts) for h in self.allHabits}
+        for name, day, count in self.storage.count_completions(start, end, period.value):
+            habit = self.get_habit(name)
+            i = index[day]
+            expected = days_in_range[i] / period_days(habit.periodicity) * habit.periodicity.times
+            heatmap[name][i] = min(1.0, count / expected)
+        return [period_label(day, period) for day in starts], heatmap
@@ -0,0 +1,159 @@
+from bisect import bisect_right
+from typing import Iterable, Optional
+from classes import parse_periodicity
+
+# Sizes (in periods) of the windows of the completion rates
+RATE_WINDOWS = (7, 30, 90)
+# The trend is the rate of the last TREND_WINDOW periods minus the rate of the TREND_WINDOW periods before
+TREND_WINDOW = 30
+# Size of the best rolling window
+BEST_WINDOW = 30
+WINDOWS = sorted(set(RATE_WINDOWS) | {TREND_WINDOW, 2 * TREND_WINDOW, BEST_WINDOW})
+# Number of closed periods kept - enough for the largest window
+HISTORY = max(WINDOWS)
+
+class WindowState:
+    """
+    Sliding window state of the consistency metrics of one habit.
+    A period (day, ISO week, ...) is met if the habit was completed often enough in it (f.e. 3 times for "3-per-week").
+    Whether the last HISTORY closed periods were met is kept in a ring buffer, together with the running number
+    of met periods in every window - closing a period adds it and subtracts the period that leaves the window,
+    so the windows are never summed up again and the completions are processed in one linear pass.
+    The period of the last completion stays open, as more completions can follow in it.
+    The state can be saved with to_dict (f.e. as JSON) and resumed with from_dict to only add new completions.
+    """
+    def __init__(self, periodicity: str):
+        self.periodicity = parse_periodicity(periodicity)
+        # Number, last day and sum of the day ordinals of the processed completions, to recognize changed history
+        self.processed = 0
+        self.last_day = None
+        self.checksum = 0
+        # The open period: its bucket id (see Periodicity.bucket) and completions so far
+        self.bucket = None
+        self.bucket_count = 0
+        self.periods = 0
+        self.ring = [0] * HISTORY
+        self.position = 0
+        self.sums = {window: 0 for window in WINDOWS}
+        # Met periods and the last bucket of the best BEST_WINDOW window
+        self.best = None
+
+    def to_dict(self) -> dict:
+        return {"periodicity": self.periodicity.value, "processed": self.processed, "last_day": self.last_day,
+                "checksum": self.checksum, "bucket": self.bucket, "bucket_count": self.bucket_count,
+                "periods": self.periods, "ring": self.ring, "position": self.position,
+                "sums": {str(window): total for window, total in self.sums.items()}, "best": self.best}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "WindowState":
+        window_state = cls(state["periodicity"])
+        for key in ("processed", "last_day", "checksum", "bucket", "bucket_count", "periods", "position"):
+            setattr(window_state, key, state[key])
+        window_state.ring = list(state["ring"])
+        window_state.sums = {int(window): total for window, total in state["sums"].items()}
+        window_state.best = tuple(state["best"]) if state["best"] else None
+        return window_state
+
+    def copy(self) -> "WindowState":
+        return WindowState.from_dict(self.to_dict())
+
+    def close(self, met: int):
+        """
+        Closes the open period (met is 1 or 0) and updates the running sums of all windows.
+        """
+        for window in WINDOWS:
+            if self.periods >= window:
+                # The period closed window periods ago leaves the window
+                self.sums[window] -= self.ring[(self.position - window) % HISTORY]
+            self.sums[window] += met
+        self.ring[self.position] = met
+        self.position = (self.position + 1) % HISTORY
+        self.periods += 1
+        if self.periods >= BEST_WINDOW and (self.best is None or self.sums[BEST_WINDOW] > self.best[0]):
+            self.best = (self.sums[BEST_WINDOW], self.bucket)
+
+    def close_until(self, bucket: int):
+        """
+        Closes all periods before bucket. After HISTORY periods without completions all windows are empty,
+        so longer gaps are skipped instead of closing every empty period.
+        """
+        self.close(int(self.bucket_count >= self.periodicity.times))
+        self.bucket += 1
+        self.bucket_count = 0
+        gap = bucket - self.bucket
+        for _ in range(min(gap, HISTORY)):
+            self.close(0)
+            self.bucket += 1
+        if gap > HISTORY:
+            self.periods += gap - HISTORY
+            self.bucket = bucket
+
+    def add(self, days: Iterable[int]):
+        """
+        Adds completions (sorted day ordinals after the last processed one).
+        """
+        for day in days:
+            # NumPy integers (f.e. from the columnar storage) would overflow the checksum
+            day = int(day)
+            bucket = self.periodicity.bucket(day)
+            if self.bucket is None:
+                self.bucket = bucket
+            elif bucket > self.bucket:
+                self.close_until(bucket)
+            self.bucket_count += 1
+            self.processed += 1
+            self.checksum += day
+            self.last_day = day
+
+    def report(self, as_of_day: int) -> dict:
+        """
+        Returns the metrics as of a day (on or after the last completion), only counting closed periods -
+        the period of as_of_day isn't over yet:
+        - rate_N: share of the last N periods that were met (of all periods if the habit is younger)
+        - trend: rate of the last TREND_WINDOW periods minus the rate of the TREND_WINDOW periods before
+        - best: the best rate of BEST_WINDOW consecutive periods with the first and last day of that window
+        Doesn't change the state.
+        """
+        state = self
+        current = self.periodicity.bucket(as_of_day)
+        if self.bucket is not None and current > self.bucket:
+            state = self.copy()
+            state.close_until(current)
+        periods = state.periods
+        report = {f"rate_{window}": state.sums[window] / min(window, periods) if periods else None for window in RATE_WINDOWS}
+        report["periods"] = periods
+        report["trend"] = None
+        if periods >= 2 * TREND_WINDOW:
+            previous = state.sums[2 * TREND_WINDOW] - state.sums[TREND_WINDOW]
+            report["trend"] = (state.sums[TREND_WINDOW] - previous) / TREND_WINDOW
+        report["best"] = None
+        if state.best is not None:
+            met, last_bucket = state.best
+            report["best"] = {"rate": met / BEST_WINDOW,
+                              "start": self.periodicity.bucket_start(last_bucket - BEST_WINDOW + 1),
+                              "end": self.periodicity.bucket_start(last_bucket + 1) - 1}
+        return report
+
+def resumable(state: Optional[dict], periodicity: str, count: int, checksum: int) -> bool:
+    """
+    Returns whether a saved state can be continued: the periodicity is the same and the completions up to its last day
+    are still the ones it processed - count and checksum are their number and the sum of their day ordinals.
+    Not after a backdated completion or a deleted one, for example.
+    """
+    return (state is not None and state["periodicity"] == parse_periodicity(periodicity).value
+            and (state["processed"], state["checksum"]) == (count, checksum))
+
+def resume(state: Optional[dict], periodicity: str, days) -> WindowState:
+    """
+    Returns the window state after all completions (sorted day ordinals), continuing from a saved state
+    if it's resumable - otherwise the state is computed from the start.
+    """
+    if state is not None:
+        processed = bisect_right(days, state["last_day"]) if state["last_day"] is not None else 0
+        if resumable(state, periodicity, processed, sum(days[:processed])):
+            window_state = WindowState.from_dict(state)
+            window_state.add(days[processed:])
+            return window_state
+    window_state = WindowState(periodicity)
+    window_state.add(days)
+    return window_state
@@ -0,0 +1,122 @@
+import functools
+import sqlite3
+import time
+from contextlib import contextmanager
+
+class Profiler:
+    """
+    Collects the number of calls and the total time of timing spans (f.e. HabitTracker methods)
+    and of SQL statements.
+    """
+    def __init__(self):
+        self.spans = {}
+        self.statements = {}
+
+    def record(self, stats: dict, name: str, seconds: float):
+        entry = stats.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(self.spans, name, time.perf_counter() - start)
+
+    def report(self) -> dict:
+        """
+        Returns the collected stats as a dict that can be dumped as JSON, slowest first.
+        """
+        def as_list(stats):
+            return [{"name": name, "count": count, "seconds": seconds}
+                    for name, (count, seconds) in sorted(stats.items(), key=lambda item: -item[1][1])]
+        return {"spans": as_list(self.spans), "sql": as_list(self.statements)}
+
+# The active profiler - None while profiling is off, so the instrumentation only costs a global lookup
+profiler = None
+
+def enable() -> Profiler:
+    """
+    Starts profiling. Only databases connected afterwards record their SQL statements.
+    """
+    global profiler
+    profiler = Profiler()
+    return profiler
+
+def disable():
+    global profiler
+    profiler = None
+
+def profiled(function):
+    """
+    Records a timing span for every call of the decorated function while profiling is on.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if profiler is None:
+            return function(*args, **kwargs)
+        with profiler.span(function.__qualname__):
+            return function(*args, **kwargs)
+    return wrapper
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Cursor that adds the time of executing a statement and fetching its rows to the statement's stats.
+    """
+    statement = None
+
+    def timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if profiler is not None and self.statement is not None:
+                profiler.record(profiler.statements, self.statement, time.perf_counter() - start)
+
+    def execute(self, sql, parameters=()):
+        self.statement = " ".join(sql.split())
+        self.timed(super().execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self.statement = " ".join(sql.split())
+        self.timed(super().executemany, sql, seq_of_parameters)
+        return self
+
+    def fetchone(self):
+        return self.timed(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self.timed(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self.timed(super().fetchall)
+
+    def __iter__(self):
+        # Iterate through fetchmany, so the rows are fetched (and timed) in pages instead of one at a time
+        while True:
+            rows = self.fetchmany(1000)
+            if not rows:
+                return
+            yield from rows
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    Connection that creates ProfiledCursors - statements executed on the connection directly are timed as well.
+    """
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        super().commit()
+        if profiler is not None:
+            profiler.record(profiler.statements, "COMMIT", time.perf_counter() - start)
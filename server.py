@@ -0,0 +1,245 @@
+import asyncio
+import contextlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from sqlite3 import IntegrityError
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from classes import Habit
+from main import HabitTracker
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def habit_json(habit: Habit) -> dict:
+    return {"name": habit.name, "definition": habit.definition, "periodicity": habit.periodicity.value}
+
+class TrackerServer:
+    """
+    Small local JSON-over-HTTP service for a HabitTracker, built on asyncio streams (no dependencies).
+
+    Reads are run on a thread pool, so slow queries don't block the event loop or each other.
+    Writes are put into a queue and run by a single writer thread: all writes that arrive while the writer
+    is busy (or within window seconds after the first one) are run in one transaction, so concurrent
+    completions share one commit (and fsync) instead of waiting for each other's.
+    The storage of the tracker has to be shareable between threads, f.e. Database(pooled=True).
+    """
+    def __init__(self, tracker: HabitTracker, window: float = 0.002, max_batch: int = 1000, read_workers: int = 8):
+        self.tracker = tracker
+        self.window = window
+        self.max_batch = max_batch
+        self.readers = ThreadPoolExecutor(read_workers, thread_name_prefix="reader")
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix="writer")
+        self.queue = None
+        self.port = None
+        self.routes = [
+            ("GET", r"/habits", self.list_habits, False),
+            ("POST", r"/habits", self.create_habit, True),
+            ("GET", r"/habits/([^/]+)", self.get_habit, False),
+            ("PUT", r"/habits/([^/]+)", self.update_habit, True),
+            ("DELETE", r"/habits/([^/]+)", self.delete_habit, True),
+            ("GET", r"/habits/([^/]+)/completions", self.list_completions, False),
+            ("POST", r"/habits/([^/]+)/completions", self.complete_habit, True),
+            ("GET", r"/habits/([^/]+)/streaks", self.list_streaks, False),
+            ("GET", r"/completions", self.list_completionsbetween, False),
+            ("POST", r"/completions", self.complete_habits_bulk, True),
+            ("GET", r"/streaks/longest", self.longest_streak, False),
+            ("GET", r"/due", self.due_report, False),
+        ]
+
+    def require_habit(self, name: str) -> Habit:
+        habit = self.tracker.get_habit(name)
+        if habit is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"There is no habit {name}")
+        return habit
+
+    def list_habits(self, query, body):
+        return HTTPStatus.OK, [habit_json(habit) for habit in self.tracker.allHabits]
+
+    def create_habit(self, query, body):
+        habit = Habit(body["name"], body.get("definition", ""), body["periodicity"])
+        self.tracker.create(habit)
+        return HTTPStatus.CREATED, habit_json(habit)
+
+    def get_habit(self, query, body, name):
+        habit = habit_json(self.require_habit(name))
+        length, start, end = self.tracker.get_longeststreak_habit(name)
+        habit["longest_streak"] = {"length": length, "start": start, "end": end} if length else None
+        return HTTPStatus.OK, habit
+
+    def update_habit(self, query, body, name):
+        self.require_habit(name)
+        return HTTPStatus.OK, habit_json(self.tracker.update(name, body["definition"], body["periodicity"]))
+
+    def delete_habit(self, query, body, name):
+        self.require_habit(name)
+        self.tracker.delete(name)
+        return HTTPStatus.OK, {"deleted": name}
+
+    def list_completions(self, query, body, name):
+        self.require_habit(name)
+        return HTTPStatus.OK, [date for (date, _) in self.tracker.get_habitcompletions(name)]
+
+    def complete_habit(self, query, body, name):
+        self.require_habit(name)
+        name, date = self.tracker.complete_habit(name, body.get("date"))
+        return HTTPStatus.CREATED, {"name": name, "date": date}
+
+    def list_streaks(self, query, body, name):
+        self.require_habit(name)
+        return HTTPStatus.OK, [{"start": start.date, "end": end.date, "length": length}
+                               for start, end, length in self.tracker.find_allstreaks(name)]
+
+    def list_completionsbetween(self, query, body):
+        return HTTPStatus.OK, [{"name": name, "date": date}
+                               for (date, name) in self.tracker.get_daterange(query["start"], query["end"])]
+
+    def complete_habits_bulk(self, query, body):
+        stored, rejected = self.tracker.complete_habits_bulk(
+            (completion.get("name"), completion.get("date")) for completion in body["completions"])
+        return HTTPStatus.OK, {"stored": stored,
+                               "rejected": [{"name": name, "date": date, "reason": reason} for name, date, reason in rejected]}
+
+    def longest_streak(self, query, body):
+        habits, length = self.tracker.get_longeststreak_all()
+        return HTTPStatus.OK, {"habits": habits, "length": length}
+
+    def due_report(self, query, body):
+        report = self.tracker.due_report(query.get("date"))
+        return HTTPStatus.OK, {key: [{"name": name, "streak": streak, "last_completed": last_completed, "days_left": days_left}
+                                     for name, streak, last_completed, days_left in entries]
+                               for key, entries in report.items()}
+
+    def call(self, handler, *args, transaction = contextlib.nullcontext):
+        """
+        Runs a handler in transaction() and turns its errors into error responses.
+        """
+        try:
+            with transaction():
+                return handler(*args)
+        except HTTPError as error:
+            return error.status, {"error": str(error)}
+        except IntegrityError as error:
+            return HTTPStatus.CONFLICT, {"error": str(error)}
+        except (ValueError, KeyError, TypeError) as error:
+            return HTTPStatus.BAD_REQUEST, {"error": f"Invalid request: {error}"}
+        except Exception as error:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(error)}
+
+    def run_writes(self, writes: list) -> list:
+        """
+        Runs a batch of writes in one transaction (in the writer thread) and returns their responses.
+        Every write runs in its own nested transaction, so a failing write is rolled back without undoing the others.
+        Only a failing commit fails all of them.
+        """
+        try:
+            with self.tracker.transaction():
+                return [self.call(handler, *args, transaction=self.tracker.transaction) for (handler, args) in writes]
+        except Exception as error:
+            return [(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(error)})] * len(writes)
+
+    async def write(self, handler, *args):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((handler, args, future))
+        return await future
+
+    async def run_writer(self):
+        """
+        Takes the queued writes in batches and runs every batch in one transaction.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            if self.window:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            responses = await loop.run_in_executor(self.writer, self.run_writes,
+                                                   [(handler, args) for (handler, args, _) in batch])
+            for (_, _, future), response in zip(batch, responses):
+                if not future.cancelled():
+                    future.set_result(response)
+
+    async def dispatch(self, method: str, target: str, body: bytes):
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        allowed = []
+        for route_method, pattern, handler, writes in self.routes:
+            match = re.fullmatch(pattern, path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed.append(route_method)
+                continue
+            try:
+                arguments = (dict(parse_qsl(url.query)), json.loads(body) if body else {},
+                             *(unquote(group) for group in match.groups()))
+            except ValueError:
+                return HTTPStatus.BAD_REQUEST, {"error": "The body has to be JSON"}
+            if writes:
+                return await self.write(handler, *arguments)
+            return await asyncio.get_running_loop().run_in_executor(self.readers, self.call, handler, *arguments)
+        if allowed:
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"Allowed methods: {', '.join(allowed)}"}
+        return HTTPStatus.NOT_FOUND, {"error": f"Unknown path {path}"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves the requests of one connection - HTTP/1.1 with keep-alive, so clients can reuse the connection.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    body = await reader.readexactly(int(headers.get("content-length", 0)))
+                except ValueError:
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": "Malformed request"}
+                    method, version = None, "HTTP/1.0"
+                if method is not None:
+                    status, payload = await self.dispatch(method, target, body)
+
+                data = json.dumps(payload, default=str).encode()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                             .encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000, started: asyncio.Event = None):
+        """
+        Serves requests until the task is cancelled. started is set once the server accepts connections.
+        """
+        self.queue = asyncio.Queue()
+        writer_task = asyncio.create_task(self.run_writer())
+        server = await asyncio.start_server(self.handle, host, port)
+        # The actual port, if port 0 was given to let the system pick a free one
+        self.port = server.sockets[0].getsockname()[1]
+        if started is not None:
+            started.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            writer_task.cancel()
+            self.readers.shutdown(wait=False)
+            self.writer.shutdown(wait=True)
@@ -0,0 +1,113 @@
+from typing import ContextManager, Iterator, List, Optional, Protocol, Sequence, Tuple, runtime_checkable
+from classes import CompletionStore, Habit
+
+@runtime_checkable
+class Storage(Protocol):
+    """
+    Interface of the storage behind a HabitTracker. Database (SQLite) is the default implementation,
+    ColumnarStorage (columnar.py) an append-only alternative for analytics-heavy use.
+
+    Dates are passed and returned as ISO strings (YYYY-MM-DD), days as day ordinals (see datetime.date.toordinal).
+    Constraint violations (creating a habit twice, completing a habit that doesn't exist) raise sqlite3.IntegrityError,
+    whatever the storage is, so callers handle all storages the same way.
+    """
+    def store_habit(self, name: str, definition: str, periodicity: str) -> None: ...
+
+    def get_allhabits(self) -> List[Habit]: ...
+
+    def get_habit(self, name: str) -> Optional[Habit]: ...
+
+    def get_habitids(self) -> List[Tuple[int, str, str]]:
+        """
+        Returns (id, name, periodicity) of all habits.
+        """
+
+    def update_habit(self, name: str, definition: str, periodicity: str) -> None:
+        """
+        Raises an exception if there is no habit with this name.
+        """
+
+    def delete_habit(self, name: str) -> None:
+        """
+        Deletes the habit with all its completions.
+        """
+
+    def complete_habit(self, habitName: str, date=None) -> bool:
+        """
+        Returns False if the habit was already completed on this date (nothing is stored then).
+        """
+
+    def complete_habits_bulk(self, completions) -> Tuple[int, list]:
+        """
+        Stores (habitName, date) completions in one go.
+        Returns the number of new completions and (habitName, date, reason) of rejected ones.
+        """
+
+    def get_completedhabit(self, habitName: str) -> List[Tuple[str, str]]:
+        """
+        Returns (date, habitName) of all completions of a habit.
+        """
+
+    def get_completiondays(self, habitName: str, first: int = None, last: int = None) -> Sequence[int]:
+        """
+        Returns the sorted days of all completions of a habit, optionally only between the days first and last
+        (both included).
+        """
+
+    def summarize_completions(self, habitName: str, last: int) -> Tuple[int, int]:
+        """
+        Returns the number and the sum of the days of the completions of a habit up to the day last (included).
+        """
+
+    def get_allcompletiondays(self) -> Tuple[Sequence[int], Sequence[int]]:
+        """
+        Returns the habit ids and days of all completions, grouped by habit and sorted by day.
+        """
+
+    def get_completionstore(self) -> CompletionStore: ...
+
+    def get_streaks(self, habitName: str) -> List[Tuple[str, str, int]]:
+        """
+        Returns (start, end, length) of all streak runs of a habit, ordered by start.
+        """
+
+    def get_longeststreak(self, habitName: str) -> Optional[Tuple[int, str, str]]:
+        """
+        Returns (length, start, end) of the longest (and earliest of equally long) streak run or None.
+        """
+
+    def get_lateststatus(self, as_of: str) -> List[tuple]:
+        """
+        Returns (habitName, periodicity, last completion day, end day and length of the latest streak)
+        of every habit, only looking at the time up to as_of.
+        """
+
+    def select_habitsbyperiodicity(self, periodicity: str) -> List[Tuple[str, str, str]]: ...
+
+    def list_completionsondate(self, date: str) -> List[Tuple[str, str]]: ...
+
+    def list_completionsbetween(self, start: str, end: str) -> List[Tuple[str, str]]: ...
+
+    def count_completions(self, start: str, end: str, period: str = "day") -> List[Tuple[str, int, int]]:
+        """
+        Returns (habitName, first day of the period, count) ordered by habit and period.
+        """
+
+    def iter_completions(self, habitName: str = None, start: str = None, end: str = None,
+                         page_size: int = 1000) -> Iterator[Tuple[str, str]]:
+        """
+        Yields (habitName, date) ordered by date.
+        """
+
+    def transaction(self) -> ContextManager[None]:
+        """
+        Returns a context manager that groups all writes in the block, committed once at the end.
+        """
+
+    def data_version(self) -> int:
+        """
+        Returns a number that changes when another process committed changes to the storage (but not for changes
+        made through this object), so data loaded or computed before can be dropped.
+        """
+
+    def close(self) -> None: ...
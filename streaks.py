@@ -0,0 +1,47 @@
+from typing import List
+from classes import parse_periodicity
+from profiling import profiled
+
+@profiled
+def find_streakruns(days, periodicity) -> List[tuple]:
+    """
+    Finds all streak runs in a sorted sequence of day ordinals (see datetime.date.toordinal).
+    Every completion is mapped to the bucket id of its period (day, ISO week, month, ...) - a streak is a run of
+    consecutive buckets with at least periodicity.times completions each, so all periodicities cost one linear pass.
+    Returns a list of (start, end, length) tuples - start and end are the first and last completion (day ordinals)
+    of the streak, the length is the number of periods.
+    """
+    periodicity = parse_periodicity(periodicity)
+    streak_list = []
+    start_streak = end_streak = None
+    last_bucket = None
+    streak_length = 0
+
+    # Completions of the current bucket: its id, first and last day and number of completions
+    bucket = first_day = last_day = None
+    count = 0
+    for day in list(days) + [None]:
+        day_bucket = periodicity.bucket(day) if day is not None else None
+        if day_bucket == bucket:
+            if day != last_day:
+                count += 1
+            last_day = day
+            continue
+
+        # The previous bucket is complete - add it to the streak if it has enough completions
+        if bucket is not None and count >= periodicity.times:
+            if last_bucket is not None and bucket == last_bucket + 1:
+                end_streak = last_day
+                streak_length += 1
+            else:
+                if start_streak is not None:
+                    streak_list.append((start_streak, end_streak, streak_length))
+                start_streak, end_streak, streak_length = first_day, last_day, 1
+            last_bucket = bucket
+
+        bucket, first_day, last_day, count = day_bucket, day, day, 1
+
+    # The last streak is still running
+    if start_streak is not None:
+        streak_list.append((start_streak, end_streak, streak_length))
+    return streak_list
@@ -1,13 +1,15 @@
 import datetime
-from sqlite3 import IntegrityError
+from sqlite3 import IntegrityError, OperationalError
 import pytest
 from main import HabitTracker
-from database import Database
+from database import Database, MIGRATIONS
 from classes import Habit
 
 class TestTracker:
-    def setup_method(self):
-        self.tracker = HabitTracker(storage = Database("test.db"))
+    @pytest.fixture(autouse=True)
+    def setup_tracker(self, tracker):
+        # Every test gets its own in-memory tracker (see conftest.py), tests that reopen a file use test.db
+        self.tracker = tracker
 
     def test_create(self):
         test_habit = Habit("test_name", "test_definition", "daily")
@@ -151,6 +153,855 @@ class TestTracker:
         # Assert that the length of the output list is 1 (contains completed1 object)
         assert len(self.tracker.get_date(yesterday.isoformat())) == 1
 
-    def teardown_method(self):
+    def test_complete_bulk(self):
+        test_habit = Habit("test_name", "test_definition", "daily")
+        self.tracker.create(test_habit)
+        yesterday = datetime.datetime.now().date() - datetime.timedelta(days=1)
+        completions = [("test_name", yesterday.isoformat()), ("test_name", None),
+                       ("bad_habit", None), ("test_name", "not a date")]
+        stored, rejected = self.tracker.complete_habits_bulk(completions, batch_size=2)
+        # Assert that only the two valid completions are stored and the bad rows are reported
+        assert stored == 2
+        assert len(self.tracker.completedHabits) == 2
+        assert sorted(reason for (*_, reason) in rejected) == ["invalid date", "unknown habit"]
+        assert len(self.tracker.get_habitcompletions("test_name")) == 2
+
+    def test_complete_duplicate(self):
+        test_habit = Habit("test_name", "test_definition", "daily")
+        self.tracker.create(test_habit)
+        self.tracker.complete_habit("test_name")
+        self.tracker.complete_habit("test_name")
+        # Assert that completing a habit twice on the same date is only stored once
+        assert len(self.tracker.completedHabits) == 1
+        assert len(self.tracker.get_habitcompletions("test_name")) == 1
+
+    def test_migrate_olddatabase(self):
+        import os
+        import sqlite3
+        # Create a database file with the schema before migrations and duplicate completions
+        old = sqlite3.connect("test_migration.db")
+        old.execute("CREATE TABLE habit(name TEXT PRIMARY KEY, definition TEXT, periodicity TEXT)")
+        old.execute("CREATE TABLE habitCompleted(date TEXT, habitName TEXT, FOREIGN KEY (habitName) REFERENCES habit(name))")
+        old.execute("INSERT INTO habit VALUES ('test_name', 'test_definition', 'daily')")
+        old.executemany("INSERT INTO habitCompleted VALUES (?, 'test_name')", [("2022-08-01",), ("2022-08-01",), ("2022-08-02",)])
+        old.commit()
+        old.close()
+
+        database = Database("test_migration.db")
+        version = database.database.execute("PRAGMA user_version").fetchone()[0]
+        plans = [database.database.execute(f"EXPLAIN QUERY PLAN SELECT day FROM habitCompleted WHERE {column} = ?", (1,)).fetchall()
+                 for column in ("habitId", "day")]
+        completions = database.get_completedhabit("test_name")
+        violations = database.database.execute("PRAGMA foreign_key_check").fetchall()
+        database.complete_habit("test_name", "2022-08-03")
+        changes = database.export_changes()
+        database.database.close()
+        os.remove("test_migration.db")
+        # Assert that the file was upgraded to the latest version, duplicates were removed and the keys are used
+        assert version == len(MIGRATIONS)
+        assert completions == [("2022-08-01", "test_name"), ("2022-08-02", "test_name")]
+        assert violations == []
+        assert "PRIMARY KEY" in plans[0][0][-1] and "COVERING INDEX" in plans[1][0][-1]
+        assert changes["completions"]["insert"]["test_name"][-1] == datetime.date(2022, 8, 3).toordinal()
+
+    def test_migrate_failure(self, monkeypatch):
+        import sqlite3
+        import database as database_module
+        old = sqlite3.connect("test_migration.db")
+        old.execute("CREATE TABLE habit(name TEXT PRIMARY KEY, definition TEXT, periodicity TEXT)")
+        old.execute("CREATE TABLE habitCompleted(date TEXT, habitName TEXT, FOREIGN KEY (habitName) REFERENCES habit(name))")
+        old.execute("INSERT INTO habit VALUES ('test_name', 'test_definition', 'daily')")
+        old.executemany("INSERT INTO habitCompleted VALUES (?, 'test_name')", [("2022-08-01",), ("2022-08-02",)])
+        old.commit()
+        old.close()
+
+        # Let the last migration fail after it already rebuilt the tables
+        def failing(cursor):
+            MIGRATIONS[-1](cursor)
+            raise sqlite3.OperationalError("injected failure")
+        with monkeypatch.context() as patch:
+            patch.setattr(database_module, "MIGRATIONS", MIGRATIONS[:-1] + [failing])
+            with pytest.raises(sqlite3.OperationalError):
+                Database("test_migration.db")
+        # Assert that the failed migration was rolled back completely and the earlier ones were kept
+        old = sqlite3.connect("test_migration.db")
+        version = old.execute("PRAGMA user_version").fetchone()[0]
+        columns = [column[1] for column in old.execute("PRAGMA table_info(habitCompleted)")]
+        old.close()
+        assert version == len(MIGRATIONS) - 1
+        assert "habitName" in columns and "habitId" not in columns
+
+        # Assert that running the migrations again finishes the upgrade
+        database = Database("test_migration.db")
+        version = database.database.execute("PRAGMA user_version").fetchone()[0]
+        completions = database.get_completedhabit("test_name")
+        database.close()
+        assert version == len(MIGRATIONS)
+        assert completions == [("2022-08-01", "test_name"), ("2022-08-02", "test_name")]
+
+    def test_streak_backdated(self):
+        # Create two streaks with a gap of one day and close the gap later on
+        test_habit = Habit("test_name", "test_definition", "daily")
+        self.tracker.create(test_habit)
+        # Tuesday, so the completions below span two ISO weeks
+        today = datetime.date(2022, 8, 9)
+        for days in (6, 5, 3, 2, 1):
+            self.tracker.complete_habit("test_name", (today - datetime.timedelta(days=days)).isoformat())
+        # Assert that both streaks are stored, including the one that is still running
+        assert [length for (*_, length) in self.tracker.find_allstreaks("test_name")] == [2, 3]
+
+        self.tracker.complete_habit("test_name", (today - datetime.timedelta(days=4)).isoformat())
+        consec_period, start_date, end_date = self.tracker.get_longeststreak_habit("test_name")
+        # Assert that the back-dated completion merged both streaks into one
+        assert len(self.tracker.find_allstreaks("test_name")) == 1
+        assert consec_period == 6
+        assert (start_date, end_date) == (today - datetime.timedelta(days=6), today - datetime.timedelta(days=1))
+
+        # Assert that the streaks are recomputed after the periodicity changed
+        self.tracker.update("test_name", "test_definition", "weekly")
+        consec_period, *_ = self.tracker.get_longeststreak_habit("test_name")
+        assert consec_period == 2
+
+    def test_allstreaks_allhabits(self):
+        # Create habits of all periodicities with broken streaks and compare the results of both streak engines
+        today = datetime.date(2022, 8, 31)
+        periodicities = ["daily", "weekly", "daily", "monthly", "every-3-days", "2-per-week"]
+        for i, periodicity in enumerate(periodicities):
+            self.tracker.create(Habit(f"name{i + 1}", "definition", periodicity))
+        for days in (20, 19, 18, 10, 9, 1, 0):
+            self.tracker.complete_habit("name1", (today - datetime.timedelta(days=days)).isoformat())
+        for days in (40, 33, 20, 14, 8):
+            self.tracker.complete_habit("name2", (today - datetime.timedelta(days=days)).isoformat())
+        for days in (0, 1, 2, 30, 33, 70, 95, 100):
+            for name in ("name4", "name5", "name6"):
+                self.tracker.complete_habit(name, (today - datetime.timedelta(days=days)).isoformat())
+
+        all_streaks = self.tracker.find_allstreaks_all()
+        for name in ("name1", "name2", "name3", "name4", "name5", "name6"):
+            expected = [(start.date, end.date, length) for (start, end, length) in self.tracker.find_allstreaks(name)]
+            assert [(start.date, end.date, length) for (start, end, length) in all_streaks[name]] == expected
+
+        habits, streak = self.tracker.get_longeststreak_all()
+        # Assert that name4 has the longest streak (4 months)
+        assert habits == ["name4"]
+        assert streak == 4
+
+    def test_lazyloading(self):
+        self.tracker = HabitTracker(storage = Database("test.db"))
+        self.tracker.create(Habit("test_name", "test_definition", "daily"))
+        self.tracker.complete_habit("test_name")
+        tracker = HabitTracker(storage = Database("test.db"))
+        tracker.complete_habit("test_name", "2022-08-01")
+        # Assert that completing a habit doesn't load the habits and completions
+        assert not tracker._allHabitsLoaded and tracker._completedHabits is None
+        assert tracker.get_streakperiod("test_name") == 1
+        # Assert that both completions are there once the list is accessed
+        assert len(tracker.completedHabits) == 2
+
+    def test_completionstore(self):
+        self.tracker = HabitTracker(storage = Database("test.db"))
+        self.tracker.create(Habit("name1", "definition", "daily"))
+        self.tracker.create(Habit("name2", "definition", "weekly"))
+        self.tracker.complete_habit("name1", "2022-08-03")
+        self.tracker.complete_habit("name2", "2022-08-02")
+        self.tracker.complete_habit("name1", "2022-08-01")
+        # Assert that the store keeps the days as integers (loaded ordered by date) and both the loaded and the updated store list the same completions
+        store = self.tracker.completedHabits
+        assert list(store.get_days("name1")) == [datetime.date(2022, 8, 1).toordinal(), datetime.date(2022, 8, 3).toordinal()]
+        reloaded = HabitTracker(storage = Database("test.db")).completedHabits
+        assert [str(hc) for hc in reloaded] == [str(hc) for hc in store]
+        assert [(hc.name, hc.date.day) for hc in store.iter_bydate()] == [("name1", 1), ("name2", 2), ("name1", 3)]
+        assert list(self.tracker.storage.get_completiondays("name1")) == sorted(store.get_days("name1"))
+
+    def test_analyticscache(self):
+        self.tracker = HabitTracker(storage = self.tracker.storage, cache_size = 2)
+        self.tracker.create(Habit("name1", "definition", "daily"))
+        self.tracker.create(Habit("name2", "definition", "daily"))
+        yesterday = datetime.datetime.now().date() - datetime.timedelta(days=1)
+        self.tracker.complete_habit("name1", yesterday.isoformat())
+        first = self.tracker.find_allstreaks("name1")
+        # Assert that a repeated query returns the cached result and a completion of the habit invalidates it
+        assert self.tracker.find_allstreaks("name1") == first
+        assert self.tracker.get_longeststreak_habit("name1")[0] == 1
+        self.tracker.complete_habit("name1")
+        assert self.tracker.get_longeststreak_habit("name1")[0] == 2
+        assert self.tracker.get_longeststreak_all() == (["name1"], 2)
+        # Assert that the least recently used results are evicted
+        self.tracker.find_allstreaks("name2")
+        assert len(self.tracker._analytics) == 2
+
+    def test_analyticscache_otherprocess(self):
+        self.tracker = HabitTracker(storage = Database("test.db"))
+        self.tracker.create(Habit("name1", "definition", "daily"))
+        self.tracker.complete_habit("name1", "2022-08-01")
+        assert self.tracker.get_longeststreak_all() == (["name1"], 1)
+        assert len(self.tracker.completedHabits) == 1
+        # Another process (with its own connection) changes the file
+        other = HabitTracker(storage = Database("test.db"))
+        other.create(Habit("name2", "definition", "daily"))
+        for day in (1, 2, 3):
+            other.complete_habit("name2", f"2022-08-0{day}")
+        other.storage.close()
+        # Assert that the cached results and the loaded habits and completions aren't used anymore
+        assert self.tracker.get_longeststreak_all() == (["name2"], 3)
+        assert self.tracker.get_habit("name2") is not None
+        assert len(self.tracker.allHabits) == 2 and len(self.tracker.completedHabits) == 4
+        self.tracker.storage.close()
+
+    def test_habitindex_transaction(self):
+        from concurrent.futures import ThreadPoolExecutor
+        tracker = HabitTracker(storage = Database("test_pooled.db", pooled = True))
+        tracker.create(Habit("name1", "definition", "daily"))
+        assert len(tracker.allHabits) == 1
+
+        def read():
+            name2 = tracker.get_habit("name2")
+            return tracker.get_habit("name1").definition, name2 and name2.definition, len(tracker.allHabits)
+
+        with ThreadPoolExecutor(1) as reader:
+            with tracker.transaction():
+                tracker.update("name1", "changed", "weekly")
+                tracker.create(Habit("name2", "definition", "daily"))
+                # Assert that other threads neither see the uncommitted changes nor keep the old habits after the commit
+                assert reader.submit(read).result() == ("definition", None, 1)
+                assert tracker.get_habit("name2") is not None
+            assert reader.submit(read).result() == ("changed", "definition", 2)
+        tracker.storage.close()
+
+    def test_pooled_threads(self):
+        import glob
+        import os
+        import threading
+        tracker = HabitTracker(storage = Database("test_pooled.db", pooled = True))
+        names = [f"name{i}" for i in range(4)]
+        for name in names:
+            tracker.create(Habit(name, "definition", "daily"))
+        start = datetime.date(2022, 1, 1)
+        errors = []
+
+        def write(name):
+            # Every writer completes its habit on 50 consecutive days, in reverse order
+            for day in reversed(range(50)):
+                tracker.complete_habit(name, (start + datetime.timedelta(days=day)).isoformat())
+
+        def read():
+            try:
+                for _ in range(50):
+                    for name in names:
+                        tracker.get_longeststreak_habit(name)
+                    tracker.get_date(start.isoformat())
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=write, args=(name, )) for name in names]
+        threads += [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Assert that all writes arrived and the streaks that were maintained concurrently are correct
+        journal_mode = tracker.storage.reader().execute("PRAGMA journal_mode").fetchone()[0]
+        results = [tracker.get_longeststreak_habit(name)[0] for name in names]
+        completions = len(tracker.get_date((start + datetime.timedelta(days=10)).isoformat()))
+        tracker.storage.close()
+        for path in glob.glob("test_pooled.db*"):
+            os.remove(path)
+        assert not errors
+        assert journal_mode == "wal"
+        assert results == [50, 50, 50, 50]
+        assert completions == 4
+
+    def test_itercompletions(self):
+        self.tracker.create(Habit("name1", "definition", "daily"))
+        self.tracker.create(Habit("name2", "definition", "daily"))
+        for name, date in [("name1", "2022-08-03"), ("name2", "2022-08-01"), ("name1", "2022-08-02"), ("name2", "2022-08-04")]:
+            self.tracker.complete_habit(name, date)
+        # Assert that the completions are streamed ordered by date and filtered by habit and date range
+        completions = self.tracker.iter_completions()
+        assert not isinstance(completions, list)
+        assert [hc.date.day for hc in completions] == [1, 2, 3, 4]
+        assert [hc.date.day for hc in self.tracker.iter_completions(habit="name1")] == [2, 3]
+        rows = list(self.tracker.storage.iter_completions(start="2022-08-02", end="2022-08-03", page_size=1))
+        assert rows == [("name1", "2022-08-02"), ("name1", "2022-08-03")]
+
+    def test_profiling(self):
+        import profiling
+        profiler = profiling.enable()
+        try:
+            # Only connections opened while profiling is on record their statements, so the fixture's tracker can't be used
+            tracker = HabitTracker(storage = Database(":memory:"))
+            tracker.create(Habit("test_name", "test_definition", "daily"))
+            tracker.complete_habit("test_name")
+            tracker.get_longeststreak_habit("test_name")
+        finally:
+            profiling.disable()
+        report = profiler.report()
+        spans = {entry["name"]: entry["count"] for entry in report["spans"]}
+        statements = {entry["name"]: entry["count"] for entry in report["sql"]}
+        # Assert that the tracker methods and the SQL statements (including the commits) were recorded
+        assert spans["HabitTracker.complete_habit"] == 1
+        assert spans["HabitTracker.get_longeststreak_habit"] == 1
+        assert statements["INSERT INTO habit (name, definition, periodicity) VALUES (?, ?, ?)"] == 1
+        assert statements["COMMIT"] >= 2
+        # Assert that nothing is recorded once profiling is off
+        self.tracker.get_longeststreak_habit("test_name")
+        assert profiler.report()["spans"] == report["spans"]
+        tracker.storage.close()
+
+    def test_daterange_aggregation(self):
+        self.tracker.create(Habit("name1", "definition", "daily"))
+        self.tracker.create(Habit("name2", "definition", "weekly"))
+        # 2022-08-01 is the Monday of ISO week 31
+        for day in (1, 2, 3, 8, 31):
+            self.tracker.complete_habit("name1", f"2022-08-{day:02}")
+        self.tracker.complete_habit("name2", "2022-08-09")
+        assert len(self.tracker.get_daterange("2022-08-02", "2022-08-08")) == 3
+        # Assert that the completions are counted per ISO week and month
+        assert self.tracker.get_completioncounts("2022-08-01", "2022-08-31", "week") == {
+            "name1": {"2022-W31": 3, "2022-W32": 1, "2022-W35": 1}, "name2": {"2022-W32": 1}}
+        assert self.tracker.get_completioncounts("2022-07-01", "2022-09-30", "month") == {
+            "name1": {"2022-08": 5}, "name2": {"2022-08": 1}}
+        labels, heatmap = self.tracker.get_heatmap("2022-08-01", "2022-08-14", "week")
+        # Assert that the rate is the share of completed days (daily) or weeks (weekly) per week
+        assert labels == ["2022-W31", "2022-W32"]
+        assert heatmap["name1"] == [3 / 7, 1 / 7]
+        assert heatmap["name2"] == [0.0, 1.0]
+
+    def test_streak_periodicities(self):
+        # Assert that weekly streaks count ISO weeks: Sunday and the next Monday are two weeks, Monday to Sunday one
+        self.tracker.create(Habit("weekly", "definition", "weekly"))
+        for date in ("2022-08-01", "2022-08-07", "2022-08-08", "2022-08-28"):
+            self.tracker.complete_habit("weekly", date)
+        assert [length for (*_, length) in self.tracker.find_allstreaks("weekly")] == [2, 1]
+
+        # Assert that "3-per-week" weeks only count with 3 completions and a back-dated completion completes a week
+        self.tracker.create(Habit("three", "definition", "3-per-week"))
+        for date in ("2022-08-01", "2022-08-02", "2022-08-03", "2022-08-08", "2022-08-09", "2022-08-15", "2022-08-16", "2022-08-17"):
+            self.tracker.complete_habit("three", date)
+        assert [length for (*_, length) in self.tracker.find_allstreaks("three")] == [1, 1]
+        self.tracker.complete_habit("three", "2022-08-10")
+        assert self.tracker.get_longeststreak_habit("three") == (3, datetime.date(2022, 8, 1), datetime.date(2022, 8, 17))
+
+        with pytest.raises(ValueError):
+            Habit("bad", "definition", "0-per-week")
+        assert Habit("custom", "definition", "every-3-days").periodicity.value == "every-3-days"
+
+    def test_duereport(self):
+        for name, periodicity in (("daily", "daily"), ("broken", "daily"), ("weekly", "weekly"), ("done", "daily"), ("new", "daily")):
+            self.tracker.create(Habit(name, "definition", periodicity))
+        # 2022-08-10 is a Wednesday
+        for date in ("2022-08-08", "2022-08-09"):
+            self.tracker.complete_habit("daily", date)
+        self.tracker.complete_habit("broken", "2022-08-07")
+        self.tracker.complete_habit("weekly", "2022-08-03")
+        self.tracker.complete_habit("done", "2022-08-10")
+        report = self.tracker.due_report("2022-08-10")
+        # Assert that running streaks of the last period are at risk and habits that missed it are overdue
+        assert [name for (name, *_) in report["due"]] == ["daily", "broken", "weekly", "new"]
+        assert report["at_risk"] == [("daily", 2, datetime.date(2022, 8, 9), 1), ("weekly", 1, datetime.date(2022, 8, 3), 5)]
+        assert report["overdue"] == [("broken", 0, datetime.date(2022, 8, 7), 1), ("new", 0, None, 1)]
+
+    def test_duereport_past(self):
+        self.tracker.create(Habit("daily", "definition", "daily"))
+        for day in range(1, 11):
+            self.tracker.complete_habit("daily", f"2024-03-{day:02d}")
+        # Assert that a streak that went on after a past as_of date is cut off at that date
+        assert self.tracker.storage.get_lateststatus("2024-03-05")[0][3:] == (datetime.date(2024, 3, 5).toordinal(), 5)
+        assert self.tracker.due_report("2024-03-05")["due"] == []
+        assert self.tracker.due_report("2024-03-11")["at_risk"] == [("daily", 10, datetime.date(2024, 3, 10), 1)]
+
+    def test_columnar_storage(self, tmp_path):
+        from columnar import ColumnarStorage
+        from storage import Storage
+        storage = ColumnarStorage(str(tmp_path / "columnar"), compact_after=4)
+        assert isinstance(storage, Storage)
+        assert isinstance(self.tracker.storage, Storage)
+        tracker = HabitTracker(storage = storage)
+        tracker.create(Habit("name1", "definition1", "daily"))
+        tracker.create(Habit("name2", "definition2", "weekly"))
+        with pytest.raises(IntegrityError):
+            tracker.create(Habit("name1", "definition1", "daily"))
+        with pytest.raises(ValueError):
+            tracker.complete_habit("unknown", "2022-08-01")
+
+        for date in ("2022-08-01", "2022-08-02", "2022-08-03", "2022-08-05", "2022-08-02"):
+            tracker.complete_habit("name1", date)
+        stored, rejected = tracker.complete_habits_bulk([("name2", "2022-08-01"), ("name2", "2022-08-09"),
+                                                         ("name1", "2022-08-06"), ("unknown", "2022-08-01")])
+        assert stored == 3
+        assert rejected == [("unknown", "2022-08-01", "unknown habit")]
+        # The tail reached compact_after, so the log was compacted into the sorted segment
+        assert len(storage.tail()) < 4
+
+        assert storage.get_longeststreak("name1") == (3, "2022-08-01", "2022-08-03")
+        assert tracker.get_longeststreak_all() == (["name1"], 3)
+        assert list(storage.iter_completions(start="2022-08-05", end="2022-08-06")) == [
+            ("name1", "2022-08-05"), ("name1", "2022-08-06")]
+        tracker.delete("name2")
+        storage.close()
+
+        # Everything is read back from the files
+        storage = ColumnarStorage(str(tmp_path / "columnar"))
+        tracker = HabitTracker(storage = storage)
+        assert [habit.name for habit in tracker.allHabits] == ["name1"]
+        assert list(storage.get_completiondays("name1")) == [
+            datetime.date(2022, 8, day).toordinal() for day in (1, 2, 3, 5, 6)]
+        # 2022-08-01 is a Monday, so all completions are in the same week
+        assert storage.count_completions("2022-08-01", "2022-08-31", "week") == [
+            ("name1", datetime.date(2022, 8, 1).toordinal(), 5)]
+        storage.compact()
+        assert len(storage.records()) == 5
+
+        # Assert that the records of a deleted habit aren't read after another habit was created (without compacting)
+        tracker.delete("name1")
+        tracker.create(Habit("name3", "definition3", "daily"))
+        assert tracker.get_longeststreak_all() == ([], 0)
+        assert storage.list_completionsondate("2022-08-01") == []
+        assert storage.count_completions("2022-08-01", "2022-08-31", "week") == []
+
+    def test_fleetstats(self, tmp_path):
+        from fleet import find_databases, fleet_stats
+        for user, days in (("user1", (1, 2, 3)), ("user2", (1, 2, 3, 4, 8))):
+            tracker = HabitTracker(storage = Database(str(tmp_path / f"{user}.db")))
+            tracker.create(Habit("name1", "definition1", "daily"))
+            tracker.complete_habits_bulk(("name1", f"2022-08-{day:02}") for day in days)
+            tracker.storage.close()
+        (tmp_path / "broken.db").write_text("not a database")
+        # An outdated schema isn't migrated through a read-only connection
+        (tmp_path / "empty.sqlite").write_bytes(b"")
+        with pytest.raises(OperationalError):
+            Database(str(tmp_path / "empty.sqlite"), readonly=True)
+
+        paths = find_databases(str(tmp_path))
+        assert [path.rsplit("/", 1)[-1] for path in paths] == ["broken.db", "user1.db", "user2.db"]
+        for workers in (1, 2):
+            report = fleet_stats(paths, "2022-08-01", "2022-08-31", "week", workers)
+            assert report["databases"] == 3 and report["failed"] == 1
+            assert report["longest_streak"] == {"length": 4, "habits": [[paths[2], "name1"]]}
+            assert report["counts"] == {"2022-W31": 7, "2022-W32": 1}
+            assert report["shards"][1]["streaks"] == {"name1": {"runs": 1, "longest": 3}}
+
+    def test_transaction_shell(self, tmp_path, monkeypatch):
+        import json
+        from typer.testing import CliRunner
+        import CLI
+        storage = Database(str(tmp_path / "pooled.db"), pooled=True)
+        other = Database(str(tmp_path / "pooled.db"), pooled=True)
+        with storage.transaction():
+            storage.store_habit("name1", "definition1", "daily")
+            storage.complete_habit("name1", "2022-08-01")
+            # The writes are visible inside the block, but only committed at its end
+            assert storage.get_habit("name1") is not None
+            assert other.get_habit("name1") is None
+        assert other.get_habit("name1") is not None
+        with pytest.raises(ValueError):
+            with storage.transaction():
+                storage.complete_habit("name1", "2022-08-02")
+                raise ValueError()
+        assert list(other.get_completiondays("name1")) == [datetime.date(2022, 8, 1).toordinal()]
+
+        monkeypatch.setattr(CLI, "_tracker", HabitTracker(storage = storage))
+        script = "\n".join(["create-habit name2 definition2 weekly", "# comment", "",
+                            "complete-habit name2 --date 2022-08-01", "update-habit unknown definition daily",
+                            "show-nothing", "show-longeststreak-all"])
+        result = CliRunner().invoke(CLI.app, ["shell", "--json", "--group", "2"], input=script)
+        assert result.exit_code == 0
+        lines = [json.loads(line) for line in result.stdout.splitlines()]
+        assert [line["ok"] for line in lines] == [True, True, False, False, True]
+        assert lines[2]["error"] == "Could not find name: unknown"
+        assert lines[4]["output"] == ["The following habit(s) have the longest streak of 1 times:", "['name1', 'name2']"]
+        assert other.get_habit("name2") is not None
+
+        # A failing command in a group is rolled back, the commands before and after it in the group are committed
+        changes = {"since": 0, "until": 2, "habits": {"upsert": [["name3", "definition3", "daily"]], "delete": []},
+                   "completions": {"insert": {"name1": [datetime.date(2022, 8, 5).toordinal()],
+                                              "unknown": [datetime.date(2022, 8, 5).toordinal()]}, "delete": {}}}
+        with open(tmp_path / "changes.json", "w") as file:
+            json.dump(changes, file)
+        script = "\n".join(["complete-habit name1 --date 2022-08-03", f"apply-changes {tmp_path / 'changes.json'}",
+                            "complete-habit name1 --date 2022-08-04"])
+        result = CliRunner().invoke(CLI.app, ["shell", "--json", "--group", "10"], input=script)
+        assert [json.loads(line)["ok"] for line in result.stdout.splitlines()] == [True, False, True]
+        assert other.get_habit("name3") is None and CLI._tracker.get_habit("name3") is None
+        assert [datetime.date.fromordinal(day).day for day in other.get_completiondays("name1")] == [1, 3, 4]
+        storage.close()
+        other.close()
+
+    def test_server_failingwrite(self):
+        from http import HTTPStatus
+        from server import TrackerServer
+        server = TrackerServer(self.tracker)
+
+        def failing():
+            # Writes, then fails
+            self.tracker.create(Habit("name2", "definition", "daily"))
+            self.tracker.complete_habit("name1", "2022-08-02")
+            raise ValueError("failed")
+
+        responses = server.run_writes([(server.create_habit, ({}, {"name": "name1", "definition": "definition", "periodicity": "daily"})),
+                                       (failing, ()), (server.complete_habit, ({}, {"date": "2022-08-01"}, "name1"))])
+        # Assert that only the failing write was rolled back
+        assert [status for (status, _) in responses] == [HTTPStatus.CREATED, HTTPStatus.BAD_REQUEST, HTTPStatus.CREATED]
+        assert self.tracker.get_habit("name2") is None and [habit.name for habit in self.tracker.allHabits] == ["name1"]
+        assert [date for (date, _) in self.tracker.get_habitcompletions("name1")] == ["2022-08-01"]
+        assert len(self.tracker.completedHabits) == 1
+
+    def test_server(self, tmp_path):
+        import asyncio
+        import http.client
+        import json
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from server import TrackerServer
+        server = TrackerServer(HabitTracker(storage = Database(str(tmp_path / "server.db"), pooled=True)), window=0.01)
+        loop = asyncio.new_event_loop()
+        started = asyncio.Event()
+
+        def serve():
+            try:
+                loop.run_until_complete(server.serve("127.0.0.1", 0, started))
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+
+        def request(method, path, body=None):
+            connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+            connection.request(method, path, json.dumps(body) if body is not None else None)
+            response = connection.getresponse()
+            result = response.status, json.loads(response.read())
+            connection.close()
+            return result
+
+        try:
+            while not started.is_set():
+                threading.Event().wait(0.01)
+            assert request("POST", "/habits", {"name": "name1", "definition": "definition1", "periodicity": "daily"})[0] == 201
+            assert request("POST", "/habits", {"name": "name1", "definition": "definition1", "periodicity": "daily"})[0] == 409
+            assert request("POST", "/habits", {"name": "name2", "periodicity": "biweekly"})[0] == 400
+            # Concurrent completions are committed together
+            with ThreadPoolExecutor(8) as executor:
+                statuses = list(executor.map(lambda day: request("POST", "/habits/name1/completions", {"date": f"2022-08-{day:02}"})[0],
+                                             range(1, 11)))
+            assert statuses == [201] * 10
+            assert request("POST", "/habits/unknown/completions", {})[0] == 404
+            assert request("GET", "/habits/name1/streaks") == (200, [{"start": "2022-08-01", "end": "2022-08-10", "length": 10}])
+            assert request("GET", "/streaks/longest") == (200, {"habits": ["name1"], "length": 10})
+            assert request("GET", "/completions?start=2022-08-10&end=2022-08-31") == (200, [{"name": "name1", "date": "2022-08-10"}])
+            assert request("DELETE", "/habits")[0] == 405
+            assert request("GET", "/nothing")[0] == 404
+        finally:
+            for task in asyncio.all_tasks(loop):
+                loop.call_soon_threadsafe(task.cancel)
+            thread.join()
+            loop.close()
+        server.tracker.storage.close()
+
+    def test_changesync(self, tmp_path):
+        import json
+        phone = HabitTracker(storage = Database(str(tmp_path / "phone.db")))
+        laptop = HabitTracker(storage = Database(str(tmp_path / "laptop.db")))
+        phone.create(Habit("name1", "definition1", "daily"))
+        phone.create(Habit("name2", "definition2", "daily"))
+        phone.complete_habits_bulk(("name1", f"2022-08-{day:02}") for day in range(1, 6))
+        changes = phone.export_changes()
+        assert changes["completions"]["insert"] == {"name1": [datetime.date(2022, 8, day).toordinal() for day in range(1, 6)]}
+        # The export survives a round trip through JSON
+        assert laptop.apply_changes(json.loads(json.dumps(changes))) == {"habits": 2, "completions": 5}
+        assert laptop.get_longeststreak_all() == (["name1"], 5)
+
+        since = changes["until"]
+        phone.delete("name2")
+        phone.update("name1", "definition1b", "daily")
+        phone.complete_habit("name1", "2022-08-06")
+        phone.complete_habit("name1", "2022-08-07")
+        phone.storage.database.execute("DELETE FROM habitCompleted WHERE day = ?", (datetime.date(2022, 8, 3).toordinal(), ))
+        phone.storage.database.commit()
+        changes = phone.export_changes(since)
+        # Only the changes since the last sync are exported
+        assert changes["habits"] == {"upsert": [["name1", "definition1b", "daily"]], "delete": ["name2"]}
+        assert changes["completions"] == {"insert": {"name1": [datetime.date(2022, 8, 6).toordinal(), datetime.date(2022, 8, 7).toordinal()]},
+                                          "delete": {"name1": [datetime.date(2022, 8, 3).toordinal()]}}
+        assert laptop.apply_changes(changes) == {"habits": 2, "completions": 3}
+        assert laptop.apply_changes(changes) == {"habits": 0, "completions": 0}
+        assert [habit.definition for habit in laptop.allHabits] == ["definition1b"]
+        assert laptop.storage.get_streaks("name1") == [
+            ("2022-08-01", "2022-08-02", 2), ("2022-08-04", "2022-08-07", 4)]
+        assert phone.export_changes(changes["until"])["until"] == changes["until"]
+        phone.storage.close()
+        laptop.storage.close()
+
+    def test_archive(self):
+        self.tracker.create(Habit("name1", "definition1", "daily"))
+        self.tracker.create(Habit("name2", "definition2", "weekly"))
+        dates = [f"2020-12-{day}" for day in (29, 30, 31)] + ["2021-01-01", "2021-01-02", "2021-06-01", "2022-08-01"]
+        self.tracker.complete_habits_bulk([("name1", date) for date in dates] + [("name2", "2021-01-01")])
+        storage = self.tracker.storage
+        reads = lambda: (storage.get_completiondays("name1"), storage.get_allcompletiondays(), storage.get_completedhabit("name1"),
+                         storage.get_completionstore().days, storage.list_completionsbetween("2020-12-30", "2021-06-01"),
+                         storage.list_completionsondate("2021-01-01"), list(storage.iter_completions()),
+                         list(storage.iter_completions("name1", "2020-12-31", "2021-12-31")),
+                         storage.count_completions("2020-01-01", "2022-12-31", "month"), storage.get_lateststatus("2021-12-31"),
+                         storage.get_streaks("name1"), len(storage.get_alltrackedhabits()))
+        before = reads()
+        changes = storage.export_changes()
+        assert self.tracker.archive("2021-07-01") == 7
+        assert storage.database.execute("SELECT COUNT(*) FROM habitCompleted").fetchone()[0] == 1
+        assert reads() == before
+        assert storage.export_changes() == changes
+
+        # Archived completions aren't stored twice, backdated ones are combined with the archive
+        assert storage.complete_habit("name1", "2021-01-01") is False
+        assert self.tracker.complete_habits_bulk([("name1", "2021-01-02"), ("name1", "2021-01-03")]) == (1, [])
+        assert storage.get_longeststreak("name1") == (6, "2020-12-29", "2021-01-03")
+        storage.apply_changes({"habits": {"upsert": [], "delete": []},
+                               "completions": {"insert": {}, "delete": {"name1": [datetime.date(2020, 12, 31).toordinal()]}}})
+        assert storage.get_longeststreak("name1") == (3, "2021-01-01", "2021-01-03")
+        assert len(storage.get_completiondays("name1")) == 7
+        self.tracker.delete("name1")
+        assert storage.database.execute("SELECT COUNT(*) FROM habitArchive WHERE habitName = 'name1'").fetchone()[0] == 0
+
+    def test_archive_concurrentwrite(self):
+        import sqlite3
+        import threading
+        self.tracker = HabitTracker(storage = Database("test.db"))
+        self.tracker.create(Habit("name1", "definition1", "daily"))
+        self.tracker.complete_habit("name1", "2020-01-01")
+        # Another connection is writing a backdated and a recent completion while the archiving starts
+        other = sqlite3.connect("test.db", check_same_thread=False)
+        other.execute("BEGIN IMMEDIATE")
+        other.executemany("INSERT INTO habitCompleted (habitId, day) VALUES (1, ?)",
+                          [(datetime.date(2020, 1, 2).toordinal(), ), (datetime.date(2024, 5, 5).toordinal(), )])
+        committer = threading.Timer(0.3, other.commit)
+        committer.start()
+        archived = self.tracker.archive("2021-01-01")
+        committer.join()
+        other.close()
+        # Assert that the archiving waited for the other write, so its completions are neither lost nor missing from the log
+        assert archived == 2
+        assert [day for day in self.tracker.storage.get_completiondays("name1")] == [
+            datetime.date(2020, 1, 1).toordinal(), datetime.date(2020, 1, 2).toordinal(), datetime.date(2024, 5, 5).toordinal()]
+        assert self.tracker.export_changes()["completions"]["insert"]["name1"][-1] == datetime.date(2024, 5, 5).toordinal()
+        self.tracker.storage.close()
+
+    def test_metrics(self):
+        import random
+        from metrics import RATE_WINDOWS, WindowState, resume
+        from classes import parse_periodicity
+        rng = random.Random(0)
+        start = datetime.date(2020, 1, 1).toordinal()
+        # Completions with gaps, a gap longer than all windows and a second half that is completed more often
+        days = sorted({start + rng.randrange(200) for _ in range(120)} | {start + 500 + rng.randrange(200) for _ in range(180)})
+        as_of_day = start + 720
+        for periodicity in ("daily", "3-per-week", "every-3-days"):
+            periodicity = parse_periodicity(periodicity)
+            # Naive: count the met periods of every window again
+            counts = {}
+            for day in days:
+                counts[periodicity.bucket(day)] = counts.get(periodicity.bucket(day), 0) + 1
+            first, current = periodicity.bucket(days[0]), periodicity.bucket(as_of_day)
+            met = [int(counts.get(bucket, 0) >= periodicity.times) for bucket in range(first, current)]
+            state = WindowState(periodicity.value)
+            state.add(days)
+            report = state.report(as_of_day)
+            assert report["periods"] == len(met)
+            for window in RATE_WINDOWS:
+                assert report[f"rate_{window}"] == pytest.approx(sum(met[-window:]) / window)
+            assert report["trend"] == pytest.approx((sum(met[-30:]) - sum(met[-60:-30])) / 30)
+            best = max(range(30, len(met) + 1), key=lambda end: (sum(met[end - 30:end]), -end))
+            assert report["best"]["rate"] == pytest.approx(sum(met[best - 30:best]) / 30)
+            assert report["best"]["start"] == periodicity.bucket_start(first + best - 30)
+
+            # Resuming from a checkpoint gives the same result, a changed history is recomputed
+            checkpoint = resume(None, periodicity.value, days[:150]).to_dict()
+            assert resume(checkpoint, periodicity.value, days).report(as_of_day) == report
+            assert resume(checkpoint, periodicity.value, days[1:]).report(as_of_day) == WindowState.from_dict(
+                resume(None, periodicity.value, days[1:]).to_dict()).report(as_of_day)
+
+        self.tracker.create(Habit("name1", "definition1", "daily"))
+        self.tracker.complete_habits_bulk(("name1", datetime.date.fromordinal(day).isoformat()) for day in days)
+        metrics, checkpoint = self.tracker.get_metrics(datetime.date.fromordinal(as_of_day).isoformat())
+        daily = WindowState("daily")
+        daily.add(days)
+        expected = daily.report(as_of_day)
+        assert [metrics["name1"][key] for key in ("rate_7", "rate_30", "rate_90", "trend")] == [
+            expected[key] for key in ("rate_7", "rate_30", "rate_90", "trend")]
+        assert metrics["name1"]["best"]["start"] == datetime.date.fromordinal(expected["best"]["start"])
+        assert self.tracker.get_metrics(datetime.date.fromordinal(as_of_day).isoformat(), checkpoint)[0] == metrics
+
+        # Assert that resuming only reads the completions after the checkpoint, unless the history changed
+        storage = self.tracker.storage
+        reads = []
+        get_completiondays = storage.get_completiondays
+        storage.get_completiondays = lambda name, first = None, last = None: reads.append(first) or get_completiondays(name, first, last)
+        later = datetime.date.fromordinal(as_of_day + 10).isoformat()
+        self.tracker.complete_habit("name1", datetime.date.fromordinal(as_of_day + 5).isoformat())
+        assert self.tracker.get_metrics(later, checkpoint)[0] == self.tracker.get_metrics(later)[0]
+        self.tracker.complete_habit("name1", datetime.date.fromordinal(days[0] - 1).isoformat())
+        self.tracker.get_metrics(later, checkpoint)
+        assert reads == [days[-1] + 1, None, None]
+
+        # Assert that days from NumPy arrays (f.e. of the columnar storage) don't overflow the checksum
+        import json
+        import numpy as np
+        state = WindowState("daily")
+        state.add(np.arange(start, start + 4000, dtype=np.int32))
+        assert state.checksum == sum(range(start, start + 4000))
+        assert json.loads(json.dumps(state.to_dict()))["checksum"] == state.checksum
+
+    def test_bitsets(self):
+        import math
+        import random
+        self.tracker = HabitTracker(storage = Database("test.db"))
+        rng = random.Random(1)
+        start = datetime.date(2020, 1, 1).toordinal()
+        names = ["Workout", "Sleep early", "Water"]
+        for name in names:
+            self.tracker.create(Habit(name, "", "daily"))
+        days = {name: sorted({start + rng.randrange(400) for _ in range(150)}) for name in names}
+        self.tracker.complete_habits_bulk([(name, datetime.date.fromordinal(day).isoformat())
+                                           for name in names for day in days[name]])
+        sets = {name: set(days[name]) for name in names}
+        everything = set(range(min(min(d) for d in days.values()), max(max(d) for d in days.values()) + 1))
+        iso = lambda days: [datetime.date.fromordinal(day).isoformat() for day in sorted(days)]
+        expected = (sets["Workout"] & sets["Sleep early"]) - sets["Water"]
+        assert self.tracker.query_days('Workout AND "Sleep early" AND NOT Water') == iso(expected)
+        assert self.tracker.query_days("Workout & ~('Sleep early' | Water)") == iso(everything & sets["Workout"] - sets["Sleep early"] - sets["Water"])
+        assert self.tracker.query_days("NOT Workout", "2020-02-01", "2020-02-29") == iso(
+            set(range(start + 31, start + 60)) - sets["Workout"])
+        for expression in ("Workout AND", "Running", "(Workout", "Workout Water"):
+            with pytest.raises(ValueError):
+                self.tracker.query_days(expression)
+
+        counts, correlations = self.tracker.get_cooccurrence()
+        n = len(everything)
+        for a in names:
+            for b in names:
+                both = len(sets[a] & sets[b])
+                assert counts[(a, b)] == both
+                na, nb = len(sets[a]), len(sets[b])
+                phi = (n * both - na * nb) / math.sqrt(na * (n - na) * nb * (n - nb))
+                assert correlations[(a, b)] == pytest.approx(phi)
+
+        # The stored bitsets are dropped by every change of the completions and built again
+        storage = self.tracker.storage
+        assert storage.database.execute("SELECT COUNT(*) FROM habitBitset").fetchone()[0] == 3
+        self.tracker.complete_habit("Workout", datetime.date.fromordinal(start + 400).isoformat())
+        assert storage.database.execute("SELECT COUNT(*) FROM habitBitset").fetchone()[0] == 2
+        self.tracker.archive("2020-06-01")
+        storage.database.execute("DELETE FROM habitCompleted WHERE habitId = ? AND day = ?", (storage.habit_id("Water"), days["Water"][-1]))
+        storage.database.commit()
+        self.tracker.complete_habit("Water", "2021-06-01")
+        assert self.tracker.query_days("Workout") == iso(sets["Workout"] | {start + 400})
+        assert self.tracker.query_days("Water") == iso(set(days["Water"][:-1]) | {datetime.date(2021, 6, 1).toordinal()})
+        readonly = Database("test.db", readonly=True)
+        assert readonly.get_bitsets() == storage.get_bitsets()
+        readonly.close()
+
+    def test_backup_restore(self):
         import os
-        os.remove("test.db")
\ No newline at end of file
+        import threading
+        from sqlite3 import DatabaseError
+        self.tracker = HabitTracker(storage = Database("test.db"))
+        self.tracker.create(Habit("name1", "definition1", "daily"))
+        self.tracker.complete_habits_bulk([("name1", (datetime.date(2020, 1, 1) + datetime.timedelta(days=day)).isoformat())
+                                           for day in range(2000)])
+        expected = (self.tracker.storage.get_completiondays("name1"), self.tracker.storage.get_streaks("name1"))
+
+        # Completions keep going while the snapshots are copied one page per step
+        pooled = HabitTracker(storage = Database("test.db", pooled=True))
+        stop = threading.Event()
+        def write():
+            day = datetime.date(2030, 1, 1)
+            while not stop.is_set():
+                pooled.complete_habit("name1", day.isoformat())
+                day += datetime.timedelta(days=1)
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            result = pooled.backup("test_backup.db", pages=1, sleep=0.001)
+            compressed = pooled.backup("test_backup.db.gz", compress=True, pages=8, sleep=0)
+        finally:
+            stop.set()
+            writer.join()
+            pooled.storage.close()
+        assert result["pages"] > 1 and compressed["bytes"] < result["bytes"]
+
+        for snapshot in ("test_backup.db", "test_backup.db.gz"):
+            self.tracker.create(Habit(f"new {snapshot}", "definition", "weekly"))
+            self.tracker.restore(snapshot)
+            # The snapshot is one consistent state: at least the completions before the backup started
+            assert [habit.name for habit in self.tracker.allHabits] == ["name1"]
+            days = self.tracker.storage.get_completiondays("name1")
+            assert days[:2000] == expected[0] and self.tracker.storage.get_streaks("name1")[0] == expected[1][0]
+            assert len(self.tracker.get_habitcompletions("name1")) == len(days)
+
+        # A damaged snapshot is rejected and the database stays as it was
+        with open("test_backup.db.gz", "rb") as file:
+            data = file.read()
+        with open("test_backup.db.gz", "wb") as file:
+            file.write(data[:len(data) // 2])
+        with open("test_backup.db", "r+b") as file:
+            file.seek(4096 * 3)
+            file.write(b"\xff" * 4096)
+        for snapshot in ("test_backup.db", "test_backup.db.gz"):
+            with pytest.raises(DatabaseError):
+                self.tracker.restore(snapshot)
+            os.remove(snapshot)
+        assert self.tracker.storage.get_completiondays("name1") == days
+
+    def test_restore_changelog(self):
+        self.tracker.create(Habit("name1", "definition1", "daily"))
+        self.tracker.backup("test_backup.db")
+        for date in ("2022-08-01", "2022-08-02", "2022-08-03"):
+            self.tracker.complete_habit("name1", date)
+        # Another device synced up to here, then the older snapshot is restored and the tracker changed again
+        since = self.tracker.export_changes()["until"]
+        self.tracker.restore("test_backup.db")
+        self.tracker.complete_habit("name1", "2022-08-10")
+        changes = self.tracker.export_changes(since)
+        # Assert that the sequence continued after the synced changes, so the next sync gets the new change
+        assert changes["until"] > since
+        assert changes["completions"]["insert"] == {"name1": [datetime.date(2022, 8, 10).toordinal()]}
+
+    def test_streaks_largedataset(self, large_tracker, large_template):
+        from conftest import LARGE_HABITS
+        # Assert that the stored streaks of the generated dataset match the streaks of the in-memory engine
+        def check(tracker):
+            all_streaks = tracker.find_allstreaks_all()
+            assert len(all_streaks) == LARGE_HABITS
+            for name, streaks in all_streaks.items():
+                expected = [(start.date, end.date, length) for (start, end, length) in tracker.find_allstreaks(name)]
+                assert [(start.date, end.date, length) for (start, end, length) in streaks] == expected
+            return all_streaks
+        all_streaks = check(large_tracker)
+
+        # Closing the gaps between the first streaks joins them - only in the copy of this test, not in the template
+        storage = large_tracker.storage
+        name, periodicity = next((name, periodicity) for (_, name, periodicity) in storage.get_habitids() if periodicity == "daily")
+        (_, first_end, first_length), (second_start, _, second_length) = all_streaks[name][:2]
+        gap = [first_end.date + datetime.timedelta(days=day) for day in range(1, (second_start.date - first_end.date).days)]
+        large_tracker.complete_habits_bulk([(name, date.isoformat()) for date in gap])
+        assert large_tracker.find_allstreaks(name)[0][2] == first_length + len(gap) + second_length
+        check(large_tracker)
+        assert len(large_template.get_completiondays(name)) == len(storage.get_completiondays(name)) - len(gap)
+
+    def test_import_rejects(self, monkeypatch):
+        from typer.testing import CliRunner
+        import CLI
+        self.tracker.create(Habit("name1", "definition1", "daily"))
+        monkeypatch.setattr(CLI, "_tracker", self.tracker)
+        with open("completions.jsonl", "w") as file:
+            file.write('{"name": "name1", "date": "2022-08-01"}\n{"name": "name1"}\nnot json\n\n{"date": "2022-08-02"}\n[1, 2]\n')
+        with open("completions.csv", "w") as file:
+            file.write("name,date\nname1,2022-08-03\nname1,\n")
+        result = CliRunner().invoke(CLI.app, ["import-completions", "completions.jsonl"])
+        # Assert that rows without a date aren't imported as today and malformed lines are reported with their number
+        assert "1 completions have been imported." in result.stdout
+        assert "invalid JSON on line 3" in result.stdout and "invalid JSON on line 6" in result.stdout
+        assert "name1 None: missing date" in result.stdout and "None 2022-08-02: missing name" in result.stdout
+        result = CliRunner().invoke(CLI.app, ["import-completions", "completions.csv"])
+        assert "1 completions have been imported." in result.stdout and "missing date" in result.stdout
+        assert sorted(date for (date, _) in self.tracker.get_habitcompletions("name1")) == ["2022-08-01", "2022-08-03"]